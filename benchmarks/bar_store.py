@@ -0,0 +1,71 @@
+"""
+    对比旧的 list[Bars{instrument: Bar}] 存储与列式 BarStore 的内存占用和加载耗时
+
+    两种方式从同一份数据加载: 每个标的一个与 HDFStore 中列的顺序相同的 DataFrame(DataFrameFeed 读出来的就是它)
+        legacy: 原来 DataFrameFeed.load_data 的做法, to_records 之后逐行创建 Bar 与 Bars
+        columnar: 现在 DataFrameFeed 的做法, frame_to_bars 逐列复制, 再用 BarStore.join 按时间对齐
+
+    python -m benchmarks.bar_store [n_bars] [n_instruments]
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from myalgo.bar import Bar, Bars, BarStore, Frequency
+from myalgo.feed.dataframe_feed import frame_to_bars
+
+
+def make_frames(n_bars, n_instruments):
+    index = pd.date_range('2015-01-01', periods=n_bars, freq='min')
+    columns = ['bid_open', 'bid_high', 'bid_low', 'bid_close', 'ask_open', 'ask_high', 'ask_low', 'ask_close']
+    return {f'INST{i}': pd.DataFrame(np.random.random((n_bars, 8)).astype(np.float32), index=index, columns=columns)
+            for i in range(n_instruments)}
+
+
+def load_legacy(frames):
+    records = {instrument: df.to_records() for instrument, df in frames.items()}
+    length = min(len(rows) for rows in records.values())
+    result = []
+    for i in range(length):
+        bar_dict = {}
+        for instrument, rows in records.items():
+            t, bo, bh, bl, bc, ao, ah, al, ac = rows[i]
+            t = np.datetime64(t, 'm')
+            bar_dict[instrument] = Bar.from_bar(t, t + 1, ao, ac, ah, al, bo, bc, bh, bl, 0)
+        result.append(Bars(bar_dict))
+    return result
+
+
+def load_store(frames):
+    return BarStore.join({instrument: frame_to_bars(df) for instrument, df in frames.items()}, Frequency.MINUTE)
+
+def measure(loader, *args):
+    # tracemalloc 会拖慢分配, 所以计时与内存分两次测量
+    start = time.perf_counter()
+    ret = loader(*args)
+    elapsed = time.perf_counter() - start
+    del ret
+
+    tracemalloc.start()
+    ret = loader(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ret
+    return elapsed, size
+
+
+def main(n_bars=200000, n_instruments=1):
+    frames = make_frames(n_bars, n_instruments)
+
+    print(f'{n_bars} bars x {n_instruments} instruments')
+    print(f'{"backend":<10}{"load (s)":>12}{"bytes/bar":>14}{"total (MB)":>14}')
+    for name, loader in (('legacy', load_legacy), ('columnar', load_store)):
+        elapsed, size = measure(loader, frames)
+        print(f'{name:<10}{elapsed:>12.3f}{size / n_bars:>14.1f}{size / 2 ** 20:>14.1f}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,89 @@
+"""
+    NumPyDeque / ListDeque 的微基准: 环形缓冲区与原来左移(或者 list.pop(0))的实现,
+    在不同的 maxLen 下写满之后每次 append 的耗时, 以及 append 之后马上读取 data() 的耗时
+
+    python -m benchmarks.deques [n_appends]
+"""
+import sys
+import timeit
+
+import numpy as np
+
+from myalgo.utils.collections import ListDeque, NumPyDeque
+
+
+class ShiftNumPyDeque(object):
+    """
+        原来的实现, 写满之后每次 append 把整个数组左移一位
+    """
+
+    def __init__(self, maxLen, dtype=float):
+        self.__values = np.empty(maxLen, dtype=dtype)
+        self.__maxLen = maxLen
+        self.__nextPos = 0
+
+    def append(self, value):
+        if self.__nextPos < self.__maxLen:
+            self.__values[self.__nextPos] = value
+            self.__nextPos += 1
+        else:
+            self.__values[0:-1] = self.__values[1:]
+            self.__values[self.__nextPos - 1] = value
+
+    def data(self):
+        if self.__nextPos < self.__maxLen:
+            return self.__values[0:self.__nextPos]
+        return self.__values
+
+
+class PopListDeque(object):
+    """
+        原来的实现, 写满之后每次 append 都 list.pop(0)
+    """
+
+    def __init__(self, maxLen):
+        self.__values = []
+        self.__maxLen = maxLen
+
+    def append(self, value):
+        self.__values.append(value)
+        if len(self.__values) > self.__maxLen:
+            self.__values.pop(0)
+
+    def data(self):
+        return self.__values
+
+
+def bench(deque_class, max_len, n_appends, read):
+    deque = deque_class(max_len)
+    for i in range(max_len):
+        deque.append(1.0)
+
+    if read:
+        def step():
+            deque.append(1.0)
+            deque.data()
+    else:
+        def step():
+            deque.append(1.0)
+    return min(timeit.repeat(step, number=n_appends, repeat=5)) / n_appends * 1e9
+
+
+def main(n_appends=100000):
+    implementations = [
+        ('NumPyDeque', NumPyDeque),
+        ('shift', ShiftNumPyDeque),
+        ('ListDeque', ListDeque),
+        ('pop(0)', PopListDeque),
+    ]
+
+    print(f'{"impl":<12}{"maxLen":>10}{"ns/append":>12}{"ns/append+data":>16}')
+    for max_len in (60, 1440, 10080, 100000):
+        for name, deque_class in implementations:
+            append = bench(deque_class, max_len, n_appends, False)
+            read = bench(deque_class, max_len, n_appends, True)
+            print(f'{name:<12}{max_len:>10}{append:>12.1f}{read:>16.1f}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
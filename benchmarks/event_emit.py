@@ -0,0 +1,37 @@
+"""
+    Event.emit 的微基准: 编译的扩展与纯Python实现, 分别在 0 / 1 / 3 个订阅者时的耗时
+
+    python -m benchmarks.event_emit [n_emits]
+"""
+import sys
+import timeit
+
+from myalgo.event import event
+
+
+def handler(*args):
+    pass
+
+
+def bench(event_class, handlers, n_emits):
+    e = event_class()
+    for i in range(handlers):
+        e.subscribe(lambda *args: handler(*args))
+    return min(timeit.repeat(lambda: e.emit(1, 2, 3), number=n_emits, repeat=5)) / n_emits * 1e9
+
+
+def main(n_emits=1000000):
+    implementations = [('python', event.PyEvent)]
+    if event.NATIVE:
+        implementations.append(('native', event.Event))
+    else:
+        print('native Event is not built, run `python setup.py build_ext --inplace` first')
+
+    print(f'{"impl":<10}{"handlers":>10}{"ns/emit":>12}')
+    for name, event_class in implementations:
+        for handlers in (0, 1, 3):
+            print(f'{name:<10}{handlers:>10}{bench(event_class, handlers, n_emits):>12.1f}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,180 @@
+"""
+    订单对象的内存与分配基准: 模拟一次高换手的回测, 创建 n 个限价单, 每个订单经过
+    提交 -> 接受 -> 成交, 产生 FillInfo, Execution 以及三个 OrderEvent, 订单保留到回测结束(像 Position 与分析器那样)
+
+    对比 __slots__ 的实现与原来带 __dict__ 的实现(包括成交记录被追加两次):
+        time: 不开 tracemalloc 时的耗时
+        retained: 回测结束时仍然被引用的内存
+        peak: 过程中的内存峰值
+        blocks: 仍然被引用的内存块个数
+
+    python -m benchmarks.orders [n_orders]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from myalgo.order import Action, Execution, LimitOrder, OrderEvent, State, Type
+from myalgo.order.fill import FillInfo
+
+
+class DictOrder(object):
+    """
+        原来的实现, 每个实例一个 __dict__
+    """
+
+    def __init__(self, type_, action, instrument, quantity, round_quantity=int):
+        self.__state = State.INITIAL
+        self.__type = type_
+        self.__action = action
+        self.__quantity = quantity
+        self.__roundQuantity = round_quantity
+        self.__executionInfo = []
+        self.__instrument = instrument
+        self.__good_till_canceled = False
+        self.__allOrNone = False
+        self.__id = None
+        self.__submitted_at = None
+        self.__canceled_at = None
+        self.__accepted_at = None
+
+        self.total_cost = 0.0
+        self.total_commission = 0.0
+        self.avg_fill_price = 0.0
+        self.filled = 0
+        self.remain = quantity
+        self.state = State.INITIAL
+
+    @property
+    def quantity(self):
+        return self.__quantity
+
+    def submitted(self, _id, at):
+        self.__id = _id
+        self.__submitted_at = at
+        self.state = State.SUBMITTED
+        return self
+
+    def accepted(self, at):
+        self.__accepted_at = at
+        self.state = State.ACCEPTED
+        return self
+
+    def execute(self, execution):
+        self.__execute(execution)
+        self.__executionInfo.append(execution)
+
+    def __execute(self, execution):
+        self.remain -= execution.quantity
+        self.filled += execution.quantity
+        self.total_cost += execution.quantity * execution.price
+        self.avg_fill_price = self.total_cost / float(self.filled)
+        self.total_commission += execution.commission
+
+        self.__executionInfo.append(execution)
+
+        if self.remain > 0:
+            self.state = State.PARTIALLY_FILLED
+        else:
+            self.state = State.FILLED
+            self.filled_at = execution.datetime
+
+
+class DictLimitOrder(DictOrder):
+    def __init__(self, action, instrument, limit_price, quantity, round_quantity=int):
+        super(DictLimitOrder, self).__init__(Type.LIMIT, action, instrument, quantity, round_quantity)
+        self.__limitPrice = limit_price
+
+    @property
+    def price(self):
+        return self.__limitPrice
+
+
+class DictFillInfo(object):
+    def __init__(self, price, quantity):
+        self.__price = price
+        self.__quantity = quantity
+
+    @property
+    def price(self):
+        return self.__price
+
+    @property
+    def quantity(self):
+        return self.__quantity
+
+
+class DictExecution(object):
+    def __init__(self, price, quantity, commission, datetime):
+        self.price = price
+        self.quantity = quantity
+        self.commission = commission
+        self.datetime = datetime
+
+
+class DictOrderEvent(object):
+    def __init__(self, order, _type, _info):
+        self.__order = order
+        self.__type = _type
+        self.__info = _info
+
+
+SLOTS = (LimitOrder, FillInfo, Execution, OrderEvent)
+DICT = (DictLimitOrder, DictFillInfo, DictExecution, DictOrderEvent)
+
+
+def run(classes, n_orders):
+    order_class, fill_class, execution_class, event_class = classes
+    start = datetime(2019, 1, 1)
+    minute = timedelta(minutes=1)
+    orders = []
+    events = []
+    for i in range(n_orders):
+        at = start + i * minute
+        action = Action.BUY if i % 2 == 0 else Action.SELL
+        order_ = order_class(action, 'EURUSD', 1.1 + (i % 100) * 1e-4, 1000)
+        order_.submitted(i, at)
+        events.append(event_class(order_, State.SUBMITTED, None))
+        order_.accepted(at)
+        events.append(event_class(order_, State.ACCEPTED, None))
+        fill_info = fill_class(order_.price, order_.quantity)
+        execution = execution_class(fill_info.price, fill_info.quantity, 0.0, at)
+        order_.execute(execution)
+        events.append(event_class(order_, State.FILLED, execution))
+        orders.append(order_)
+    # 事件派发之后就不再被引用
+    events.clear()
+    return orders
+
+
+def measure(classes, n_orders):
+    gc.collect()
+    begin = time.perf_counter()
+    orders = run(classes, n_orders)
+    elapsed = time.perf_counter() - begin
+    del orders
+
+    gc.collect()
+    tracemalloc.start()
+    orders = run(classes, n_orders)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    del orders
+    return elapsed, retained, peak, blocks
+
+
+def main(n_orders=1000000):
+    print(f'{n_orders} orders')
+    print(f'{"impl":<8}{"time(s)":>10}{"retained(MB)":>15}{"peak(MB)":>12}{"blocks":>12}{"bytes/order":>14}')
+    for name, classes in (('slots', SLOTS), ('dict', DICT)):
+        elapsed, retained, peak, blocks = measure(classes, n_orders)
+        print(f'{name:<8}{elapsed:>10.2f}{retained / 2 ** 20:>15.1f}{peak / 2 ** 20:>12.1f}{blocks:>12}'
+              f'{retained / n_orders:>14.1f}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
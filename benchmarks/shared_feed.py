@@ -0,0 +1,71 @@
+"""
+    对比把 BarStore 直接传给子进程(序列化复制)与共享内存 SharedBarStore 的启动耗时和每个子进程的私有内存
+
+    私有内存读取自 /proc/<pid>/smaps_rollup, 只能在linux上运行
+
+    python -m benchmarks.shared_feed [n_bars] [n_workers]
+"""
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+from myalgo.bar import BarStore, Frequency
+
+
+def private_bytes():
+    ret = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Private_'):
+                ret += int(line.split()[1]) * 1024
+    return ret
+
+
+def worker(store, queue):
+    # 读一遍数据, 确认映射的页都真正被访问过
+    total = float(store.data.sum(dtype=np.float64))
+    queue.put((time.perf_counter(), private_bytes(), total))
+
+
+def measure(context, store, n_workers):
+    queue = context.Queue()
+    start = time.perf_counter()
+    processes = [context.Process(target=worker, args=(store, queue)) for _ in range(n_workers)]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    ready = max(result[0] for result in results) - start
+    memory = sum(result[1] for result in results) / n_workers
+    return ready, memory, results[0][2]
+
+
+def main(n_bars=2000000, n_workers=4):
+    timestamps = np.datetime64('2015-01-01T00:00', 'm') + np.arange(n_bars)
+    data = np.random.random((n_bars, 1, 9)).astype(np.float32)
+    store = BarStore(['INST0'], timestamps, data, Frequency.MINUTE)
+
+    # spawn 启动的子进程会把参数序列化一遍, 差别最明显
+    context = multiprocessing.get_context('spawn')
+
+    print(f'{n_bars} bars ({store.nbytes / 2 ** 20:.1f} MB), {n_workers} workers')
+    print(f'{"backend":<10}{"ready (s)":>12}{"private MB/worker":>20}')
+
+    elapsed, memory, expected = measure(context, store, n_workers)
+    print(f'{"pickled":<10}{elapsed:>12.3f}{memory / 2 ** 20:>20.1f}')
+
+    shared = store.share()
+    try:
+        elapsed, memory, total = measure(context, shared, n_workers)
+        assert total == expected
+        print(f'{"shared":<10}{elapsed:>12.3f}{memory / 2 ** 20:>20.1f}')
+    finally:
+        shared.release()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
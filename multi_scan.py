@@ -36,7 +36,7 @@ if __name__ == '__main__':
     # Load the bar feed from the CSV files.
 
     for instrument in instruments:
-        feed = SQLiteFeed(instruments=[instrument], table_name='bins', file_name='sqlite')
+        feed = SQLiteFeed(instruments=[instrument], table_name='bins', file_name='sqlite', cache='bar_cache')
         feed.load_data(datetime.datetime(2014, 1, 1, 20, 25), datetime.datetime(2017, 1, 1, 20, 25))
         local.run(strategies.orindary.OrindaryStr, feed, parameters_generator(instrument), batchSize=2,
                   logLevel=logging.DEBUG, result_file=f"result_data/{instrument}.sqlite", workerCount=30)
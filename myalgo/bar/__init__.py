@@ -1,2 +1,4 @@
 from myalgo.bar.bar import Bar, Frequency
-from myalgo.bar.bars import Bars
\ No newline at end of file
+from myalgo.bar.bars import Bars
+from myalgo.bar.store import BarStore, StoreBars
+from myalgo.bar.shared import SharedBarStore
@@ -24,6 +24,8 @@ class Bar:
 
     """
 
+    __slots__ = ('start_date', 'end_date', 'data')
+
     def __init__(self, start_date: np.datetime64, end_date: np.datetime64, data: np.array):
         """
             date is in `np.datetime64[m]`
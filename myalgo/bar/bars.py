@@ -59,3 +59,6 @@ class Bars(object):
 
     def bar(self, instrument):
         return self.__barDict.get(instrument, None)
+
+    def latest_bar(self, instrument):
+        return self.bar(instrument)
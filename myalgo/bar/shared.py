@@ -0,0 +1,129 @@
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from myalgo.bar.store import BarStore
+
+"""
+    共享内存中的 BarStore: 时间戳与柱状数据各自放在一块 multiprocessing.shared_memory 中,
+    子进程按名字映射同一块内存, 不复制数据。
+
+    序列化时只传递共享内存的名字与形状, 所以无论是 fork 还是 spawn 启动的子进程,
+    启动的开销都与数据量无关, 内存占用也不会随着进程数增长。
+"""
+
+
+class _Segment(shared_memory.SharedMemory):
+
+    def close(self):
+        try:
+            super(_Segment, self).close()
+        except BufferError:
+            # 还有数组引用这块内存, 映射会在它们被回收的时候解除
+            pass
+
+
+def _attach_segment(name):
+    """
+        映射一块已经存在的共享内存, 不交给 resource_tracker 管理
+
+        共享内存的生命周期由创建者负责, 否则挂载它的子进程退出的时候 resource_tracker 会把它 unlink 掉
+    """
+    try:
+        return _Segment(name=name, track=False)
+    except TypeError:
+        pass
+
+    # python < 3.13 没有 track 参数, 挂载时也会登记; 子进程与父进程共用同一个 resource_tracker,
+    # 事后 unregister 会把创建者的登记一起删掉, 所以只能在挂载期间跳过登记
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == 'shared_memory' else register(name, rtype)
+    try:
+        return _Segment(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _view(segment, shape, dtype):
+    # frombuffer 会持有这块内存的引用, 这样 close 之后已经拿到的视图仍然有效
+    count = int(np.prod(shape))
+    ret = np.frombuffer(segment.buf, dtype=dtype, count=count).reshape(shape)
+    ret.flags.writeable = False
+    return ret
+
+
+class SharedBarStore(BarStore):
+    """A read-only :class:`BarStore` whose arrays live in :mod:`multiprocessing.shared_memory`.
+
+    Use :meth:`BarStore.share` or :meth:`SharedBarStore.create` to build one. Pickling only sends the
+    segment names, and unpickling attaches to the same memory.
+
+    .. note::
+        The process that created the store owns the memory and must call :meth:`release` once every
+        worker is done with it.
+    """
+
+    def __init__(self, instruments, frequency, timestamps_segment, data_segment, length, owner=False, valid=None):
+        self.__timestamps_segment = timestamps_segment
+        self.__data_segment = data_segment
+        # fork 出来的子进程会继承这个对象, 只有创建者所在的进程负责释放
+        self.__owner_pid = os.getpid() if owner else None
+
+        timestamps = _view(timestamps_segment, (length,), 'datetime64[m]')
+        data = _view(data_segment, (length, len(instruments), 9), np.float32)
+        # 有效性标记只有数据的 1/36, 直接随对象一起序列化
+        super(SharedBarStore, self).__init__(instruments, timestamps, data, frequency, valid)
+
+    @classmethod
+    def create(cls, store: BarStore):
+        """Copies the bars of ``store`` into new shared memory segments."""
+        timestamps = np.ascontiguousarray(store.timestamps, dtype='datetime64[m]')
+        data = np.ascontiguousarray(store.data, dtype=np.float32)
+
+        # 大小为0的共享内存是不允许的
+        timestamps_segment = _Segment(create=True, size=max(timestamps.nbytes, 1))
+        try:
+            data_segment = _Segment(create=True, size=max(data.nbytes, 1))
+        except Exception:
+            timestamps_segment.close()
+            timestamps_segment.unlink()
+            raise
+
+        np.ndarray(timestamps.shape, dtype=timestamps.dtype, buffer=timestamps_segment.buf)[:] = timestamps
+        np.ndarray(data.shape, dtype=data.dtype, buffer=data_segment.buf)[:] = data
+
+        return cls(store.instruments, store.frequency, timestamps_segment, data_segment, len(store), owner=True,
+                   valid=store.valid)
+
+    @classmethod
+    def attach(cls, instruments, frequency, timestamps_name, data_name, length, valid=None):
+        """Attaches to the segments created by another process."""
+        return cls(instruments, frequency, _attach_segment(timestamps_name), _attach_segment(data_name), length,
+                   valid=valid)
+
+    def __reduce__(self):
+        return (SharedBarStore.attach, (self.instruments, self.frequency, self.__timestamps_segment.name,
+                                        self.__data_segment.name, len(self), self.valid))
+
+    @property
+    def owner(self):
+        return self.__owner_pid == os.getpid()
+
+    def share(self):
+        return self
+
+    def release(self):
+        """Unmaps the memory, and frees it if this process created it.
+
+        Views that are still alive keep the mapping valid, the memory itself goes away with the last of them.
+        """
+        owner = self.owner
+        for segment in (self.__timestamps_segment, self.__data_segment):
+            if owner:
+                try:
+                    segment.unlink()
+                except FileNotFoundError:
+                    pass
+            segment.close()
+        self.__owner_pid = None
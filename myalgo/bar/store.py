@@ -0,0 +1,395 @@
+import numpy as np
+
+from myalgo.bar.bar import Bar, Frequency
+
+"""
+    列式存储: 所有标的的柱状数据放在一个连续的 (n_bars, n_instruments, 9) 数组中,
+    时间戳单独放在一个 datetime64[m] 数组中。
+
+    Bar 与 Bars 只在被访问的时候才创建, 并且只是数组上的视图, 不复制数据。
+"""
+
+
+class StoreBars(object):
+    """A lazy :class:`myalgo.bar.Bars` look-alike backed by one row of a :class:`BarStore`.
+
+    :class:`Bar` objects are only built when an instrument is accessed, and their ``data`` is a view
+    into the store, so nothing is copied.
+    """
+
+    __slots__ = ('__store', '__index', '__barDict', '__dateTime')
+
+    def __init__(self, store, index):
+        self.__store = store
+        self.__index = index
+        self.__barDict = {}
+        self.__dateTime = None
+
+    def __getitem__(self, instrument):
+        ret = self.bar(instrument)
+        if ret is None:
+            raise KeyError(instrument)
+        return ret
+
+    def __contains__(self, instrument):
+        column = self.__store.instrument_index(instrument)
+        return column is not None and self.__store.is_valid(self.__index, column)
+
+    @property
+    def index(self):
+        return self.__index
+
+    @property
+    def store(self):
+        return self.__store
+
+    @property
+    def items(self):
+        return [(instrument, self.bar(instrument)) for instrument in self.instruments]
+
+    @property
+    def keys(self):
+        return self.instruments
+
+    @property
+    def instruments(self):
+        """Returns the symbols of the instruments that have a bar."""
+        if self.__store.valid is None:
+            return list(self.__store.instruments)
+        return [instrument for instrument in self.__store.instruments if instrument in self]
+
+    @property
+    def datetime(self):
+        """Returns the :class:`datetime.datetime` for this set of bars."""
+        if self.__dateTime is None:
+            self.__dateTime = self.__store.datetime_at(self.__index)
+        return self.__dateTime
+
+    def bar(self, instrument):
+        ret = self.__barDict.get(instrument, None)
+        if ret is None:
+            column = self.__store.instrument_index(instrument)
+            if column is None or not self.__store.is_valid(self.__index, column):
+                return None
+            start_date = self.datetime
+            ret = Bar(start_date, start_date + self.__store.period, self.__store.data[self.__index, column])
+            self.__barDict[instrument] = ret
+        return ret
+
+    def latest_bar(self, instrument):
+        """Returns the bar of ``instrument``, or its last valid bar before this one if it has none here."""
+        ret = self.bar(instrument)
+        if ret is None:
+            ret = self.__store.latest_bar(self.__index, instrument)
+        return ret
+
+
+class BarStore(object):
+    """Columnar storage for the bars of a feed.
+
+    :param instruments: The instruments, in column order.
+    :type instruments: list.
+    :param timestamps: The start date of every bar, as ``datetime64[m]``.
+    :type timestamps: :class:`numpy.ndarray`.
+    :param data: A ``(n_bars, n_instruments, 9)`` array laid out like :attr:`Bar.data`.
+    :type data: :class:`numpy.ndarray`.
+    :param frequency: The bar frequency.
+    :type frequency: :class:`Frequency`.
+    :param valid: A ``(n_bars, n_instruments)`` boolean mask of the bars that really exist, or None if they all do.
+        Rows outside the mask hold NaN or forward filled prices, see :meth:`join`.
+    :type valid: :class:`numpy.ndarray`.
+
+    .. note::
+        Indexing the store returns a :class:`StoreBars`, so it can be used wherever a list of
+        :class:`myalgo.bar.Bars` was used before.
+    """
+
+    def __init__(self, instruments, timestamps, data, frequency=Frequency.MINUTE, valid=None):
+        if not isinstance(frequency, Frequency):
+            frequency = Frequency(frequency)
+
+        timestamps = np.asarray(timestamps, dtype='datetime64[m]')
+        data = np.asarray(data, dtype=np.float32)
+
+        assert data.ndim == 3 and data.shape[2] == 9, f'invalid bar matrix shape {data.shape}'
+        assert data.shape[0] == timestamps.shape[0], "timestamps and bars are not aligned"
+        assert data.shape[1] == len(instruments), "instruments and bars are not aligned"
+        if valid is not None:
+            valid = np.asarray(valid, dtype=np.bool_)
+            assert valid.shape == data.shape[:2], "validity mask and bars are not aligned"
+
+        self.__instruments = list(instruments)
+        self.__columns = {instrument: column for column, instrument in enumerate(self.__instruments)}
+        self.__timestamps = timestamps
+        self.__data = data
+        self.__frequency = frequency
+        self.__period = np.timedelta64(max(frequency.value, 0), 'm').item()
+        self.__valid = valid
+        # 每个位置上每个标的最后一根有效bar的行号, 用到的时候才计算
+        self.__last_valid = None
+        # 这个 store 之前(比如流式 feed 的上一块)每个标的最后一根有效bar, 见 carry
+        self.__previous = None
+
+        # 派发时同一根bar会被反复访问, 缓存最近的两个视图(last_bars 与 current_bars)
+        self.__cache = {}
+
+    @classmethod
+    def empty(cls, instruments=(), frequency=Frequency.MINUTE):
+        return cls(instruments, np.zeros(0, dtype='datetime64[m]'),
+                   np.zeros((0, len(instruments), 9), dtype=np.float32), frequency)
+
+    @classmethod
+    def from_bars(cls, bars, instruments=None, frequency=Frequency.MINUTE):
+        """Builds a store from a sequence of ``{instrument: Bar}`` dicts or :class:`myalgo.bar.Bars`."""
+        bars = list(bars)
+        if len(bars) == 0:
+            return cls.empty(instruments if instruments is not None else [], frequency)
+
+        first = bars[0]
+        if instruments is None:
+            instruments = list(first.keys()) if isinstance(first, dict) else first.instruments
+
+        timestamps = np.empty(len(bars), dtype='datetime64[m]')
+        data = np.zeros((len(bars), len(instruments), 9), dtype=np.float32)
+
+        for i, bar_dict in enumerate(bars):
+            get = bar_dict.get if isinstance(bar_dict, dict) else bar_dict.bar
+            timestamps[i] = get(instruments[0]).start_date
+            for column, instrument in enumerate(instruments):
+                data[i, column] = get(instrument).data
+
+        return cls(instruments, timestamps, data, frequency)
+
+    @classmethod
+    def join(cls, columns, frequency=Frequency.MINUTE, how='inner', fill=False):
+        """Builds a store from the bars of every instrument, aligned on their timestamps.
+
+        :param columns: ``{instrument: (timestamps, bars)}``, where ``bars`` is a ``(n, 9)`` array and the timestamps
+            are sorted and unique.
+        :type columns: dict.
+        :param how: ``'inner'`` keeps only the timestamps every instrument has. ``'outer'`` keeps all of them, and
+            marks the missing bars in :attr:`valid`.
+        :type how: string.
+        :param fill: With ``how='outer'``, fill a missing bar with a flat bar at the last close price of the
+            instrument instead of NaN. Filled bars are still invalid, so orders are not processed on them.
+        :type fill: boolean.
+        """
+        if how not in ('inner', 'outer'):
+            raise Exception("Invalid join %s" % how)
+
+        instruments = list(columns.keys())
+        if len(instruments) == 0:
+            return cls.empty([], frequency)
+
+        series = []
+        for instrument in instruments:
+            timestamps, bars = columns[instrument]
+            series.append((np.asarray(timestamps, dtype='datetime64[m]'), np.asarray(bars, dtype=np.float32)))
+
+        if len(series) == 1:
+            timestamps, bars = series[0]
+            return cls(instruments, timestamps, bars.reshape(bars.shape[0], 1, 9), frequency)
+
+        # 先求出时间戳的交集或者并集, 再用 searchsorted 找到每个标的对应的行
+        index = series[0][0]
+        for timestamps, _ in series[1:]:
+            if how == 'inner':
+                index = np.intersect1d(index, timestamps, assume_unique=True)
+            else:
+                index = np.union1d(index, timestamps)
+
+        data = np.full((index.shape[0], len(instruments), 9), np.nan, dtype=np.float32)
+        valid = np.ones((index.shape[0], len(instruments)), dtype=np.bool_)
+        for column, (timestamps, bars) in enumerate(series):
+            rows = np.searchsorted(timestamps, index)
+            if how == 'inner':
+                data[:, column] = bars[rows]
+                continue
+
+            found = rows < timestamps.shape[0]
+            found[found] = timestamps[rows[found]] == index[found]
+            data[found, column] = bars[rows[found]]
+            valid[:, column] = found
+
+            if fill and not found.all():
+                last = np.maximum.accumulate(np.where(found, np.arange(index.shape[0]), -1))
+                missing = ~found & (last >= 0)
+                previous = data[last[missing], column]
+                filled = np.zeros((previous.shape[0], 9), dtype=np.float32)
+                filled[:, 0:4] = previous[:, 1:2]
+                filled[:, 4:8] = previous[:, 5:6]
+                data[missing, column] = filled
+
+        return cls(instruments, index, data, frequency, None if valid.all() else valid)
+
+    def __len__(self):
+        return self.__timestamps.shape[0]
+
+    def __getitem__(self, index):
+        ret = self.__cache.get(index)
+        if ret is None:
+            length = self.__timestamps.shape[0]
+            if index < 0:
+                index += length
+            if not 0 <= index < length:
+                raise IndexError(index)
+            if len(self.__cache) >= 2:
+                self.__cache.pop(min(self.__cache))
+            ret = StoreBars(self, index)
+            self.__cache[index] = ret
+        return ret
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_BarStore__cache'] = {}
+        state['_BarStore__last_valid'] = None
+        return state
+
+    @property
+    def instruments(self):
+        return self.__instruments
+
+    @property
+    def timestamps(self):
+        return self.__timestamps
+
+    @property
+    def data(self):
+        return self.__data
+
+    @property
+    def frequency(self):
+        return self.__frequency
+
+    @property
+    def period(self):
+        return self.__period
+
+    @property
+    def valid(self):
+        return self.__valid
+
+    @property
+    def nbytes(self):
+        ret = self.__data.nbytes + self.__timestamps.nbytes
+        if self.__valid is not None:
+            ret += self.__valid.nbytes
+        return ret
+
+    def has_instrument(self, instrument):
+        return instrument in self.__columns
+
+    def instrument_index(self, instrument):
+        return self.__columns.get(instrument, None)
+
+    def instrument_bars(self, instrument):
+        """Returns the ``(n_bars, 9)`` view of one instrument."""
+        return self.__data[:, self.__columns[instrument], :]
+
+    def datetime_at(self, index):
+        return self.__timestamps[index].item()
+
+    def is_valid(self, index, column):
+        return self.__valid is None or bool(self.__valid[index, column])
+
+    def latest_bar(self, index, instrument):
+        """Returns the last valid :class:`Bar` of ``instrument`` at or before ``index``, or None."""
+        column = self.__columns.get(instrument, None)
+        if column is None:
+            return None
+        if self.__valid is not None:
+            index = self.__last_valid_rows()[index, column]
+            if index < 0:
+                return self.__previous_bar(column)
+        start_date = self.datetime_at(index)
+        return Bar(start_date, start_date + self.__period, self.__data[index, column])
+
+    def __previous_bar(self, column):
+        if self.__previous is None:
+            return None
+        timestamps, data, valid = self.__previous
+        if not valid[column]:
+            return None
+        start_date = timestamps[column].item()
+        return Bar(start_date, start_date + self.__period, data[column])
+
+    def latest_values(self, index, field):
+        """Returns ``data[:, field]`` of the last valid bar of every instrument at or before ``index``.
+
+        :param field: The position in :attr:`Bar.data`, e.g. 5 for bid_close.
+        :rtype: A float64 :class:`numpy.ndarray` in instrument order, NaN for the instruments without a bar yet.
+        """
+        if self.__valid is None:
+            return self.__data[index, :, field].astype(np.float64)
+        rows = self.__last_valid_rows()[index]
+        ret = self.__data[rows, np.arange(rows.shape[0]), field].astype(np.float64)
+        missing = rows < 0
+        if self.__previous is None:
+            ret[missing] = np.nan
+        else:
+            _, data, valid = self.__previous
+            ret[missing] = np.where(valid, data[:, field], np.nan)[missing]
+        return ret
+
+    def last_valid_bars(self):
+        """Returns the last valid bar of every instrument in the store, including the ones carried by :meth:`carry`.
+
+        :rtype: (``datetime64[m]`` start dates, ``(n_instruments, 9)`` data, boolean mask of the instruments that have
+            one), all in instrument order.
+        """
+        n = len(self.__instruments)
+        if len(self) == 0:
+            rows = np.full(n, -1, dtype=np.int32)
+        elif self.__valid is None:
+            rows = np.full(n, len(self) - 1, dtype=np.int32)
+        else:
+            rows = self.__last_valid_rows()[-1]
+        valid = rows >= 0
+        timestamps = self.__timestamps[np.maximum(rows, 0)] if len(self) > 0 else np.zeros(n, dtype='datetime64[m]')
+        data = self.__data[np.maximum(rows, 0), np.arange(n)] if len(self) > 0 else np.zeros((n, 9), np.float32)
+        if self.__previous is not None:
+            previous_timestamps, previous_data, previous_valid = self.__previous
+            timestamps = np.where(valid, timestamps, previous_timestamps)
+            data = np.where(valid[:, None], data, previous_data)
+            valid = valid | previous_valid
+        return timestamps, data, valid
+
+    def carry(self, previous):
+        """Continues ``previous``, the store right before this one (e.g. the previous chunk of a streaming feed).
+
+        :meth:`latest_bar` and :meth:`latest_values` fall back to the last valid bar of ``previous`` for the
+        instruments that have no valid bar yet in this store, like they would on one store holding both.
+        """
+        timestamps, data, valid = previous.last_valid_bars()
+        if valid.shape[0] == 0:
+            self.__previous = None
+            return
+        if list(previous.instruments) != self.__instruments:
+            # 按标的对齐, previous 中没有的标的没有可用的bar
+            columns = np.array([previous.instrument_index(instrument) if previous.has_instrument(instrument) else -1
+                                for instrument in self.__instruments], dtype=np.int64)
+            found = columns >= 0
+            columns = np.maximum(columns, 0)
+            timestamps, data, valid = timestamps[columns], data[columns], valid[columns] & found
+        self.__previous = (timestamps, data, valid)
+
+    def __last_valid_rows(self):
+        if self.__last_valid is None:
+            rows = np.arange(len(self), dtype=np.int32)[:, None]
+            self.__last_valid = np.maximum.accumulate(np.where(self.__valid, rows, -1), axis=0)
+        return self.__last_valid
+
+    def slice(self, start, stop):
+        """Returns the rows ``[start, stop)`` as a new store. The arrays are views, nothing is copied."""
+        valid = self.__valid[start:stop] if self.__valid is not None else None
+        return BarStore(self.__instruments, self.__timestamps[start:stop], self.__data[start:stop],
+                        self.__frequency, valid)
+
+    def share(self):
+        """Returns a copy of the store in shared memory, see :class:`myalgo.bar.shared.SharedBarStore`."""
+        from myalgo.bar.shared import SharedBarStore
+        return SharedBarStore.create(self)
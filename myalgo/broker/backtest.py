@@ -1,5 +1,6 @@
 from datetime import datetime
 
+import numpy as np
 import six
 
 import myalgo.logger
@@ -8,8 +9,17 @@ from myalgo.broker.base import BaseBroker
 from myalgo.broker.commission import Commission
 from myalgo.event import Event
 from myalgo.feed.barfeed import BaseBarFeed
-from myalgo.order import LimitOrder, Action, Order, Execution, OrderEvent, State, MarketOrder, StopLimitOrder, StopOrder
-from myalgo.order.fill import FillInfo
+from myalgo.order import LimitOrder, Action, Order, Execution, OrderEvent, State, MarketOrder, StopLimitOrder, StopOrder, \
+    Type
+from myalgo.broker.orderbook import OrderBook
+from myalgo.order.fill import FillInfo, BID_CLOSE
+
+# 一个标的上的订单不少于这个数的时候批量撮合(见 OrderBook), 订单少的时候逐个处理更快;
+# 订单数第一次达到这个数的时候才建立 OrderBook, 之后增量维护, 直到这个标的上没有订单
+BATCH_FILL = 8
+
+# 可以批量撮合的订单类型, 重写了 process 的子类逐个处理
+BATCH_ORDERS = (MarketOrder, LimitOrder, StopOrder, StopLimitOrder)
 
 
 class BackTestBroker(BaseBroker):
@@ -22,8 +32,20 @@ class BackTestBroker(BaseBroker):
         self.__cash = self.__initial_cash = cash
 
         self.__next_order_id = 0
+        # 活跃的订单, 同时按标的与订单类型建立索引, 每根bar只需要看有bar的标的上的订单
+        # 每个字典中订单都按 id 的顺序排列(先提交的先插入)
         self.__active_orders = {}
+        self.__orders_by_instrument = {}
+        self.__orders_by_type = {}
+        # 每个标的上的订单的批量撮合
+        self.__books = {}
         self.__quantities = {}
+        # 按 feed 中标的的顺序排列的持仓, 与上一根bar的 bid_close 一列做点积就是持仓的市值
+        self.__positions = None
+        self.__position_instruments = None
+        # 持仓市值的缓存与它对应的 last_bars, 每根bar只计算一次, 成交之后作废
+        self.__market_value = None
+        self.__market_bars = None
         self.__logger = myalgo.logger.get_logger("Broker_log")
 
         self.__order_events = Event()
@@ -34,7 +56,7 @@ class BackTestBroker(BaseBroker):
         self.__bar_feed.feed_reset_event.subscribe(self.__on_feed_change)
         self.__started = False
 
-        super(BaseBroker, self).__init__(bar_feed.instruments)
+        super(BackTestBroker, self).__init__(bar_feed.instruments)
 
     @property
     def quantities(self):
@@ -61,21 +83,43 @@ class BackTestBroker(BaseBroker):
         assert (order_.id not in self.__active_orders)
         assert (order_.id is not None)
         self.__active_orders[order_.id] = order_
+        orders = self.__orders_by_instrument.setdefault(order_.instrument, {})
+        orders[order_.id] = order_
+        self.__orders_by_type.setdefault(order_.type, {})[order_.id] = order_
+        book = self.__books.get(order_.instrument)
+        if book is not None:
+            book.add(order_)
+        elif len(orders) >= BATCH_FILL:
+            self.__books[order_.instrument] = OrderBook(BATCH_ORDERS, list(orders.values()))
 
     def unregister_order(self, order_: Order):
         assert (order_.id in self.__active_orders)
         assert (order_.id is not None)
         del self.__active_orders[order_.id]
+        self.__remove_index(self.__orders_by_instrument, order_.instrument, order_.id)
+        self.__remove_index(self.__orders_by_type, order_.type, order_.id)
+        book = self.__books.get(order_.instrument)
+        if book is not None:
+            if order_.instrument in self.__orders_by_instrument:
+                book.remove(order_)
+            else:
+                del self.__books[order_.instrument]
+
+    @staticmethod
+    def __remove_index(index, key, order_id):
+        orders = index[key]
+        del orders[order_id]
+        # 没有订单的标的不再留在索引中, on_bars 不需要看它
+        if not orders:
+            del index[key]
 
     @property
     def logger(self):
         return self.__logger
 
     def get_bar(self, bars, instrument):
-        ret = bars.bar(instrument)
-        if ret is None:
-            ret = self.__bar_feed.last_bar(instrument)
-        return ret
+        # 按 bars 的有效性标记取当前或者之前最后一根有效的bar
+        return bars.latest_bar(instrument)
 
     def cash(self, include_short=True):
         ret = self.__cash
@@ -89,15 +133,34 @@ class BackTestBroker(BaseBroker):
 
     @property
     def equity(self):
-        """Returns the portfolio value (cash + shares * price)."""
-        ret = self.__cash
-        for instrument, shares in six.iteritems(self.__quantities):
-            if self.__bar_feed.last_bar(instrument) is None:
-                continue
-            instrument_price = self.__bar_feed.last_bar(instrument).out_price
-            assert instrument_price is not None, "Price for %s is missing" % instrument
-            ret += instrument_price * shares
-        return ret
+        """Returns the portfolio value (cash + shares * price).
+
+        持仓按上一根bar(没有bar的标的取它最后一根有效的bar)的 bid_close 计价, 分析器每根bar都会读好几次,
+        所以持仓的市值每根bar只计算一次, 有成交的时候才重新计算
+        """
+        bars = self.__bar_feed.last_bars
+        if bars is None:
+            return self.__cash
+        if self.__market_value is None or bars is not self.__market_bars:
+            store = bars.store
+            prices = store.latest_values(bars.index, BID_CLOSE)
+            # 还没有bar的标的不计价
+            self.__market_value = float(np.dot(self.__position_vector(store), np.nan_to_num(prices)))
+            self.__market_bars = bars
+        return float(self.__cash) + self.__market_value
+
+    def __position_vector(self, store):
+        instruments = store.instruments
+        if self.__positions is None or (instruments is not self.__position_instruments and
+                                        instruments != self.__position_instruments):
+            positions = np.zeros(len(instruments))
+            for instrument, shares in six.iteritems(self.__quantities):
+                column = store.instrument_index(instrument)
+                if column is not None:
+                    positions[column] = shares
+            self.__positions = positions
+        self.__position_instruments = instruments
+        return self.__positions
 
     def create_limit_order(self, action: Action, instrument: str, limit_price: float, quantity: float):
         return LimitOrder(action, instrument, limit_price=limit_price, quantity=quantity,
@@ -149,9 +212,12 @@ class BackTestBroker(BaseBroker):
             self.__cash = resulting_cash
 
             updated_shares = order_.round_quantity(
-                self.__quantities[order_.instrument] + shares_delta
+                self.__quantities.get(order_.instrument, 0) + shares_delta
             )
             self.__quantities[order_.instrument] = updated_shares
+            # 持仓变了, 市值重新计算
+            self.__positions = None
+            self.__market_value = None
 
             # Notify the order update
             if order_.is_filled:
@@ -210,61 +276,97 @@ class BackTestBroker(BaseBroker):
                 self.unregister_order(order_)
                 order_.canceled(bar_.start_date)
                 self.notify_order_event(OrderEvent(
-                    order_, State.CANCELLED, "Expired"))
+                    order_, State.CANCELED, "Expired"))
 
-    def __process_order(self, order_, bar1: Bar, bar2: Bar):
+    def __process_order(self, order_, bar1: Bar, bar2: Bar, evaluated):
         if not self.__preprocess_order(order_, bar2):
             return
-        # Double dispatch to the fill strategy using the concrete order type.
-        fill_info = order_.process(self, bar1, bar2)
+        if evaluated is None:
+            # Double dispatch to the fill strategy using the concrete order type.
+            fill_info = order_.process(self, bar1, bar2)
+            book = self.__books.get(order_.instrument)
+            if book is not None and order_.type in (Type.STOP, Type.STOP_LIMIT):
+                book.set_stop_hit(order_, order_.stop_hit)
+        else:
+            # 已经批量撮合过了, 只需要像 process 一样更新止损是否触发
+            fill_info, stop_hit = evaluated
+            if order_.type in (Type.STOP, Type.STOP_LIMIT):
+                order_.stop_hit = stop_hit
+                self.__books[order_.instrument].set_stop_hit(order_, stop_hit)
         if fill_info is not None:
             self.commit_order_execution(fill_info, order_, bar2.start_date)
 
         if order_.is_active:
             self.__postprocess_order(order_, bar2)
 
-    def __on_bars_impl(self, order_, bars1: Bars, bars2: Bars):
-        # IF WE'RE DEALING WITH MULTIPLE INSTRUMENTS WE SKIP ORDER PROCESSING IF THERE IS NO BAR FOR THE ORDER'S
-        # INSTRUMENT TO GET THE SAME BEHAVIOUR AS IF WERE BE PROCESSING ONLY ONE INSTRUMENT.
-        bar1 = bars1.bar(order_.instrument)
-        bar2 = bars2.bar(order_.instrument)
-        if bar1 is not None and bar2 is not None:
-            # Switch from SUBMITTED -> ACCEPTED
-            if order_.is_submitted:
-                order_.accepted(bar2.start_date)
-                self.notify_order_event(
-                    OrderEvent(order_, State.ACCEPTED, None))
-
-            if order_.is_active:
-                # This may trigger orders to be added/removed from __activeOrders.
-                self.__process_order(order_, bar1, bar2)
-            else:
-                # If an order is not active it should be because it was c11anceled in this same loop and it should
-                # have been removed.
-                assert order_.is_canceled
-                assert order_ not in self.__active_orders
+    def __on_bars_impl(self, order_, bar1: Bar, bar2: Bar, evaluated):
+        # Switch from SUBMITTED -> ACCEPTED
+        if order_.is_submitted:
+            order_.accepted(bar2.start_date)
+            book = self.__books.get(order_.instrument)
+            if book is not None:
+                book.accepted(order_)
+            self.notify_order_event(
+                OrderEvent(order_, State.ACCEPTED, None))
+
+        if order_.is_active:
+            # This may trigger orders to be added/removed from __activeOrders.
+            self.__process_order(order_, bar1, bar2, evaluated)
+        else:
+            # If an order is not active it should be because it was c11anceled in this same loop and it should
+            # have been removed.
+            assert order_.is_canceled
+            assert order_.id not in self.__active_orders
 
     def on_bars(self, datetime_, bars1: Bars, bars2: Bars):
 
         # This is to froze the orders that will be processed in this event, to avoid new getting orders introduced
         # and processed on this very same event.
-        orders_to_process = list(self.__active_orders.values())
+        # IF WE'RE DEALING WITH MULTIPLE INSTRUMENTS WE SKIP ORDER PROCESSING IF THERE IS NO BAR FOR THE ORDER'S
+        # INSTRUMENT TO GET THE SAME BEHAVIOUR AS IF WERE BE PROCESSING ONLY ONE INSTRUMENT.
+        # 只看有订单的标的, 每个标的的两根bar只取一次
+        orders_to_process = []
+        instruments = 0
+        for instrument, orders in self.__orders_by_instrument.items():
+            bar2 = bars2.bar(instrument)
+            if bar2 is None:
+                continue
+            bar1 = bars1.bar(instrument)
+            if bar1 is None:
+                continue
+            if len(orders) >= BATCH_FILL:
+                # 成交只取决于订单自己与两根bar, 所以可以在处理之前一次算好, 什么都不会发生的订单不需要处理
+                orders_to_process.extend((order_, bar1, bar2, evaluated)
+                                         for order_, evaluated in self.__books[instrument].evaluate(bar1, bar2))
+            else:
+                orders_to_process.extend((order_, bar1, bar2, None) for order_ in orders.values())
+            instruments += 1
 
-        for order_ in orders_to_process:
+        # 与不分标的时一样按提交的顺序处理, 现金不够的时候先提交的订单先成交
+        if instruments > 1:
+            orders_to_process.sort(key=lambda item: item[0].id)
+
+        for order_, bar1, bar2, evaluated in orders_to_process:
             # This may trigger orders to be added/removed from __activeOrders.
-            self.__on_bars_impl(order_, bars1, bars2)
+            self.__on_bars_impl(order_, bar1, bar2, evaluated)
 
     @property
     def active_instruments(self):
         return [instrument for instrument, shares in six.iteritems(self.__quantities) if shares != 0]
 
-    def active_orders(self, instrument=None):
+    def active_orders(self, instrument=None, type_: Type = None):
+        """
+            :param instrument: 只返回这个标的的订单, None 表示全部
+            :param type_: 只返回这种类型的订单, None 表示全部
+        """
+        if instrument is None and type_ is None:
+            return list(self.__active_orders.values())
+        if type_ is None:
+            return list(self.__orders_by_instrument.get(instrument, {}).values())
+        ret = self.__orders_by_type.get(type_, {}).values()
         if instrument is None:
-            ret = list(self.__active_orders.values())
-        else:
-            ret = [order_ for order_ in self.__active_orders.values()
-                   if order_.instrument == instrument]
-        return ret
+            return list(ret)
+        return [order_ for order_ in ret if order_.instrument == instrument]
 
     def cancel_order(self, order_: Order):
         active_order = self.__active_orders.get(order_.id)
@@ -326,4 +428,10 @@ class BackTestBroker(BaseBroker):
         self.__cash = self.__initial_cash
         self.__next_order_id = 0
         self.__active_orders = {}
+        self.__orders_by_instrument = {}
+        self.__orders_by_type = {}
+        self.__books = {}
+        self.__positions = None
+        self.__market_value = None
+        self.__market_bars = None
         self.instruments = self.bar_feed.instruments
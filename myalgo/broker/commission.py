@@ -50,10 +50,14 @@ class FixedPerTrade(Commission):
         super(FixedPerTrade, self).__init__()
         self.__amount = amount
 
+    @property
+    def amount(self):
+        return self.__amount
+
     def calculate(self, order: Order, price: float, quantity: float):
         ret = 0
         # Only charge the first fill.
-        if order.executions is None:
+        if not order.executions:
             ret = self.__amount
         return ret
 
@@ -70,5 +74,9 @@ class TradePercentage(Commission):
         assert (percentage < 1)
         self.__percentage = percentage
 
+    @property
+    def percentage(self):
+        return self.__percentage
+
     def calculate(self, order: Order, price: float, quantity: float):
         return price * quantity * self.__percentage
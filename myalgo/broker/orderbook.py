@@ -0,0 +1,134 @@
+import numpy as np
+
+from myalgo.bar import Bar
+from myalgo.order import fill
+from myalgo.order.fill import NO_FILL
+
+"""
+    一个标的上的活跃订单, 撮合需要的字段按列保存在数组中, 注册/注销订单的时候增量维护
+
+    每根bar只需要一次 fill.fill_sources 的调用就得到全部订单的成交; 之后只有需要处理的订单才回到python中:
+        1. 还没有被接受的(SUBMITTED)
+        2. 不是GTC的(需要检查是否过期)
+        3. 成交了的, 或者止损是否触发发生了变化的
+        4. 不能批量撮合的(重写了 process 的子类, 或者不支持的价格类型)
+    已经接受的 GTC 订单在没有成交的bar上什么都不会发生, 所以一个标的上挂着很多限价单的时候, 大部分订单都不需要看
+"""
+
+# 初始的容量, 之后按两倍增长
+CAPACITY = 16
+
+
+class OrderBook(object):
+    """
+        :param batch_types: 可以批量撮合的订单类型, 子类重写了 process 的时候需要逐个处理
+        :param orders: 已经挂着的订单, 按当前的状态(是否已接受, 止损是否触发)建立各列
+    """
+
+    def __init__(self, batch_types, orders=()):
+        self.__batch_types = batch_types
+        self.__orders = []
+        self.__slots = {}
+        self.__allocate(max(CAPACITY, len(orders)))
+        for order_ in orders:
+            self.add(order_)
+
+    def __allocate(self, capacity):
+        size = len(self.__orders)
+        columns = [
+            ('ids', np.int64),
+            ('is_buy', np.bool_),
+            ('order_type', np.int64),
+            ('on_close', np.bool_),
+            ('stop_price', np.float64),
+            ('stop_kind', np.int64),
+            ('limit_price', np.float64),
+            ('limit_kind', np.int64),
+            ('stop_hit', np.bool_),
+            ('submitted', np.bool_),
+            # 是否可以批量撮合
+            ('batch', np.bool_),
+            # 需要每根bar都回到python中处理
+            ('always', np.bool_),
+        ]
+        for name, dtype in columns:
+            array = np.zeros(capacity, dtype=dtype)
+            if size > 0:
+                array[:size] = getattr(self, name)[:size]
+            setattr(self, name, array)
+
+    def __len__(self):
+        return len(self.__orders)
+
+    def add(self, order_):
+        slot = len(self.__orders)
+        if slot == self.ids.shape[0]:
+            self.__allocate(2 * slot)
+
+        row = fill.fill_row(order_) if type(order_) in self.__batch_types else None
+        self.ids[slot] = order_.id
+        self.submitted[slot] = order_.is_submitted
+        self.batch[slot] = row is not None
+        self.always[slot] = row is None or not order_.good_till_canceled
+        if row is not None:
+            self.is_buy[slot], self.order_type[slot], self.on_close[slot], self.stop_price[slot], \
+                self.stop_kind[slot], self.limit_price[slot], self.limit_kind[slot], self.stop_hit[slot] = row
+        else:
+            # 逐个处理的订单不参与批量撮合
+            self.order_type[slot] = fill.MARKET
+            self.stop_hit[slot] = False
+
+        self.__orders.append(order_)
+        self.__slots[order_.id] = slot
+
+    def remove(self, order_):
+        """
+            把最后一个订单搬到被删除的位置, 数组中的顺序与 id 无关
+        """
+        slot = self.__slots.pop(order_.id)
+        last = len(self.__orders) - 1
+        if slot != last:
+            moved = self.__orders[last]
+            self.__orders[slot] = moved
+            self.__slots[moved.id] = slot
+            for array in (self.ids, self.is_buy, self.order_type, self.on_close, self.stop_price, self.stop_kind,
+                          self.limit_price, self.limit_kind, self.stop_hit, self.submitted, self.batch, self.always):
+                array[slot] = array[last]
+        self.__orders.pop()
+
+    def accepted(self, order_):
+        self.submitted[self.__slots[order_.id]] = False
+
+    def set_stop_hit(self, order_, stop_hit):
+        self.stop_hit[self.__slots[order_.id]] = stop_hit
+
+    def evaluate(self, bar1: Bar, bar2: Bar):
+        """
+            批量撮合全部订单
+
+            :return: 按 id 排列的需要处理的 [(订单, (FillInfo 或者 None, 处理之后的 stop_hit))],
+                     不能批量撮合的订单结果为 None
+        """
+        n = len(self.__orders)
+        data2 = bar2.data
+        bar_kind = fill.FLOAT32 if data2.dtype == np.float32 else fill.FLOAT64
+        stop_hit = self.stop_hit[:n]
+        sources, hits = fill.fill_sources(
+            self.is_buy[:n], self.order_type[:n], self.on_close[:n], self.stop_price[:n], self.stop_kind[:n],
+            self.limit_price[:n], self.limit_kind[:n], stop_hit, bar1.data.astype(np.float64),
+            data2.astype(np.float64), bar_kind)
+
+        pending = (sources != NO_FILL) | (hits != stop_hit) | self.submitted[:n] | self.always[:n]
+        slots = np.flatnonzero(pending)
+        if slots.shape[0] > 1:
+            slots = slots[np.argsort(self.ids[slots], kind='stable')]
+
+        ret = []
+        batch = self.batch
+        for slot in slots.tolist():
+            order_ = self.__orders[slot]
+            if batch[slot]:
+                ret.append((order_, (fill.fill_info(order_, int(sources[slot]), data2), bool(hits[slot]))))
+            else:
+                ret.append((order_, None))
+        return ret
@@ -0,0 +1,312 @@
+import numpy as np
+
+from myalgo.broker.commission import Commission, NoCommission, FixedPerTrade, TradePercentage
+from myalgo.order import Type
+from myalgo.utils.jit import njit
+
+"""
+    向量化的信号回测: 不再逐根bar派发事件, 而是在编译后的循环中一次性模拟整段数据上的成交
+
+    成交规则与 myalgo.order.fill 以及各个 Order.process 完全一致, 时间上的约定也与事件驱动的回测一致:
+        1. feed 中的第0根bar不会被派发
+        2. 第 i 根bar上产生的订单, 从第 i+1 根bar开始撮合, 撮合时 bar1 = bars[i], bar2 = bars[i+1]
+        3. 派发第 i 根bar时的权益按 bars[i - 1] 的 bid_close 计算
+"""
+
+MARKET = Type.MARKET.value
+LIMIT = Type.LIMIT.value
+STOP = Type.STOP.value
+
+# bar.data 中各个价格的位置
+ASK_OPEN, ASK_CLOSE, ASK_HIGH, ASK_LOW = 0, 1, 2, 3
+BID_OPEN, BID_CLOSE, BID_HIGH, BID_LOW = 4, 5, 6, 7
+
+
+def commission_params(commission: Commission):
+    """
+        把手续费模型转换成 (每笔固定费用, 成交额比例), 编译后的代码没法回调python对象
+    """
+    if commission is None or isinstance(commission, NoCommission):
+        return 0.0, 0.0
+    if isinstance(commission, FixedPerTrade):
+        return float(commission.amount), 0.0
+    if isinstance(commission, TradePercentage):
+        return 0.0, float(commission.percentage)
+    raise Exception("Commission %s is not supported by the vectorized engine" % type(commission).__name__)
+
+
+@njit
+def limit_price_trigger(is_buy, price, bar1, bar2):
+    # 与 fill.get_limit_price_trigger 相同, 没有触发的时候返回nan
+    if is_buy:
+        if bar1[ASK_CLOSE] > price >= bar2[ASK_LOW]:
+            return price
+    else:
+        if bar1[BID_CLOSE] < price <= bar2[BID_HIGH]:
+            return price
+    return np.nan
+
+
+@njit
+def stop_price_trigger(is_buy, price, bar1, bar2):
+    # 与 fill.get_stop_price_trigger 相同, 没有触发的时候返回nan
+    if is_buy:
+        if bar1[ASK_CLOSE] < price:
+            if bar2[ASK_LOW] > price:
+                return bar2[ASK_OPEN]
+            elif price <= bar2[ASK_HIGH]:
+                return min(bar2[ASK_OPEN], price)
+    else:
+        if bar1[BID_CLOSE] > price:
+            if bar2[BID_HIGH] < price:
+                return bar2[BID_OPEN]
+            elif price >= bar2[BID_LOW]:
+                return max(bar2[BID_OPEN], price)
+    return np.nan
+
+
+@njit
+def fill_price(order_type, is_buy, price, stop_hit, bar1, bar2):
+    """
+        与 MarketOrder / LimitOrder / StopOrder 的 process 相同
+
+        :return: (成交价, 没有成交时为nan; 止损价是否已经被触发)
+    """
+    if order_type == MARKET:
+        return (bar2[ASK_OPEN] if is_buy else bar2[BID_OPEN]), stop_hit
+    elif order_type == LIMIT:
+        return limit_price_trigger(is_buy, price, bar1, bar2), stop_hit
+    else:
+        trigger = np.nan
+        if not stop_hit:
+            trigger = stop_price_trigger(is_buy, price, bar1, bar2)
+            stop_hit = not np.isnan(trigger)
+        if stop_hit:
+            if np.isnan(trigger):
+                trigger = bar2[ASK_OPEN] if is_buy else bar2[BID_OPEN]
+            return trigger, stop_hit
+        return np.nan, stop_hit
+
+
+@njit
+def simulate_batch(bars, minutes, entries, exits, cancels, prices, quantities, take_profit, stop_loss, close_stop,
+                   order_type, short, relative, good_till_canceled, max_minutes, reserve, cash, fixed_commission,
+                   commission_rate):
+    """
+        对单个标的, 同时按照 k 组参数得到的信号撮合; 外层按bar循环, 每根bar只读取一次, 各组参数同步推进
+
+        信号数组的形状都是 (k, n), 不随参数变化的可以用 np.broadcast_to 得到的视图, 不占内存。
+
+        每组参数同一时间只持有一个仓位:
+            1. 空仓时 entries 产生入场单, 数量为 quantities, 不大于0或者为nan时按 (现金 - reserve) 计算
+            2. 入场单未成交时 exits 或 cancels 撤单
+            3. 持仓时 exits 撤掉止盈止损单并以市价离场
+            4. 入场单成交后立即按成交价挂出止盈(限价)与止损(止损)单, 距离取自成交时策略能看到的最后一根bar,
+               即 take_profit[j - 1] / stop_loss[j - 1]
+            5. bar.price(bid_close) 越过 成交价 - close_stop[i] 时, 等同于 exits
+            6. 从入场单提交起超过 max_minutes 分钟, 等同于 exits, 小于0表示不限制
+
+        非GTC的订单跨日失效: 入场单失效时仓位作废, 出场单失效时改为市价离场。
+
+        :return: (每组参数每根bar上的权益, 各仓位所属的参数组, 入场价, 出场价, 带方向的成交数量, 手续费,
+                  每组参数最终的现金, 最终的持仓)
+    """
+    k = entries.shape[0]
+    n = bars.shape[0]
+    direction = -1.0 if short else 1.0
+    entry_is_buy = not short
+
+    equity = np.full((k, n), np.nan)
+
+    capacity = 0
+    for p in range(k):
+        for i in range(1, n):
+            if entries[p, i]:
+                capacity += 1
+    pos_owner = np.zeros(capacity, dtype=np.int64)
+    pos_entry = np.full(capacity, np.nan)
+    pos_exit = np.full(capacity, np.nan)
+    pos_quantity = np.zeros(capacity)
+    pos_commission = np.zeros(capacity)
+    count = 0
+
+    balance = np.full(k, cash)
+    shares = np.zeros(k)
+    current = np.full(k, -1, dtype=np.int64)
+
+    entry_active = np.zeros(k, dtype=np.bool_)
+    entry_price = np.zeros(k)
+    entry_quantity = np.zeros(k)
+    entry_stop_hit = np.zeros(k, dtype=np.bool_)
+    entry_day = np.full(k, -1, dtype=np.int64)
+    entry_minute = np.zeros(k, dtype=np.int64)
+
+    # 出场单按照提交顺序撮合: 止盈, 止损, 市价
+    tp_active = np.zeros(k, dtype=np.bool_)
+    tp_price = np.zeros(k)
+    tp_day = np.full(k, -1, dtype=np.int64)
+    sl_active = np.zeros(k, dtype=np.bool_)
+    sl_price = np.zeros(k)
+    sl_stop_hit = np.zeros(k, dtype=np.bool_)
+    sl_day = np.full(k, -1, dtype=np.int64)
+    mkt_active = np.zeros(k, dtype=np.bool_)
+    mkt_day = np.full(k, -1, dtype=np.int64)
+
+    for i in range(1, n):
+        bar1 = bars[i - 1]
+        bar2 = bars[i]
+        minute = minutes[i]
+        day = minute // 1440
+
+        for p in range(k):
+            # 1. broker 撮合在这根bar之前提交的订单
+            tp_pending = tp_active[p]
+            sl_pending = sl_active[p]
+            mkt_pending = mkt_active[p]
+
+            if entry_active[p]:
+                if entry_day[p] < 0:
+                    entry_day[p] = day
+                if not good_till_canceled and day > entry_day[p]:
+                    entry_active[p] = False
+                    current[p] = -1
+                else:
+                    price, entry_stop_hit[p] = fill_price(order_type, entry_is_buy, entry_price[p], entry_stop_hit[p],
+                                                          bar1, bar2)
+                    if not np.isnan(price):
+                        quantity = entry_quantity[p]
+                        commission = fixed_commission + price * quantity * commission_rate
+                        cost = price * quantity * (-direction) - commission
+                        if balance[p] + cost >= 0:
+                            balance[p] += cost
+                            shares[p] += direction * quantity
+                            entry_active[p] = False
+
+                            pos_entry[current[p]] = price
+                            pos_quantity[current[p]] = direction * quantity
+                            pos_commission[current[p]] += commission
+
+                            # 出场单在下一根bar才会被撮合
+                            distance = take_profit[p, i - 1]
+                            if not np.isnan(distance):
+                                tp_active[p] = True
+                                tp_day[p] = -1
+                                if relative:
+                                    tp_price[p] = price * (1 + direction * distance)
+                                else:
+                                    tp_price[p] = price + direction * distance
+                            distance = stop_loss[p, i - 1]
+                            if not np.isnan(distance):
+                                sl_active[p] = True
+                                sl_stop_hit[p] = False
+                                sl_day[p] = -1
+                                if relative:
+                                    sl_price[p] = price * (1 - direction * distance)
+                                else:
+                                    sl_price[p] = price - direction * distance
+
+            for order in range(3):
+                if current[p] < 0 or shares[p] == 0:
+                    break
+
+                price = np.nan
+                expired = False
+
+                if order == 0:
+                    if not (tp_pending and tp_active[p]):
+                        continue
+                    if tp_day[p] < 0:
+                        tp_day[p] = day
+                    expired = not good_till_canceled and day > tp_day[p]
+                    if not expired:
+                        price = limit_price_trigger(not entry_is_buy, tp_price[p], bar1, bar2)
+                elif order == 1:
+                    if not (sl_pending and sl_active[p]):
+                        continue
+                    if sl_day[p] < 0:
+                        sl_day[p] = day
+                    expired = not good_till_canceled and day > sl_day[p]
+                    if not expired:
+                        price, sl_stop_hit[p] = fill_price(STOP, not entry_is_buy, sl_price[p], sl_stop_hit[p],
+                                                           bar1, bar2)
+                else:
+                    if not (mkt_pending and mkt_active[p]):
+                        continue
+                    if mkt_day[p] < 0:
+                        mkt_day[p] = day
+                    expired = not good_till_canceled and day > mkt_day[p]
+                    if not expired:
+                        price = bar2[BID_OPEN] if entry_is_buy else bar2[ASK_OPEN]
+
+                if expired:
+                    # 出场单失效, 改为市价离场, 下一根bar撮合
+                    tp_active[p] = False
+                    sl_active[p] = False
+                    mkt_active[p] = True
+                    mkt_day[p] = -1
+                    break
+
+                if not np.isnan(price):
+                    quantity = abs(shares[p])
+                    commission = fixed_commission + price * quantity * commission_rate
+                    cost = price * quantity * direction - commission
+                    if balance[p] + cost >= 0:
+                        balance[p] += cost
+                        shares[p] = 0.0
+                        tp_active[p] = False
+                        sl_active[p] = False
+                        mkt_active[p] = False
+
+                        pos_exit[current[p]] = price
+                        pos_commission[current[p]] += commission
+                        current[p] = -1
+
+            equity[p, i] = balance[p] + shares[p] * bar1[BID_CLOSE]
+
+            # 2. 策略在这根bar上的信号
+            if current[p] < 0:
+                if entries[p, i]:
+                    if order_type == MARKET:
+                        reference = bar2[ASK_CLOSE] if entry_is_buy else bar2[BID_CLOSE]
+                    else:
+                        reference = prices[p, i]
+                    quantity = quantities[p, i]
+                    if not quantity > 0:
+                        quantity = np.floor((balance[p] - reserve) / reference)
+                    if quantity > 0:
+                        current[p] = count
+                        pos_owner[count] = p
+                        count += 1
+                        entry_active[p] = True
+                        entry_price[p] = prices[p, i]
+                        entry_quantity[p] = quantity
+                        entry_stop_hit[p] = False
+                        entry_day[p] = -1
+                        entry_minute[p] = minute
+                continue
+
+            leave = exits[p, i] or (0 <= max_minutes < minute - entry_minute[p])
+
+            if entry_active[p]:
+                if leave or cancels[p, i]:
+                    entry_active[p] = False
+                    current[p] = -1
+            elif not mkt_active[p]:
+                distance = close_stop[p, i]
+                if not np.isnan(distance):
+                    if relative:
+                        level = pos_entry[current[p]] * (1 - direction * distance)
+                    else:
+                        level = pos_entry[current[p]] - direction * distance
+                    if short:
+                        leave = leave or bar2[BID_CLOSE] >= level
+                    else:
+                        leave = leave or bar2[BID_CLOSE] <= level
+                if leave:
+                    tp_active[p] = False
+                    sl_active[p] = False
+                    mkt_active[p] = True
+                    mkt_day[p] = -1
+
+    return (equity, pos_owner[:count], pos_entry[:count], pos_exit[:count], pos_quantity[:count],
+            pos_commission[:count], balance, shares)
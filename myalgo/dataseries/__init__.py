@@ -1 +1,2 @@
 from .bar_series import BarDataSeries, PriceSeries
+from .resampled import ResampledBarDataSeries
@@ -3,112 +3,176 @@ import numpy as np
 from myalgo.event import Event
 from ..bar import Bar, Frequency
 
-DEFAULT_MAX_LEN = 30000000
+# 在不知道数据长度的时候，第一次分配的行数，之后按两倍增长
+DEFAULT_CAPACITY = 1024
 
 
 def check_max_len(max_len):
     if max_len is None or max_len <= 0:
-        return DEFAULT_MAX_LEN
+        return None
     else:
         return max_len
 
 
-class PriceSeriesImpl:
-    def __init__(self, prices, timestamps, current, max_len):
-        self.reset(prices, timestamps, current, max_len)
-
-    def __getitem__(self, key):
-        """
-            我们将数据截取成对应的形状后再进行访问
-        """
-        return self.prices[:self.current][key]
-
-    def reset(self, prices=None, timestamps=None, current=0, max_len=None):
-        self.max_len = check_max_len(max_len)
-        self.prices = prices
-        self.current = current
-        self.timestamps = timestamps
-
-    def current_prices(self):
-        return self.prices[:self.current]
-
-    def current_timestamps(self):
-        return self.timestamps[:self.current]
-
-
 class PriceSeries:
     """
         不建议手动创建这个类的实例，
         我们希望全部通过BarDataSeries创建
+
+        它只是BarDataSeries中某一列的视图，不持有数据
     """
 
-    def __init__(self, append_event, prices, timestamps, current, max_len):
-        self.impl = PriceSeriesImpl(prices, timestamps, current, max_len)
+    def __init__(self, append_event, impl, column):
+        self.impl = impl
+        self.column = column
 
         self.append_event = append_event
 
-    def reset(self, prices=None, timestamps=None, current=0, max_len=None):
-        self.impl.reset(prices, timestamps, current, max_len)
+    def __getitem__(self, key):
+        return self.prices[key]
+
+    def __len__(self):
+        return len(self.impl)
 
     @property
     def prices(self):
-        return self.impl.current_prices()
+        return self.impl.current_bars()[:, self.column]
 
     @property
     def timestamps(self):
-        return self.impl.timestamps()
+        return self.impl.current_timestamps()
+
+    @property
+    def latest(self):
+        # 最后一个值, 每根bar都会被读取, 不经过切片
+        impl = self.impl
+        return impl.bars[impl.current - 1, self.column] if impl.current > impl.start else None
 
 
 class BarDataSeriesImpl:
-    def __init__(self, bars=None, timestamps=None, current=0, max_len=None):
+    """
+        数据保存在 bars[start:current] 中
+
+        分配策略:
+            1. 只有在第一次追加的时候才分配内存
+            2. 知道数据长度的时候(capacity)一次分配到位，否则从 DEFAULT_CAPACITY 开始按两倍增长
+            3. ring_buffer 模式下最多只保留 max_len 行，占用 2 * max_len 行的空间，
+               写满之后把最后的 max_len 行搬回开头，这样均摊下来每次追加仍然是O(1)，而且切片总是连续的
+    """
+
+    def __init__(self, bars=None, timestamps=None, current=0, max_len=None, capacity=None, ring_buffer=False):
+
+        self.max_len = check_max_len(max_len)
+        self.ring_buffer = ring_buffer
+        self.capacity = capacity
+        # 是否是 attach 上去的外部数据, 这时 bars 中 current 之后的部分是还没有派发的数据
+        self.attached = False
 
-        if max_len is None or max_len <= 0:
-            self.max_len = DEFAULT_MAX_LEN
-        else:
-            self.max_len = max_len
         if bars is not None and current is not None and bars.shape[0] == timestamps.shape[0]:
             self.bars = bars
+            self.start = 0
             self.current = current
             self.timestamps = timestamps
         else:
-            self.current = 0
-            self.bars = np.zeros((self.max_len, 9), dtype=np.float32)
-            self.timestamps = np.zeros(self.max_len, dtype='datetime64[m]')
+            self.__clear()
+
+    def __len__(self):
+        return self.current - self.start
 
     def __getitem__(self, key):
-        return self.bars[:self.current][key]
+        return self.bars[self.start:self.current][key]
+
+    def __clear(self):
+        self.start = 0
+        self.current = 0
+        self.attached = False
+        self.bars = np.zeros((0, 9), dtype=np.float32)
+        self.timestamps = np.zeros(0, dtype='datetime64[m]')
+
+    @property
+    def bounded(self):
+        return self.ring_buffer and self.max_len is not None
 
     def current_bars(self):
-        return self.bars[:self.current]
+        return self.bars[self.start:self.current]
 
     def current_timestamps(self):
-        return self.timestamps[:self.current]
+        return self.timestamps[self.start:self.current]
 
-    def reset(self, max_len=None):
+    def reset(self, max_len=None, capacity=None):
         self.max_len = check_max_len(max_len)
+        if capacity is not None:
+            self.capacity = capacity
+        self.__clear()
+
+    def attach(self, bars, timestamps):
+        """
+            直接使用外部(比如feed)已经存在的数据，不再复制
+        """
+        assert bars.shape[0] == timestamps.shape[0]
+        self.bars = bars
+        self.timestamps = timestamps
+        self.start = 0
         self.current = 0
-        self.bars = np.zeros((max_len, 9), dtype=np.float32)
-        self.timestamps = np.zeros(self.max_len, dtype='datetime64[m]')
+        self.attached = True
+
+    def __initial_capacity(self):
+        ret = self.capacity if self.capacity is not None and self.capacity > 0 else DEFAULT_CAPACITY
+        if self.bounded:
+            ret = min(ret, 2 * self.max_len)
+        return ret
+
+    def __make_room(self):
+        """
+            缓冲区写满的时候调用，只保留 bars[start:current]
+        """
+        size = self.current - self.start
+        capacity = self.bars.shape[0]
+
+        if capacity == 0:
+            capacity = self.__initial_capacity()
+        elif self.bounded and capacity >= 2 * self.max_len:
+            # 空间已经足够了，把窗口搬回开头即可
+            self.bars[:size] = self.bars[self.start:self.current]
+            self.timestamps[:size] = self.timestamps[self.start:self.current]
+            self.start = 0
+            self.current = size
+            return
+        else:
+            capacity = capacity * 2
+            if self.bounded:
+                capacity = min(capacity, 2 * self.max_len)
+
+        bars = np.zeros((capacity, 9), dtype=np.float32)
+        timestamps = np.zeros(capacity, dtype='datetime64[m]')
+        bars[:size] = self.bars[self.start:self.current]
+        timestamps[:size] = self.timestamps[self.start:self.current]
+
+        self.bars = bars
+        self.timestamps = timestamps
+        self.start = 0
+        self.current = size
 
     def append_with_datetime(self, bar, datetime_):
         """
             DONE:Convert datetime to timestamp
+
+            返回值表示底层数组是否被重新分配或者移动过
         """
 
         extended = False
 
-        if self.current == self.max_len:
-            self.max_len = self.max_len * 2
-
-            self.bars = np.resize(self.bars, (self.max_len, 9))
-            self.timestamps = np.resize(self.timestamps, self.max_len)
-
+        if self.current == self.bars.shape[0]:
+            self.__make_room()
             extended = True
 
         self.bars[self.current] = bar
         self.timestamps[self.current] = datetime_
         self.current += 1
 
+        if self.bounded and self.current - self.start > self.max_len:
+            self.start += 1
+
         return extended
 
     """
@@ -118,45 +182,46 @@ class BarDataSeriesImpl:
 
 class BarDataSeries:
     """
-        需要获取某个价格序列的时候，直接调用对应的属性即可
+        需要获取某个价格序列的时候，直接调用对应的属性即可
 
         请注意：不要对其进行修改，不然会造成意想不到的后果
 
         BarDataSeries 会自动对每个分量进行相应的延展。因此你不用考虑可能存在的问题。拿来用就行
+
+        :param max_len: 不使用 ring_buffer 时只是初始容量；使用 ring_buffer 时为保留的最大长度
+        :param capacity: 预计的数据长度(比如feed的长度)，知道的话可以一次分配到位
+        :param ring_buffer: 是否只保留最后 max_len 根bar
     """
 
-    def __init__(self, bars=None, timestamps=None, current=0, max_len=None, frequency=Frequency.MINUTE):
+    def __init__(self, bars=None, timestamps=None, current=0, max_len=None, frequency=Frequency.MINUTE,
+                 capacity=None, ring_buffer=False):
+        if capacity is None and not ring_buffer:
+            capacity = check_max_len(max_len)
+
         self.impl = BarDataSeriesImpl(
-            bars=bars, timestamps=timestamps, current=current, max_len=max_len)
+            bars=bars, timestamps=timestamps, current=current, max_len=max_len, capacity=capacity,
+            ring_buffer=ring_buffer)
         self.frequency = frequency
 
         self.append_event = Event()
 
-        # 这里我们已经将 implement中的相关数据传达了
-        # 所以将相应信息交给reset处理即可
-
-        self.ask_open = PriceSeries(self.append_event,
-                                    self.impl.bars[:, 0], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.ask_close = PriceSeries(self.append_event,
-                                     self.impl.bars[:, 1], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.ask_high = PriceSeries(self.append_event,
-                                    self.impl.bars[:, 2], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.ask_low = PriceSeries(self.append_event,
-                                   self.impl.bars[:, 3], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.bid_open = PriceSeries(self.append_event,
-                                    self.impl.bars[:, 4], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.bid_close = PriceSeries(self.append_event,
-                                     self.impl.bars[:, 5], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.bid_high = PriceSeries(self.append_event,
-                                    self.impl.bars[:, 6], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.bid_low = PriceSeries(self.append_event,
-                                   self.impl.bars[:, 7], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.volume = PriceSeries(self.append_event,
-                                  self.impl.bars[:, 8], self.impl.timestamps, self.impl.current, self.impl.max_len)
+        # 每个分量都只是impl的视图，impl扩充之后不需要再重新设置
+        self.ask_open = PriceSeries(self.append_event, self.impl, 0)
+        self.ask_close = PriceSeries(self.append_event, self.impl, 1)
+        self.ask_high = PriceSeries(self.append_event, self.impl, 2)
+        self.ask_low = PriceSeries(self.append_event, self.impl, 3)
+        self.bid_open = PriceSeries(self.append_event, self.impl, 4)
+        self.bid_close = PriceSeries(self.append_event, self.impl, 5)
+        self.bid_high = PriceSeries(self.append_event, self.impl, 6)
+        self.bid_low = PriceSeries(self.append_event, self.impl, 7)
+        self.volume = PriceSeries(self.append_event, self.impl, 8)
 
     def __getitem__(self, key):
         return self.impl[key]
 
+    def __len__(self):
+        return len(self.impl)
+
     @property
     def timestamps(self):
         # 截断后的时间戳
@@ -167,29 +232,26 @@ class BarDataSeries:
         # 截断后的柱状数据
         return self.impl.current_bars()
 
-    def reset(self, max_len=None):
-        self.impl.reset(max_len)
-        self.__reset_bar_series()
-
-    def __reset_bar_series(self):
-        self.ask_open.reset(
-            self.impl.bars[:, 0], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.ask_close.reset(
-            self.impl.bars[:, 1], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.ask_high.reset(
-            self.impl.bars[:, 2], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.ask_low.reset(
-            self.impl.bars[:, 3], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.bid_open.reset(
-            self.impl.bars[:, 4], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.bid_close.reset(
-            self.impl.bars[:, 5], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.bid_high.reset(
-            self.impl.bars[:, 6], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.bid_low.reset(
-            self.impl.bars[:, 7], self.impl.timestamps, self.impl.current, self.impl.max_len)
-        self.volume.reset(
-            self.impl.bars[:, 8], self.impl.timestamps, self.impl.current, self.impl.max_len)
+    @property
+    def latest(self):
+        # 最后一根bar的数据
+        impl = self.impl
+        return impl.bars[impl.current - 1] if impl.current > impl.start else None
+
+    def reset(self, max_len=None, capacity=None):
+        self.impl.reset(max_len, capacity)
+
+    def attach(self, bars, timestamps):
+        """
+            把序列变成 bars / timestamps 上的只读视图，之后通过 as_new / to_next 移动游标，而不是 append
+
+            回测的时候数据已经全部在feed里了，这样可以省掉逐根复制以及重复的内存
+        """
+        bars = bars.view()
+        bars.flags.writeable = False
+        timestamps = timestamps.view()
+        timestamps.flags.writeable = False
+        self.impl.attach(bars, timestamps)
 
     def append(self, bar: Bar):
         """
@@ -200,26 +262,25 @@ class BarDataSeries:
 
         extended = self.impl.append_with_datetime(bar.data, bar.start_date)
 
-        # 2. 根据是否有扩充，来判断子列是否扩充
+        # 2. 再通知我们追加写入了, extended 表示之前拿到的数组视图已经失效
 
-        # 说明：不将此任务放进队列是为了提高效率
-
-        if extended:
-            """
-                注意，这里当Implement满的时候，BarSeries也重置一下即可。
-            """
-            self.__reset_bar_series()
-
-        # 3. 再通知我们追加写入了
         self.append_event.emit(extended)
 
-    def as_new(self):
-        self.impl.current = 0
+    def as_new(self, start=0):
+        self.impl.start = start
+        self.impl.current = start
+
+    def to_end(self):
+        # 整段数据全部可见, 向量化计算信号的时候使用
+        self.impl.start = 0
+        self.impl.current = self.impl.bars.shape[0]
 
     def to_next(self):
-        assert self.impl.current != self.impl.max_len
+        assert self.impl.current != self.impl.bars.shape[0]
 
         self.impl.current += 1
+        if self.impl.bounded and self.impl.current - self.impl.start > self.impl.max_len:
+            self.impl.start += 1
         self.append_event.emit(False)
 
-        return self.impl.current < self.impl.max_len
+        return self.impl.current < self.impl.bars.shape[0]
@@ -0,0 +1,201 @@
+import numpy as np
+
+from ..bar import Bar, Frequency
+from .bar_series import BarDataSeries
+
+"""
+    把分钟级别的 BarDataSeries 聚合成小时/天/周/月的序列
+
+    Bar.data 中买价与卖价各有一组 OHLC, 两组分别聚合:
+        open 取第一根, close 取最后一根, high 取最大值, low 取最小值, 成交量求和
+"""
+
+OPEN = (0, 4)
+CLOSE = (1, 5)
+HIGH = (2, 6)
+LOW = (3, 7)
+VOLUME = 8
+
+# 1970-01-01 是周四, 周线从周一开始
+WEEK_OFFSET = np.timedelta64(3, 'D')
+
+
+def bucket_starts(timestamps, frequency: Frequency):
+    """
+        每个时间戳所在周期的开始时间, 天以 UTC 的 0 点为界, 周从周一开始, 月按自然月
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[m]')
+    if frequency == Frequency.MONTH:
+        return timestamps.astype('datetime64[M]').astype('datetime64[m]')
+    if frequency == Frequency.WEEK:
+        return (timestamps + WEEK_OFFSET).astype('datetime64[W]').astype('datetime64[m]') - WEEK_OFFSET
+    if frequency.value <= Frequency.MINUTE.value:
+        raise Exception("Can not resample to %s" % frequency)
+    minutes = timestamps.astype(np.int64)
+    return (minutes - minutes % frequency.value).astype('datetime64[m]')
+
+
+def bucket_end(start, frequency: Frequency):
+    """
+        开始于 start 的周期的结束时间
+    """
+    if frequency == Frequency.MONTH:
+        return (np.datetime64(start, 'M') + 1).astype('datetime64[m]')
+    return np.datetime64(start, 'm') + np.timedelta64(frequency.value, 'm')
+
+
+def resample(timestamps, bars, frequency: Frequency):
+    """
+        向量化地聚合整段数据, 价格为 nan 的bar(没有数据的位置)被跳过
+
+        :param timestamps: datetime64[m] 的开始时间, 升序
+        :param bars: (n, 9) 的柱状数据, 与 Bar.data 的布局相同
+        :return: (每个周期的开始时间, (m, 9) 的柱状数据)
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[m]')
+    bars = np.asarray(bars, dtype=np.float32)
+    present = ~np.isnan(bars[:, CLOSE[0]])
+    if not present.all():
+        timestamps, bars = timestamps[present], bars[present]
+    if timestamps.shape[0] == 0:
+        return np.zeros(0, dtype='datetime64[m]'), np.zeros((0, 9), dtype=np.float32)
+
+    starts = bucket_starts(timestamps, frequency)
+    first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+    last = np.r_[first[1:], starts.shape[0]] - 1
+
+    ret = np.empty((first.shape[0], 9), dtype=np.float32)
+    for column in OPEN:
+        ret[:, column] = bars[first, column]
+    for column in CLOSE:
+        ret[:, column] = bars[last, column]
+    for column in HIGH:
+        ret[:, column] = np.maximum.reduceat(bars[:, column], first)
+    for column in LOW:
+        ret[:, column] = np.minimum.reduceat(bars[:, column], first)
+    ret[:, VOLUME] = np.add.reduceat(bars[:, VOLUME], first)
+    return starts[first], ret
+
+
+class ResampledBarDataSeries(BarDataSeries):
+    """
+        由 source 聚合得到的更大周期的序列, source 每追加(或者零拷贝模式下前进)一根bar就增量更新一次
+
+        只有已经结束的周期才会追加到这个序列中并触发 append_event; 还没有结束的周期在 :attr:`pending` 中。
+        一个周期在最后一根分钟bar到达的时候结束, 如果那根bar缺失, 就等到下一个周期的第一根bar或者
+        :meth:`checkNow` 的时间超过周期的结束时间
+
+        :param source: 分钟级别(或者更小周期)的序列
+        :param frequency: 聚合之后的周期, HOUR / DAY / WEEK / MONTH
+        :param max_len: 与 :class:`BarDataSeries` 相同
+        :param ring_buffer: 与 :class:`BarDataSeries` 相同
+    """
+
+    def __init__(self, source: BarDataSeries, frequency: Frequency, max_len=None, ring_buffer=False):
+        if frequency.value <= source.frequency.value:
+            raise Exception("Can not resample %s to %s" % (source.frequency, frequency))
+
+        super(ResampledBarDataSeries, self).__init__(max_len=max_len, frequency=frequency, ring_buffer=ring_buffer)
+
+        self.source = source
+        self.__max_len = max_len
+        self.__source_period = np.timedelta64(max(source.frequency.value, 0), 'm')
+
+        self.__pending = None
+        self.__pending_start = None
+        self.__pending_end = None
+
+        self.__warm_up()
+        source.append_event.subscribe(self.__on_append)
+
+    @property
+    def pending(self):
+        """
+            还没有结束的周期, (开始时间, 柱状数据), 没有的时候为 None
+        """
+        if self.__pending is None:
+            return None
+        return self.__pending_start, self.__pending
+
+    def __warm_up(self):
+        """
+            source 中已经有的数据一次性向量化地聚合, 最后一个周期作为 pending 继续增量更新
+        """
+        if len(self.source) == 0:
+            return
+        starts, bars = resample(self.source.timestamps, self.source.bars, self.frequency)
+        if starts.shape[0] == 0:
+            return
+        for i in range(starts.shape[0] - 1):
+            self.__emit(starts[i], bars[i])
+
+        self.__pending_start = starts[-1]
+        self.__pending_end = bucket_end(starts[-1], self.frequency)
+        self.__pending = bars[-1].copy()
+        if self.source.timestamps[-1] + self.__source_period >= self.__pending_end:
+            self.__close()
+
+    def __on_append(self, extended):
+        impl = self.source.impl
+        if impl.current == impl.start:
+            return
+        self.update(impl.timestamps[impl.current - 1], impl.bars[impl.current - 1])
+
+    def update(self, timestamp, bar):
+        """
+            加入 source 中新的一根bar
+
+            :param timestamp: datetime64[m] 的开始时间
+            :param bar: 与 Bar.data 布局相同的数组
+        """
+        if np.isnan(bar[CLOSE[0]]):
+            return
+
+        pending = self.__pending
+        if pending is not None and timestamp >= self.__pending_end:
+            self.__close()
+            pending = None
+
+        if pending is None:
+            self.__pending_start = bucket_starts(timestamp, self.frequency)[()]
+            self.__pending_end = bucket_end(self.__pending_start, self.frequency)
+            self.__pending = np.array(bar, dtype=np.float32)
+        else:
+            for column in CLOSE:
+                pending[column] = bar[column]
+            for column in HIGH:
+                if bar[column] > pending[column]:
+                    pending[column] = bar[column]
+            for column in LOW:
+                if bar[column] < pending[column]:
+                    pending[column] = bar[column]
+            pending[VOLUME] += bar[VOLUME]
+
+        # 周期的最后一根bar已经到了, 不需要等下一根
+        if timestamp + self.__source_period >= self.__pending_end:
+            self.__close()
+
+    def checkNow(self, dateTime):
+        """
+            dateTime 已经超过了 pending 周期的结束时间时, 把它作为完整的bar追加
+        """
+        if self.__pending is not None and dateTime is not None \
+                and np.datetime64(dateTime, 'm') >= self.__pending_end:
+            self.__close()
+
+    def __close(self):
+        pending, start = self.__pending, self.__pending_start
+        self.__pending = None
+        self.__pending_start = None
+        self.__pending_end = None
+        self.__emit(start, pending)
+
+    def __emit(self, start, bar):
+        start = np.datetime64(start, 'm')
+        self.append(Bar(start, bucket_end(start, self.frequency), bar))
+
+    def reset(self, max_len=None, capacity=None):
+        self.__pending = None
+        self.__pending_start = None
+        self.__pending_end = None
+        super(ResampledBarDataSeries, self).reset(max_len if max_len is not None else self.__max_len, capacity)
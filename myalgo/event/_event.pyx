@@ -1,3 +1,4 @@
+# cython: language_level=3
 cdef class Event:
     cdef list __handlers
     cdef list __deferred
@@ -36,12 +37,20 @@ cdef class Event:
             self.__unsubscribe_impl(handler)
 
     def emit(self, *args, **kwargs):
+        cdef Py_ssize_t count = len(self.__handlers)
+
+        # 没有订阅者的时候不可能有延迟的修改，直接返回
+        if count == 0:
+            return
 
         try:
             self.__emitting += 1
-            for handler in self.__handlers:
-                handler(*args, **kwargs)
+            if count == 1:
+                self.__handlers[0](*args, **kwargs)
+            else:
+                for handler in self.__handlers:
+                    handler(*args, **kwargs)
         finally:
             self.__emitting -= 1
-            if not self.__emitting:
+            if not self.__emitting and self.__deferred:
                 self.__apply_changes()
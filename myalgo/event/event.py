@@ -0,0 +1,68 @@
+"""
+    Event 有两个实现:
+        1. _event.pyx 编译出来的扩展 (安装时如果有 Cython 会自动编译)
+        2. 这里的纯Python实现，语义完全一致，没有编译的时候使用
+"""
+
+
+class PyEvent(object):
+    def __init__(self):
+        self.__handlers = []
+        self.__deferred = []
+        self.__emitting = 0
+
+    def __subscribe_impl(self, handler):
+        assert not self.__emitting
+        if handler not in self.__handlers:
+            self.__handlers.append(handler)
+
+    def __unsubscribe_impl(self, handler):
+        assert not self.__emitting
+        self.__handlers.remove(handler)
+
+    def __apply_changes(self):
+        assert not self.__emitting
+        for action, param in self.__deferred:
+            action(param)
+        self.__deferred = []
+
+    def subscribe(self, handler):
+        if self.__emitting:
+            self.__deferred.append((self.__subscribe_impl, handler))
+        elif handler not in self.__handlers:
+            self.__subscribe_impl(handler)
+
+    def unsubscribe(self, handler):
+        if self.__emitting:
+            self.__deferred.append((self.__unsubscribe_impl, handler))
+        else:
+            self.__unsubscribe_impl(handler)
+
+    def emit(self, *args, **kwargs):
+        handlers = self.__handlers
+
+        # 没有订阅者的时候不可能有延迟的修改，直接返回
+        if not handlers:
+            return
+
+        try:
+            self.__emitting += 1
+            if len(handlers) == 1:
+                handlers[0](*args, **kwargs)
+            else:
+                for handler in handlers:
+                    handler(*args, **kwargs)
+        finally:
+            self.__emitting -= 1
+            if not self.__emitting and self.__deferred:
+                self.__apply_changes()
+
+
+try:
+    from myalgo.event._event import Event
+
+    NATIVE = True
+except ImportError:
+    Event = PyEvent
+
+    NATIVE = False
@@ -1,4 +1,5 @@
 from myalgo.feed.barfeed import BaseBarFeed, OptimizerBarFeed
 from myalgo.feed.mysqlfeed import MySQLFeed
 from myalgo.feed.sqlitefeed import SQLiteFeed
+from myalgo.feed.streaming import StreamingBarFeed
 from .dataframe_feed import DataFrameFeed
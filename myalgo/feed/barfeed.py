@@ -1,4 +1,4 @@
-from myalgo.bar.bars import Bars
+from myalgo.bar.store import BarStore
 from myalgo.config import dispatchprio
 from myalgo.event import Event
 from myalgo.feed import basefeed
@@ -6,7 +6,7 @@ from myalgo.feed import basefeed
 class BaseBarFeed(basefeed.BaseFeed):
     def __init__(self, frequency, instruments, bars=None, maxLen=None):
 
-        self.__bars = bars if bars is not None else []
+        self.__bars = self.__to_store(bars, instruments, frequency)
         self.__bar_len = len(self.__bars)
 
         self.__bar_events = Event()
@@ -32,6 +32,17 @@ class BaseBarFeed(basefeed.BaseFeed):
         except Exception:
             self.__barsHaveAdjClose = False
 
+    @staticmethod
+    def __to_store(bars, instruments, frequency):
+        """
+            所有的bar都统一转换成列式存储 :class:`BarStore`
+        """
+        if isinstance(bars, BarStore):
+            return bars
+        if bars is None or len(bars) == 0:
+            return BarStore.empty(instruments, frequency)
+        return BarStore.from_bars(bars, frequency=frequency)
+
     def reset(self):
         self.__started = False
         self.__current_bar_index = 0
@@ -52,8 +63,18 @@ class BaseBarFeed(basefeed.BaseFeed):
 
     @property
     def bars(self):
+        """
+            :rtype: :class:`myalgo.bar.BarStore`
+        """
         return self.__bars
 
+    @property
+    def in_memory(self):
+        """
+            :attr:`bars` 是否是全部的数据, 流式的feed中只是正在派发的一块
+        """
+        return True
+
     @property
     def current_bars(self):
         """
@@ -80,7 +101,8 @@ class BaseBarFeed(basefeed.BaseFeed):
         return self.__bars[self.pos - 1] if self.pos > 0 and self.__current_bar_index < self.__bar_len + 1 else None
 
     def last_bar(self, instrument):
-        return self.last_bars.bar(instrument) if self.last_bars is not None else None
+        # 上一根bar中没有这个标的的时候, 取它之前最后一根有效的bar
+        return self.last_bars.latest_bar(instrument) if self.last_bars is not None else None
 
     def start(self):
         super(BaseBarFeed, self).start()
@@ -106,7 +128,7 @@ class BaseBarFeed(basefeed.BaseFeed):
 
     @bars.setter
     def bars(self, value):
-        self.__bars = [Bars(bar_dict=i) for i in value]
+        self.__bars = self.__to_store(value, self.__instruments, self.__frequency)
         self.__bar_len = len(self.__bars)
         self.__current_bar_index = 0
         self.__started = False
@@ -159,3 +181,7 @@ class OptimizerBarFeed(BaseBarFeed):
 
     def __init__(self, frequency, instruments, bars, maxlen=None):
         super(OptimizerBarFeed, self).__init__(frequency, instruments=instruments, bars=bars, maxLen=maxlen)
+
+    def __reduce__(self):
+        # 传给子进程的时候只带上数据本身, 数据在共享内存中时只会传递内存的名字
+        return (OptimizerBarFeed, (self.frequency, self.instruments, self.bars, self.max_len))
@@ -42,11 +42,6 @@ class BaseFeed(Subject):
         for key in keys:
             self.registerDataSeries(key)
 
-    # Subclasses should implement this and return the appropriate dataseries for the given key.
-    @abc.abstractmethod
-    def createDataSeries(self, key, maxLen):
-        raise NotImplementedError()
-
     # Subclasses should implement this and return a tuple with two elements:
     # 1: datetime.datetime.
     # 2: dictionary or dict-like object.
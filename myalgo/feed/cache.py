@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from myalgo.logger import get_logger
+
+"""
+    本地的bar缓存: 每个标的在一段时间内的数据保存成 .npy 文件, 之后用 np.load(mmap_mode='r') 直接映射, 不再查询数据源
+
+    缓存的名字由 (数据源, 表, 标的, 开始时间, 结束时间) 决定;
+    同时记录数据源的版本(文件的修改时间与大小, 或者行数), 版本不同的时候缓存失效
+"""
+
+DEFAULT_CACHE_DIR = 'bar_cache'
+
+logger = get_logger(__name__)
+
+
+def file_version(path):
+    """
+        文件数据源的版本: 修改时间与大小
+    """
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def save_arrays(directory, name, arrays, meta):
+    """
+        把 arrays 中的每个数组保存成 <name>.<key>.npy, 最后写 <name>.json
+
+        先写临时文件再改名, 同时写同一份缓存的进程不会读到写了一半的文件;
+        元数据最后写, 它存在就说明数据完整
+    """
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        write_atomic(directory, "%s.%s.npy" % (name, key), lambda f, array=array: np.save(f, array))
+    write_atomic(directory, "%s.json" % name, lambda f: f.write(json.dumps(meta).encode()))
+
+
+def load_arrays(directory, name, keys, mmap_mode='r'):
+    """
+        :return: (元数据, {key: 数组}), 缓存不存在或者不完整的时候返回 None
+    """
+    try:
+        with open(os.path.join(directory, "%s.json" % name)) as f:
+            meta = json.load(f)
+        arrays = {key: np.load(os.path.join(directory, "%s.%s.npy" % (name, key)), mmap_mode=mmap_mode)
+                  for key in keys}
+    except (OSError, ValueError):
+        return None
+    return meta, arrays
+
+
+def write_atomic(directory, filename, write):
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, os.path.join(directory, filename))
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class BarCache(object):
+    """A directory of memory mapped bar matrices, one per (source, table, instrument, date range).
+
+    :param directory: Where to keep the files. Created if it does not exist.
+    :type directory: string.
+
+    Every entry records the version of its source, see :func:`file_version`. Loading an entry with another version
+    is a miss, so the data is queried again once the source changes.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.__directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    @staticmethod
+    def key(source, table, instrument, from_date, to_date):
+        key = json.dumps([source, table, instrument, str(from_date), str(to_date)])
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def load(self, source, table, instrument, from_date, to_date, version):
+        """
+            :return: (datetime64[m] 的开始时间, (n, 9) 的柱状数据), 都是只读的内存映射; 没有缓存或者已经失效时返回 None
+        """
+        ret = load_arrays(self.__directory, self.key(source, table, instrument, from_date, to_date),
+                          ('timestamps', 'bars'))
+        if ret is None:
+            return None
+        meta, arrays = ret
+        timestamps, bars = arrays['timestamps'], arrays['bars']
+        if meta.get('version') != version or meta.get('length') != len(timestamps):
+            return None
+        if bars.shape != (len(timestamps), 9):
+            return None
+        return timestamps, bars
+
+    def save(self, source, table, instrument, from_date, to_date, version, timestamps, bars):
+        meta = {'source': source, 'table': table, 'instrument': instrument, 'from_date': str(from_date),
+                'to_date': str(to_date), 'version': version, 'length': len(timestamps)}
+        save_arrays(self.__directory, self.key(source, table, instrument, from_date, to_date),
+                    {'timestamps': np.asarray(timestamps, dtype='datetime64[m]'),
+                     'bars': np.asarray(bars, dtype=np.float32)}, meta)
+
+    def get(self, source, table, instrument, from_date, to_date, version, fetch):
+        """
+            有缓存的时候直接返回, 否则调用 fetch() 取得 (时间戳, 柱状数据), 保存之后再返回
+        """
+        ret = self.load(source, table, instrument, from_date, to_date, version)
+        if ret is not None:
+            self.__hits += 1
+            logger.debug(f'bar cache hit: {source} {table} {instrument} {from_date} - {to_date}')
+            return ret
+
+        self.__misses += 1
+        timestamps, bars = fetch()
+        self.save(source, table, instrument, from_date, to_date, version, timestamps, bars)
+        return timestamps, bars
+
+
+def as_cache(cache):
+    """
+        None 表示不使用缓存, 字符串表示缓存目录
+    """
+    if cache is None or isinstance(cache, BarCache):
+        return cache
+    return BarCache(cache)
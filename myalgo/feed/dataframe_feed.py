@@ -1,22 +1,64 @@
+import os
+
 import numpy as np
 import pandas as pd
 
-from myalgo.bar.bar import Bar, Frequency
+from myalgo.bar.bar import Frequency
+from myalgo.bar.store import BarStore
 from myalgo.feed.barfeed import BaseBarFeed
+from myalgo.feed.cache import as_cache, file_version
+from myalgo.feed.streaming import PREFETCH, WINDOW, StreamingBarFeed, column_chunks, window_chunks
 from myalgo.logger import get_logger
 
+# HDFStore 中的列依次是 bid_open, bid_high, bid_low, bid_close, ask_open, ask_high, ask_low, ask_close,
+# 这里是 Bar.data 中每个位置对应的列
+FRAME_COLUMNS = [4, 7, 5, 6, 0, 3, 1, 2]
+
+
+def frame_to_bars(df):
+    """
+        :return: (datetime64[m] 的开始时间, (n, 9) 的柱状数据)
+    """
+    timestamps = df.index.values.astype('datetime64[m]')
+    bars = np.zeros((len(df), 9), dtype=np.float32)
+    # 逐列复制, 不用先把整个 DataFrame 转成一个临时的二维数组
+    for column, source in enumerate(FRAME_COLUMNS):
+        bars[:, column] = df.iloc[:, source].to_numpy()
+    return timestamps, bars
+
+
+def select(store, key, start=None, end=None, inclusive=True):
+    """
+        读取 store[key] 中 [start, end] 之间的数据, inclusive 为 False 的时候不包含 end
+
+        table 格式的数据直接用 where 条件查询, 只读取需要的行; fixed 格式不支持 where, 只能全部读出来再切片
+    """
+    if not store.get_storer(key).is_table:
+        ret = store.get(key)[start:end]
+        if not inclusive and end is not None:
+            ret = ret[ret.index < pd.Timestamp(end)]
+        return ret
+
+    where = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        where.append('index >= start')
+    if end is not None:
+        end = pd.Timestamp(end)
+        where.append('index <= end' if inclusive else 'index < end')
+    return store.select(key, where=' & '.join(where) if where else None)
+
 
 class HistoryStore:
     def __init__(self, filename):
-        self.store = pd.HDFStore(filename)
+        self.store = pd.HDFStore(filename, mode='r')
         self.instruments = list(
             map(lambda x: x.replace('/', ''), self.store.keys()))
         self.histories = {}
 
     def read(self, instrument):
         if instrument in self.instruments:
-            df: pd.DataFrame = self.store.get(instrument)
-            history = History(df, instrument)
+            history = History(self.store, instrument)
             self.histories[instrument] = history
             return self.histories[instrument]
         return None
@@ -30,57 +72,136 @@ class HistoryStore:
 
 
 class History:
-    def __init__(self, df, instrument, n_partitions=100):
-        self.df: pd.DataFrame = df
-        self.instrument = instrument
+    """
+        HDFStore 中一个标的的全部数据, 只有在用到的时候才读取
 
-    def feed(self, n_partitions=100):
-        return DataFrameFeed.from_history(self, n_partitions=n_partitions)
+        :param store: 打开的 HDFStore
+        :param instrument: 标的, 也就是 store 中的 key
+    """
+
+    def __init__(self, store, instrument):
+        self.store: pd.HDFStore = store
+        self.instrument = instrument
+        self.__df = None
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self.__df is None:
+            self.__df = self.store.get(self.instrument)
+        return self.__df
+
+    def __len__(self):
+        return self.store.get_storer(self.instrument).nrows
+
+    def partitions(self, n_partitions=100):
+        """
+            把所有的行平均分成 n_partitions 段, 返回每段的 [start, stop)
+        """
+        bounds = np.linspace(0, len(self), max(n_partitions, 1) + 1).astype(np.int64)
+        return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    def select(self, start=None, stop=None):
+        """
+            按行号读取 [start, stop) 之间的数据
+        """
+        if self.__df is not None:
+            return self.__df.iloc[start:stop]
+        return self.store.select(self.instrument, start=start, stop=stop)
+
+    def feed(self, n_partitions=100, frequency=Frequency.MINUTE, maxLen=None):
+        """
+            依次返回每一段数据的 feed, 同一时间只有一段数据在内存中
+        """
+        for start, stop in self.partitions(n_partitions):
+            yield DataFrameFeed.from_frames({self.instrument: self.select(start, stop)}, frequency, maxLen)
 
 
 class DataFrameFeed(BaseBarFeed):
-    def __init__(self, path, instruments, frequency=Frequency.MINUTE, maxLen=None):
+    def __init__(self, path, instruments, frequency=Frequency.MINUTE, maxLen=None, cache=None):
+        """
+            :param path: HDF5 文件, 为 None 的时候只能通过 :meth:`from_frames` 设置数据
+            :param cache: :class:`myalgo.feed.cache.BarCache` 或者缓存目录, 文件没有变化的时候直接读取缓存
+        """
 
         super(DataFrameFeed, self).__init__(frequency, instruments, None, maxLen)
 
-        self.store = pd.HDFStore(path)
+        self.store = pd.HDFStore(path, mode='r') if path is not None else None
+        self.__path = os.path.abspath(path) if path is not None else None
+        self.__cache = as_cache(cache)
 
         self.__logger = get_logger("DATAFrameFeed Logger")
 
-    def load_data(self, start, end):
+    @classmethod
+    def from_frames(cls, frames, frequency=Frequency.MINUTE, maxLen=None, how='inner', fill=False):
+        """
+            直接用内存中的 DataFrame 创建feed
+
+            :param frames: {标的: DataFrame}, 列的顺序与 HDFStore 中相同
+        """
+        ret = cls(None, list(frames.keys()), frequency, maxLen)
+        ret.bars = BarStore.join({instrument: frame_to_bars(df) for instrument, df in frames.items()}, frequency,
+                                 how, fill)
+        return ret
+
+    def load_data(self, start, end, how='inner', fill=False):
+        """
+            :param how: 多个标的按时间对齐的方式, 见 :meth:`BarStore.join`
+            :param fill: 缺失的bar是否用上一个收盘价填充
+        """
         instruments = self.instruments
 
         self.__logger.debug(
             f'loading data from HDFStore, for instruments: {instruments}')
-        data_dicts = {}
-
-        length = []
+        columns = {}
 
         for instrument in instruments:
-            df = self.store.get(instrument)
+            if self.__cache is None:
+                columns[instrument] = self.__fetch(instrument, start, end)
+            else:
+                columns[instrument] = self.__cache.get(self.__path, 'hdf', instrument, start, end,
+                                                       file_version(self.__path),
+                                                       lambda: self.__fetch(instrument, start, end))
 
-            df = df[start:end]
+        self.__logger.info('loading data from HDFStore complete!')
 
-            records = df.to_records()
+        self.bars = BarStore.join(columns, self.frequency, how, fill)
 
-            data_dicts[instrument] = np.array(records).flat
-            length.append(len(data_dicts[instrument]))
+        self.__logger.info('converting data complete!')
 
-        self.__logger.info('loading data from HDFStore complete!')
+    def stream(self, start, end, period=WINDOW, how='inner', fill=False, prefetch=PREFETCH, maxLen=None):
+        """
+            按时间窗口读取 [start, end) 之间的数据, 返回 :class:`myalgo.feed.streaming.StreamingBarFeed`
 
-        m_length = min(length)
+            没有缓存的时候每个窗口单独用 where 条件查询(fixed 格式的数据每次都要全部读出来, 请用 table 格式);
+            有缓存的时候先把每个标的写入缓存, 再从内存映射中按窗口读取
 
-        def get_instrument(i):
-            new_dicts = {}
-            for inst in instruments:
-                t, bo, bh, bl, bc, ao, ah, al, ac = data_dicts[inst][i]
-                t = np.datetime64(t, 'm')
-                new_dicts[inst] = Bar.from_bar(t, t + self.frequency, ao, ac, ah, al,
-                                               bo, bc, bh, bl, 0)
-            return new_dicts
+            :param period: 每个窗口的长度
+            :param prefetch: 预读的窗口数
+        """
+        instruments = list(self.instruments)
 
-        result = [get_instrument(i) for i in range(m_length)]
+        def chunks():
+            if self.__cache is not None:
+                columns = {instrument: self.__mapped(instrument, start, end) for instrument in instruments}
+                return column_chunks(columns, start, end, period, self.frequency, how, fill)
 
-        self.__logger.info('converting data complete!')
+            def fetch(window_start, window_end):
+                return {instrument: frame_to_bars(select(self.store, instrument, window_start, window_end, False))
+                        for instrument in instruments}
+
+            return window_chunks(fetch, start, end, period, self.frequency, how, fill)
+
+        return StreamingBarFeed(self.frequency, instruments, chunks, maxLen, prefetch)
+
+    def __mapped(self, instrument, start, end):
+        """
+            :return: 缓存中一个标的的内存映射
+        """
+        version = file_version(self.__path)
+        ret = self.__cache.get(self.__path, 'hdf', instrument, start, end, version,
+                               lambda: self.__fetch(instrument, start, end))
+        # 刚刚写入缓存的时候返回的是内存中的数组, 重新映射一次, 不把整段数据留在内存中
+        return self.__cache.load(self.__path, 'hdf', instrument, start, end, version) or ret
 
-        self.bars = result
+    def __fetch(self, instrument, start, end):
+        return frame_to_bars(select(self.store, instrument, start, end))
@@ -1,6 +1,8 @@
 import datetime
 import time
 
+import numpy as np
+
 from sqlalchemy import Column, DateTime, String, Integer, func, Float, CHAR
 from sqlalchemy import and_
 from sqlalchemy import cast
@@ -9,8 +11,10 @@ from sqlalchemy import event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-from myalgo.bar.bar import Bar
+from myalgo.bar.bar import Bar, Frequency
+from myalgo.bar.store import BarStore
 from myalgo.feed.barfeed import BaseBarFeed
+from myalgo.feed.cache import as_cache
 from myalgo.logger import get_logger
 
 Base = declarative_base()
@@ -36,8 +40,9 @@ def make_bar_model(table_name):
         end_date = Column(DateTime)
 
         def convert_to_bar(self):
-            return Bar(self.start_date, self.end_date, self.ask_open, self.ask_close, self.ask_high, self.ask_low,
-                       self.bid_open, self.bid_close, self.bid_high, self.bid_low, 0)
+            return Bar.from_bar(np.datetime64(self.start_date, 'm'), np.datetime64(self.end_date, 'm'),
+                                self.ask_open, self.ask_close, self.ask_high, self.ask_low,
+                                self.bid_open, self.bid_close, self.bid_high, self.bid_low, 0)
 
     return BarModel
 
@@ -51,8 +56,13 @@ class MySQLFeed(BaseBarFeed):
                  db_username='root',
                  db_password='root',
                  connector='mysqldb',
-                 db_host='127.0.0.1', db_port=3306):
+                 db_host='127.0.0.1', db_port=3306,
+                 cache=None):
+        """
+            :param cache: :class:`myalgo.feed.cache.BarCache` 或者缓存目录, 行数没有变化的时候直接读取缓存
+        """
         self.__engine = create_engine(f'mysql+{connector}://{db_username}:{db_password}@{db_host}:{db_port}/{db_name}')
+        self.__cache = as_cache(cache)
         self.__DBSession = sessionmaker(bind=self.__engine)
         self.__logger = get_logger(MySQLFeed.LOGGER_NAME)
         self.__bar_model = make_bar_model(table_name)
@@ -72,7 +82,7 @@ class MySQLFeed(BaseBarFeed):
         event.listens_for(self.__engine, "before_cursor_execute")(before_cursor_execute)
         event.listens_for(self.__engine, "after_cursor_execute")(after_cursor_execute)
 
-        super(MySQLFeed, self).__init__()
+        super(MySQLFeed, self).__init__(Frequency.MINUTE, [])
 
         self.bars = []
 
@@ -84,35 +94,55 @@ class MySQLFeed(BaseBarFeed):
     def model(self):
         return self.__bar_model
 
-    def load_data(self, instruments, from_date, to_date):
-        """将数据全部加载上来"""
+    def load_data(self, instruments, from_date, to_date, how='inner', fill=False):
+        """
+            将数据全部加载上来
+
+            :param how: 多个标的按时间对齐的方式, 见 :meth:`BarStore.join`
+            :param fill: 缺失的bar是否用上一个收盘价填充
+        """
 
         self.__logger.debug(
             f'loading data from database, for instruments: {instruments} from: {from_date} to: {to_date}')
-        data_dicts = {}
-
-        length = []
+        columns = {}
         session = self.new_session
 
-        for instrument in instruments:
-            data_dicts[instrument] = self.__fetch(session, instrument, to_date, from_date)
-            length.append(len(data_dicts[instrument]))
-
-        session.close()
+        try:
+            for instrument in instruments:
+                if self.__cache is None:
+                    columns[instrument] = self.__fetch_columns(session, instrument, to_date, from_date)
+                else:
+                    # 没有文件可以比较修改时间, 用这段时间内的行数作为版本
+                    version = session.query(func.count(self.model.id)).filter(
+                        self.__condition(instrument, to_date, from_date)).scalar()
+                    columns[instrument] = self.__cache.get(
+                        self.__engine.url.render_as_string(hide_password=True), self.model.__tablename__, instrument,
+                        from_date, to_date, version,
+                        lambda: self.__fetch_columns(session, instrument, to_date, from_date))
+        finally:
+            session.close()
 
         self.__logger.info('loading data from database complete!')
 
-        m_length = min(length)
+        self.bars = BarStore.join(columns, self.frequency, how, fill)
 
-        def get_instrument(i):
-            new_dicts = {}
-            for inst in instruments:
-                new_dicts[inst] = data_dicts[inst][i].convert_to_bar()
-            return new_dicts
-
-        result = [get_instrument(i) for i in range(m_length)]
-
-        self.bars = result
+    def __fetch_columns(self, session, instrument, to_date, from_date):
+        """
+            :return: (datetime64[m] 的开始时间, (n, 9) 的柱状数据)
+        """
+        rows = self.__fetch(session, instrument, to_date, from_date)
+        timestamps = np.array([row.start_date for row in rows], dtype='datetime64[m]')
+        bars = np.zeros((len(rows), 9), dtype=np.float32)
+        bars[:, :8] = np.array([(row.ask_open, row.ask_close, row.ask_high, row.ask_low,
+                                 row.bid_open, row.bid_close, row.bid_high, row.bid_low) for row in rows],
+                               dtype=np.float64).reshape(len(rows), 8)
+        return timestamps, bars
+
+    def __condition(self, instrument, to_date, from_date):
+        return and_(
+            cast(self.model.type, String) == cast(instrument, String),
+            func.timestamp(self.model.start_date) >= func.timestamp(from_date),
+            func.timestamp(self.model.end_date) <= func.timestamp(to_date))
 
     def __fetch(self, session, instrument, to_date=datetime.datetime(2019, 1, 1, 0, 0, 0),
                 from_date=datetime.datetime(2012, 1, 1, 0, 0, 0)):
@@ -122,9 +152,7 @@ class MySQLFeed(BaseBarFeed):
             to_date: 结束时间
             type: 种类
         """
-        result = session.query(self.model).filter(and_(
-            cast(self.model.type, String) == cast(instrument, String),
-            func.timestamp(self.model.start_date) >= func.timestamp(from_date),
-            func.timestamp(self.model.end_date) <= func.timestamp(to_date))).order_by("start_date").all()
+        result = session.query(self.model).filter(
+            self.__condition(instrument, to_date, from_date)).order_by("start_date").all()
 
         return result
@@ -1,16 +1,20 @@
 import datetime
+import os
 import time
 
-from sqlalchemy import Column, DateTime, String, Integer, Float, CHAR, func
-from sqlalchemy import and_
-from sqlalchemy import cast
+from sqlalchemy import Column, DateTime, Integer, Float, CHAR
 from sqlalchemy import create_engine
 from sqlalchemy import event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+import numpy as np
+
 from myalgo.bar.bar import Bar, Frequency
+from myalgo.bar.store import BarStore
 from myalgo.feed.barfeed import BaseBarFeed
+from myalgo.feed.cache import as_cache, file_version
+from myalgo.feed.streaming import PREFETCH, WINDOW, StreamingBarFeed, column_chunks, window_chunks
 from myalgo.logger import get_logger
 
 Base = declarative_base()
@@ -36,8 +40,9 @@ def make_bar_model(table_name):
         end_date = Column(DateTime)
 
         def convert_to_bar(self):
-            return Bar(self.start_date, self.end_date, self.ask_open, self.ask_close, self.ask_high, self.ask_low,
-                       self.bid_open, self.bid_close, self.bid_high, self.bid_low, 0)
+            return Bar.from_bar(np.datetime64(self.start_date, 'm'), np.datetime64(self.end_date, 'm'),
+                                self.ask_open, self.ask_close, self.ask_high, self.ask_low,
+                                self.bid_open, self.bid_close, self.bid_high, self.bid_low, 0)
 
     return BarModel
 
@@ -46,6 +51,25 @@ table_names = {
 
 }
 
+# 每次从游标中取出的行数
+FETCH_SIZE = 100000
+
+# 列的顺序与 Bar.data 相同, 开始时间直接在sqlite中转换成分钟数
+BAR_QUERY = (
+    "SELECT CAST(strftime('%%s', start_date) AS INTEGER) / 60, "
+    "ask_open, ask_close, ask_high, ask_low, bid_open, bid_close, bid_high, bid_low "
+    "FROM \"%s\" WHERE type = ? AND start_date >= datetime(?) AND end_date <= datetime(?) "
+    "ORDER BY start_date"
+)
+
+# 流式读取时的左闭右开时间窗口, 只按开始时间划分, 相邻的窗口不会重叠也不会遗漏
+WINDOW_QUERY = (
+    "SELECT CAST(strftime('%%s', start_date) AS INTEGER) / 60, "
+    "ask_open, ask_close, ask_high, ask_low, bid_open, bid_close, bid_high, bid_low "
+    "FROM \"%s\" WHERE type = ? AND start_date >= datetime(?) AND start_date < datetime(?) "
+    "ORDER BY start_date"
+)
+
 
 class SQLiteFeed(BaseBarFeed):
     LOGGER_NAME = "SQLITE_FEED_LOGGER"
@@ -54,8 +78,14 @@ class SQLiteFeed(BaseBarFeed):
                  instruments,
                  frequency=Frequency.MINUTE,
                  table_name='bins',
-                 file_name='sqlite'):
+                 file_name='sqlite',
+                 cache=None):
+        """
+            :param cache: :class:`myalgo.feed.cache.BarCache` 或者缓存目录, 数据库文件没有变化的时候直接读取缓存
+        """
         self.__engine = create_engine(f'sqlite:///{file_name}')
+        self.__file_name = os.path.abspath(file_name)
+        self.__cache = as_cache(cache)
         self.__DBSession = sessionmaker(bind=self.__engine)
         self.__logger = get_logger(SQLiteFeed.LOGGER_NAME)
         if table_name in table_names.keys():
@@ -91,8 +121,13 @@ class SQLiteFeed(BaseBarFeed):
     def model(self):
         return self.__bar_model
 
-    def load_data(self, from_date, to_date):
-        """将数据全部加载上来"""
+    def load_data(self, from_date, to_date, how='inner', fill=False):
+        """
+            将数据全部加载上来
+
+            :param how: 多个标的按时间对齐的方式, 见 :meth:`BarStore.join`
+            :param fill: 缺失的bar是否用上一个收盘价填充
+        """
 
         instruments = self.instruments
 
@@ -100,43 +135,107 @@ class SQLiteFeed(BaseBarFeed):
 
         self.__logger.debug(
             f'loading data from database, for instruments: {instruments} from: {from_date} to: {to_date}')
-        data_dicts = {}
-
-        length = []
-
-        session = self.new_session
-
-        for instrument in instruments:
-            data_dicts[instrument] = self.__fetch(session, instrument, to_date, from_date)
-            length.append(len(data_dicts[instrument]))
-
-        session.close()
+        columns = {}
+
+        # 全部命中缓存的时候不需要连接数据库
+        connections = []
+
+        def fetch(instrument):
+            if not connections:
+                connections.append(self.__engine.raw_connection())
+            return self.__fetch(connections[0], instrument, to_date, from_date)
+
+        try:
+            for instrument in instruments:
+                if self.__cache is None:
+                    columns[instrument] = fetch(instrument)
+                else:
+                    columns[instrument] = self.__cache.get(
+                        self.__file_name, self.model.__tablename__, instrument, from_date, to_date,
+                        file_version(self.__file_name), lambda: fetch(instrument))
+        finally:
+            for connection in connections:
+                connection.close()
 
         self.__logger.info('loading data from database complete!')
 
-        m_length = min(length)
+        self.bars = BarStore.join(columns, self.frequency, how, fill)
+
+    def stream(self, from_date, to_date, period=WINDOW, how='inner', fill=False, prefetch=PREFETCH, maxLen=None):
+        """
+            按时间窗口读取数据, 返回 :class:`myalgo.feed.streaming.StreamingBarFeed`, 数据不需要全部放进内存
 
-        def get_instrument(i):
-            new_dicts = {}
-            for inst in instruments:
-                new_dicts[inst] = data_dicts[inst][i].convert_to_bar()
-            return new_dicts
+            没有缓存的时候每个窗口单独查询数据库; 有缓存的时候先把每个标的写入缓存(同一时间只有一个标的在内存中),
+            再从内存映射中按窗口读取
 
-        result = [get_instrument(i) for i in range(m_length)]
+            :param period: 每个窗口的长度
+            :param prefetch: 预读的窗口数
+        """
+        instruments = list(self.instruments)
 
-        self.bars = result
+        assert len(instruments) > 0
 
-    def __fetch(self, session, instrument, to_date=datetime.datetime(2019, 1, 1, 0, 0, 0),
-                from_date=datetime.datetime(2012, 1, 1, 0, 0, 0)):
+        def chunks():
+            # 在读取线程中执行, 连接也在这个线程中创建和关闭
+            connection = self.__engine.raw_connection()
+            try:
+                if self.__cache is not None:
+                    columns = {instrument: self.__mapped(connection, instrument, from_date, to_date)
+                               for instrument in instruments}
+                    yield from column_chunks(columns, from_date, to_date, period, self.frequency, how, fill)
+                else:
+                    def fetch(start, stop):
+                        return {instrument: self.__fetch(connection, instrument, stop, start, WINDOW_QUERY)
+                                for instrument in instruments}
+
+                    yield from window_chunks(fetch, from_date, to_date, period, self.frequency, how, fill)
+            finally:
+                connection.close()
+
+        return StreamingBarFeed(self.frequency, instruments, chunks, maxLen, prefetch)
+
+    def __mapped(self, connection, instrument, from_date, to_date):
+        """
+            :return: 缓存中一个标的的内存映射
+        """
+        table = self.model.__tablename__
+        version = file_version(self.__file_name)
+        ret = self.__cache.get(self.__file_name, table, instrument, from_date, to_date, version,
+                               lambda: self.__fetch(connection, instrument, to_date, from_date))
+        # 刚刚写入缓存的时候返回的是内存中的数组, 重新映射一次, 不把整段数据留在内存中
+        return self.__cache.load(self.__file_name, table, instrument, from_date, to_date, version) or ret
+
+    def __fetch(self, connection, instrument, to_date=datetime.datetime(2019, 1, 1, 0, 0, 0),
+                from_date=datetime.datetime(2012, 1, 1, 0, 0, 0), query=BAR_QUERY):
         """
             选择一段时间的交易记录，并且返回
             from_date: 开始时间
             to_date: 结束时间
             type: 种类
+
+            :return: (datetime64[m] 的开始时间, (n, 9) 的柱状数据)
         """
-        cursor = session.query(self.model).filter(and_(
-            cast(self.model.type, String) == cast(instrument, String),
-            self.model.start_date >= func.datetime(from_date),
-            self.model.end_date <= func.datetime(to_date))).order_by("start_date")
-        result = cursor.all()
-        return result
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query % self.model.__tablename__, (instrument, str(from_date), str(to_date)))
+
+            minutes = []
+            prices = []
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                chunk = np.array(rows, dtype=np.float64)
+                minutes.append(chunk[:, 0].astype(np.int64))
+                prices.append(chunk[:, 1:].astype(np.float32))
+        finally:
+            cursor.close()
+
+        if len(minutes) == 0:
+            return np.zeros(0, dtype='datetime64[m]'), np.zeros((0, 9), dtype=np.float32)
+
+        timestamps = np.concatenate(minutes).astype('datetime64[m]')
+        bars = np.zeros((timestamps.shape[0], 9), dtype=np.float32)
+        # 数据库中没有成交量, 保持为0
+        bars[:, :8] = np.concatenate(prices)
+        return timestamps, bars
@@ -0,0 +1,289 @@
+import datetime
+import queue
+import threading
+
+import numpy as np
+
+from myalgo.bar.bar import Frequency
+from myalgo.bar.store import BarStore
+from myalgo.feed.barfeed import BaseBarFeed
+from myalgo.logger import get_logger
+
+"""
+    流式的 feed: 数据按时间窗口(或者按行数)切成若干块, 同一时间只有正在派发的一块与预读的几块在内存中
+
+    后台线程负责读取数据(sqlite, HDF5 或者内存映射的缓存), 放进一个有界队列, 读取与策略的执行互相重叠;
+    派发线程从队列中取出下一块。peek_datetime / eof / last_bars 的语义与 :class:`BaseBarFeed` 相同,
+    所以 Dispatcher 与 BackTestBroker 不需要任何改动
+"""
+
+# 默认预读的块数
+PREFETCH = 2
+
+# 默认的时间窗口
+WINDOW = datetime.timedelta(days=7)
+
+# 队列中表示数据已经读完
+_END = object()
+# 还没有预读下一块
+_PENDING = object()
+
+logger = get_logger(__name__)
+
+
+def windows(from_date, to_date, period=WINDOW):
+    """
+        把 [from_date, to_date) 切成长度为 period 的左闭右开区间
+    """
+    start = from_date
+    while start < to_date:
+        stop = min(start + period, to_date)
+        yield start, stop
+        start = stop
+
+
+def window_chunks(fetch, from_date, to_date, period=WINDOW, frequency=Frequency.MINUTE, how='inner', fill=False):
+    """
+        按时间窗口依次读取数据, 每个窗口对齐之后得到一个 :class:`BarStore`
+
+        :param fetch: fetch(start, stop) 返回 [start, stop) 之间的 {标的: (时间戳, (n, 9) 的柱状数据)}
+        :param how: 多个标的按时间对齐的方式, 见 :meth:`BarStore.join`
+        :param fill: 缺失的bar是否用上一个收盘价填充, 窗口开头缺失的bar用上一个窗口的最后一根填充
+    """
+    carry = how == 'outer' and fill
+    # 每个标的在之前的窗口中的最后一根bar
+    last = {}
+    for start, stop in windows(from_date, to_date, period):
+        columns = fetch(start, stop)
+        if carry:
+            for instrument, (timestamps, bars) in list(columns.items()):
+                previous = last.get(instrument)
+                if len(timestamps) > 0:
+                    last[instrument] = (timestamps[-1:], bars[-1:])
+                if previous is not None:
+                    columns[instrument] = (np.concatenate([previous[0], timestamps]),
+                                           np.concatenate([previous[1], bars]))
+
+        store = BarStore.join(columns, frequency, how, fill)
+        if carry:
+            # 去掉为了填充而带进来的上一个窗口的bar
+            store = store.slice(int(np.searchsorted(store.timestamps, np.datetime64(start, 'm'))), len(store))
+        if len(store) > 0:
+            yield store
+
+
+def column_chunks(columns, from_date, to_date, period=WINDOW, frequency=Frequency.MINUTE, how='inner', fill=False):
+    """
+        从已经在内存或者内存映射中的 {标的: (时间戳, 柱状数据)} 按时间窗口读取,
+        比如 :class:`myalgo.feed.cache.BarCache` 中的缓存, 只有窗口中的页会被真正读入内存
+    """
+
+    def fetch(start, stop):
+        ret = {}
+        bounds = np.array([start, stop], dtype='datetime64[m]')
+        for instrument, (timestamps, bars) in columns.items():
+            lo, hi = np.searchsorted(timestamps, bounds)
+            ret[instrument] = (np.asarray(timestamps[lo:hi]), np.asarray(bars[lo:hi]))
+        return ret
+
+    return window_chunks(fetch, from_date, to_date, period, frequency, how, fill)
+
+
+def store_chunks(store: BarStore, rows=100000):
+    """
+        把一个 :class:`BarStore` 按行切块, 每块都只是视图
+    """
+    for start in range(0, len(store), rows):
+        yield store.slice(start, min(start + rows, len(store)))
+
+
+class StreamingBarFeed(BaseBarFeed):
+    """A bar feed that reads its bars one chunk at a time, in a background thread.
+
+    :param frequency: The bar frequency.
+    :type frequency: :class:`myalgo.bar.Frequency`.
+    :param instruments: The instruments, in the column order of the chunks.
+    :type instruments: list.
+    :param chunks: A callable without arguments returning an iterable of :class:`myalgo.bar.BarStore`, in time
+        order. It is called again every time the feed is reset, in the reader thread.
+    :type chunks: callable.
+    :param prefetch: How many chunks to read ahead.
+    :type prefetch: int.
+
+    .. note::
+        * :attr:`bars` is only the chunk being dispatched, so strategies keep their series by appending bars instead
+          of attaching to the whole matrix. Use ``series_max_len`` with ``series_ring_buffer`` to bound their memory.
+        * Chunks may hold different instruments only if they keep the same column order, empty chunks are skipped.
+    """
+
+    def __init__(self, frequency, instruments, chunks, maxLen=None, prefetch=PREFETCH):
+        super(StreamingBarFeed, self).__init__(frequency, instruments, None, maxLen)
+
+        self.__chunks = chunks
+        self.__prefetch = max(prefetch, 1)
+        self.__empty = BarStore.empty(instruments, frequency)
+
+        self.__queue = None
+        self.__stopped = None
+        self.__thread = None
+
+        # 正在派发的块与下一块, 第一块在第一次用到的时候才取出来
+        self.__chunk = _PENDING
+        self.__next_chunk = _PENDING
+        self.__offset = 0
+        self.__pos = 0
+        self.__last_bars = None
+
+        self.__open()
+
+    def __open(self):
+        self.__close()
+        self.__queue = queue.Queue(self.__prefetch)
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__read, args=(self.__queue, self.__stopped),
+                                         name='StreamingBarFeed', daemon=True)
+        self.__chunk = _PENDING
+        self.__next_chunk = _PENDING
+        self.__offset = 0
+        self.__pos = 0
+        self.__last_bars = None
+        self.__thread.start()
+
+    def __close(self):
+        if self.__thread is None:
+            return
+        self.__stopped.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def __read(self, chunks, stopped):
+        iterator = None
+        try:
+            iterator = iter(self.__chunks())
+            for chunk in iterator:
+                if not self.__put(chunks, stopped, chunk):
+                    return
+            self.__put(chunks, stopped, _END)
+        except Exception as e:
+            logger.error(f'failed to read bars: {e}')
+            self.__put(chunks, stopped, e)
+        finally:
+            # 生成器在这个线程中打开的连接也在这个线程中关闭
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    @staticmethod
+    def __put(chunks, stopped, item):
+        while not stopped.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __take(self):
+        """
+            取出下一个不为空的块, 读完之后返回 None
+        """
+        while True:
+            try:
+                item = self.__queue.get(timeout=0.1)
+            except queue.Empty:
+                # 读取线程已经被停止, 不会再有新的块
+                if self.__thread is not None and self.__thread.is_alive():
+                    continue
+                try:
+                    item = self.__queue.get_nowait()
+                except queue.Empty:
+                    return None
+            if item is _END:
+                # 之后再取也一直是结束
+                self.__queue.put(_END)
+                return None
+            if isinstance(item, Exception):
+                self.__queue.put(item)
+                raise item
+            if len(item) > 0:
+                return item
+
+    def __current_chunk(self):
+        if self.__chunk is _PENDING:
+            self.__chunk = self.__take()
+        return self.__chunk
+
+    def __peek_chunk(self):
+        if self.__next_chunk is _PENDING:
+            self.__next_chunk = self.__take()
+        return self.__next_chunk
+
+    @property
+    def in_memory(self):
+        return False
+
+    @property
+    def bars(self):
+        """
+            正在派发的块
+
+            :rtype: :class:`myalgo.bar.BarStore`
+        """
+        chunk = self.__current_chunk()
+        return chunk if chunk is not None else self.__empty
+
+    @property
+    def pos(self):
+        return self.__pos
+
+    @property
+    def current_bars(self):
+        chunk = self.__current_chunk()
+        if chunk is None:
+            return None
+        return chunk[self.__offset]
+
+    @property
+    def next_bars(self):
+        chunk = self.__current_chunk()
+        if chunk is None:
+            return None
+
+        self.__last_bars = chunk[self.__offset]
+        self.__pos += 1
+        self.__offset += 1
+        if self.__offset >= len(chunk):
+            self.__chunk = self.__peek_chunk()
+            self.__next_chunk = _PENDING
+            self.__offset = 0
+            if self.__chunk is not None:
+                # 块开头缺失的bar取上一块中最后一根有效的bar, 与整个 store 上的 latest_bar 相同
+                self.__chunk.carry(chunk)
+        return self.current_bars
+
+    @property
+    def last_bars(self):
+        return self.__last_bars
+
+    def eof(self):
+        chunk = self.__current_chunk()
+        if chunk is None:
+            return True
+        if self.__offset + 1 < len(chunk):
+            return False
+        # 当前块的最后一根, 要看下一块是否存在
+        return self.__peek_chunk() is None
+
+    def reset(self):
+        self.__open()
+        self.feed_reset_event.emit(self.bars)
+
+    def clone(self):
+        return StreamingBarFeed(self.frequency, self.instruments, self.__chunks, self.max_len, self.__prefetch)
+
+    def stop(self):
+        self.__close()
+
+    def join(self):
+        if self.__thread is not None:
+            self.__thread.join()
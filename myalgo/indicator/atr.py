@@ -0,0 +1,85 @@
+import numpy as np
+
+from myalgo.indicator.base import Indicator
+from myalgo.indicator.ma import Smoothing, wilder
+
+# Bar.data 中用来计算真实波幅的列, 与 Bar.price 一样用卖价(bid)
+HIGH = 6
+LOW = 7
+CLOSE = 5
+
+
+def true_range(values):
+    """
+        :param values: (n, 9) 的柱状数据, 或者只有收盘价的一维数组
+        :return: 每根bar的真实波幅; 只有收盘价的时候是相邻收盘价之差的绝对值, 第一个位置为 nan
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        ret = np.full(values.shape[0], np.nan)
+        ret[1:] = np.abs(np.diff(values))
+        return ret
+
+    high, low, close = values[:, HIGH], values[:, LOW], values[:, CLOSE]
+    ret = high - low
+    if values.shape[0] > 1:
+        previous = close[:-1]
+        ret[1:] = np.maximum(ret[1:], np.maximum(np.abs(high[1:] - previous), np.abs(low[1:] - previous)))
+    return ret
+
+
+def atr(values, period):
+    """
+        真实波幅的 Wilder 平滑
+    """
+    tr = true_range(values)
+    # 只有收盘价的时候第一个位置没有真实波幅
+    offset = 1 if tr.shape[0] > 0 and np.isnan(tr[0]) else 0
+    ret = np.full(tr.shape[0], np.nan)
+    ret[offset:] = wilder(tr[offset:], period)
+    return ret
+
+
+class ATR(Indicator):
+    """
+        平均真实波幅
+
+        :param series: BarDataSeries, 用卖价的 high / low / close 计算真实波幅;
+            也可以是价格序列, 这时真实波幅是相邻两个价格之差的绝对值
+        :param period: 周期
+    """
+
+    def __init__(self, series, period: int, max_len=None):
+        assert period > 0
+        self.period = period
+        self.__previous = None
+        self.__smoothing = Smoothing(period, 1.0 / period)
+        super(ATR, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        if isinstance(value, np.ndarray):
+            high, low, close = float(value[HIGH]), float(value[LOW]), float(value[CLOSE])
+            tr = high - low
+            if self.__previous is not None:
+                tr = max(tr, abs(high - self.__previous), abs(low - self.__previous))
+        else:
+            close = float(value)
+            if self.__previous is None:
+                self.__previous = close
+                return np.nan
+            tr = abs(close - self.__previous)
+        self.__previous = close
+        return self.__smoothing.push(tr)
+
+    def bulk(self, values):
+        return atr(values, self.period)
+
+    def restore(self, values, results):
+        self.__previous = float(values[-1, CLOSE] if values.ndim == 2 else values[-1])
+        tr = true_range(values)
+        tr = tr[1:] if np.isnan(tr[0]) else tr
+        self.__smoothing.fill(tr, wilder(tr, self.period))
+
+    def clear(self):
+        self.__previous = None
+        self.__smoothing.clear()
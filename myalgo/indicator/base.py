@@ -0,0 +1,464 @@
+import numpy as np
+
+from myalgo.dataseries import BarDataSeries, PriceSeries
+from myalgo.event import Event
+from myalgo.indicator.registry import active_registry
+from myalgo.utils.jit import njit
+
+"""
+    增量计算的指标
+
+    指标订阅 source 的 append_event, source 每追加(或者零拷贝模式下前进)一根bar, 指标只用 O(1) 的时间更新一次,
+    与窗口的长度无关。source 可以是 PriceSeries, BarDataSeries 或者另一个指标, 所以指标可以串起来(比如 MACD 的信号线)
+
+    创建指标的时候 source 中已经有的数据, 用向量化的 bulk 一次算出来, 再从末尾恢复增量计算需要的状态
+
+    nan(比如没有数据的位置)不参与计算, 对应位置的结果也是 nan
+
+    使用磁盘缓存(见 :mod:`myalgo.indicator.cache`)并且 source 是零拷贝的序列时, 第一根bar到达的时候
+    直接映射(或者一次算出)整段数据上的值, 之后每根bar只是按位置取值
+"""
+
+# 在不知道数据长度的时候，第一次分配的长度，之后按两倍增长
+DEFAULT_CAPACITY = 1024
+
+
+def history(source):
+    """
+        source 中已经有的全部数据
+    """
+    if isinstance(source, PriceSeries):
+        return source.prices
+    if isinstance(source, BarDataSeries):
+        return source.bars
+    return source.values
+
+
+def origin(source, cache):
+    """
+        source 在整段数据(包括还没有派发的部分)上的值, 只有零拷贝并且不限长度的序列,
+        以及从缓存中加载的指标才有
+
+        :param cache: :class:`myalgo.indicator.cache.IndicatorCache`, 用来计算数据的指纹
+
+        :return: (数据的指纹, source 的描述, 整段数据), 没有的时候返回 None
+    """
+    if isinstance(source, Indicator):
+        return source.origin
+    if not isinstance(source, (PriceSeries, BarDataSeries)):
+        return None
+    impl = source.impl
+    if not impl.attached or impl.bounded:
+        return None
+    # 序列从第一根被派发的bar(impl.start)开始, 指纹覆盖整段数据, 描述中记下开始的位置
+    spec = ['series', impl.start]
+    full = impl.bars[impl.start:]
+    if isinstance(source, PriceSeries):
+        spec.append(source.column)
+        full = full[:, source.column]
+    return cache.fingerprint(impl.bars, impl.timestamps), spec, full
+
+
+def present(values):
+    """
+        不是 nan 的位置, 柱状数据看收盘价
+    """
+    values = np.asarray(values)
+    if values.ndim == 2:
+        values = values[:, 5]
+    return ~np.isnan(values)
+
+
+def skip_nan(compute, values, *args):
+    """
+        只在不是 nan 的位置上计算 compute, 与增量计算跳过 nan 的语义相同
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mask = present(values)
+    if mask.all():
+        return compute(values, *args)
+    ret = np.full(values.shape[0], np.nan)
+    ret[mask] = compute(values[mask], *args)
+    return ret
+
+
+class ValueBuffer:
+    """
+        指标的值, 追加是均摊 O(1) 的; 设置 max_len 的时候只保留最后 max_len 个,
+        与 BarDataSeriesImpl 的 ring_buffer 一样占用 2 * max_len 的空间, 切片总是连续的
+    """
+
+    def __init__(self, max_len=None, capacity=None):
+        self.max_len = max_len if max_len is not None and max_len > 0 else None
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.values = np.zeros(0)
+        self.start = 0
+        self.current = 0
+
+    def __len__(self):
+        return self.current - self.start
+
+    def view(self):
+        return self.values[self.start:self.current]
+
+    def __make_room(self, count):
+        size = self.current - self.start
+        needed = size + count
+        capacity = max(self.values.shape[0], self.capacity or DEFAULT_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        if self.max_len is not None:
+            capacity = max(min(capacity, 2 * self.max_len), needed)
+        if capacity == self.values.shape[0]:
+            self.values[:size] = self.values[self.start:self.current]
+        else:
+            values = np.empty(capacity)
+            values[:size] = self.values[self.start:self.current]
+            self.values = values
+        self.start = 0
+        self.current = size
+
+    def append(self, value):
+        if self.current == self.values.shape[0]:
+            self.__make_room(1)
+        self.values[self.current] = value
+        self.current += 1
+        if self.max_len is not None and self.current - self.start > self.max_len:
+            self.start += 1
+
+    def extend(self, values):
+        if self.max_len is not None:
+            values = values[-self.max_len:]
+        if self.current + values.shape[0] > self.values.shape[0]:
+            self.__make_room(values.shape[0])
+        self.values[self.current:self.current + values.shape[0]] = values
+        self.current += values.shape[0]
+        if self.max_len is not None and self.current - self.start > self.max_len:
+            self.start = self.current - self.max_len
+
+
+class Shared(type):
+    """
+        有注册表生效的时候, 通过注册表创建指标, 见 :class:`myalgo.indicator.registry.IndicatorRegistry`
+    """
+
+    def __call__(cls, source, *args, **kwargs):
+        registry = active_registry()
+        if registry is None:
+            return cls.create(source, *args, **kwargs)
+        return registry.get(cls, source, *args, **kwargs)
+
+    def create(cls, source, *args, **kwargs):
+        return super(Shared, cls).__call__(source, *args, **kwargs)
+
+
+class Indicator(metaclass=Shared):
+    """
+        指标的基类
+
+        :param source: PriceSeries, BarDataSeries 或者另一个 :class:`Indicator`
+        :param max_len: 最多保留的值的个数, 为 None 时全部保留
+
+        子类需要实现:
+            calculate(value): 加入 source 的最新值(不会是 nan), 返回这个位置上指标的值, 还不够数据的时候返回 nan
+            bulk(values): 向量化地计算整段数据(不含 nan)上的指标
+            restore(values, results): 用整段数据以及 bulk 的结果恢复增量计算的状态
+            clear(): 清空增量计算的状态
+
+        通过下标访问单个值的时候, 还没有值的位置返回 None, 与 pyalgotrade 的 DataSeries 相同;
+        切片返回 numpy 数组
+    """
+
+    def __init__(self, source, max_len=None):
+        self.source = source
+        self.append_event = Event()
+        self.__max_len = max_len
+        self.__values = ValueBuffer(max_len, len(source) or None)
+
+        # 磁盘缓存, 以及缓存中整段数据上的值
+        self.__cache = None
+        self.__spec = None
+        self.__origin = None
+        self.__full = None
+
+        self.warm_up()
+        source.append_event.subscribe(self.__on_append)
+
+    def persist(self, cache, spec):
+        """
+            使用磁盘缓存, source 是零拷贝的序列(或者这样的指标)时生效
+
+            :param cache: :class:`myalgo.indicator.cache.IndicatorCache`
+            :param spec: 可以转换成 json 的指标描述, 比如种类与参数
+        """
+        self.__cache = cache
+        self.__spec = spec
+
+    def __load(self):
+        """
+            第一根bar到达的时候, 序列在整段数据中的开始位置才确定下来, 这时映射或者计算整段数据上的值
+        """
+        source = origin(self.source, self.__cache)
+        if source is None:
+            return
+        fingerprint, source_spec, full = source
+        spec = self.__spec + [source_spec]
+        self.__full = self.__cache.get(fingerprint, spec, lambda: skip_nan(self.bulk, full))
+        self.__origin = (fingerprint, spec)
+
+    @property
+    def origin(self):
+        """
+            从缓存加载之后为 (数据的指纹, 指标的描述, 整段数据上的值), 见 :func:`origin`
+        """
+        if self.__full is None or self.__max_len is not None:
+            return None
+        return self.__origin + (self.__full,)
+
+    def __on_append(self, extended):
+        # 序列被重置之后重新开始
+        if len(self.source) == 1 and len(self.__values) > 0:
+            self.reset()
+
+        if self.__cache is not None and self.__full is None and len(self.source) == 1:
+            self.__load()
+        if self.__full is not None:
+            # source 不限长度, 它的长度就是在整段数据中的位置
+            self.__values.append(self.__full[len(self.source) - 1])
+            self.append_event.emit(False)
+            return
+
+        value = self.source.latest
+        if value is None:
+            return
+        if not isinstance(value, np.ndarray):
+            # 价格是 float32, 先转成 float, 否则和它相加的 float 也会变成 float32
+            value = float(value)
+        if self.is_nan(value):
+            result = np.nan
+        else:
+            result = self.calculate(value)
+        self.__values.append(result)
+        self.append_event.emit(False)
+
+    @staticmethod
+    def is_nan(value):
+        if isinstance(value, np.ndarray):
+            return value[5] != value[5]
+        return value != value
+
+    def warm_up(self):
+        """
+            一次性计算 source 中已经有的数据
+        """
+        values = history(self.source)
+        if len(values) == 0:
+            return
+        results = skip_nan(self.bulk, values)
+        self.__values.extend(results)
+        mask = present(values)
+        self.restore(np.asarray(values, dtype=np.float64)[mask], results[mask])
+
+    def reset(self):
+        self.__values.clear()
+        self.clear()
+        # 可能换了数据, 下一根bar到达的时候重新加载
+        self.__full = None
+        self.__origin = None
+
+    def calculate(self, value):
+        raise NotImplementedError()
+
+    def bulk(self, values):
+        raise NotImplementedError()
+
+    def restore(self, values, results):
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+    def __len__(self):
+        return len(self.__values)
+
+    def __getitem__(self, key):
+        ret = self.__values.view()[key]
+        if isinstance(key, slice):
+            return ret
+        return None if ret != ret else float(ret)
+
+    @property
+    def values(self):
+        return self.__values.view()
+
+    @property
+    def latest(self):
+        buffer = self.__values
+        return buffer.values[buffer.current - 1] if buffer.current > buffer.start else None
+
+
+class Change(Indicator):
+    """
+        相邻两个值之差, 第一个位置为 nan
+    """
+
+    def __init__(self, series, max_len=None):
+        self.__previous = None
+        super(Change, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        previous = self.__previous
+        self.__previous = value
+        return np.nan if previous is None else value - previous
+
+    def bulk(self, values):
+        ret = np.full(values.shape[0], np.nan)
+        ret[1:] = np.diff(values)
+        return ret
+
+    def restore(self, values, results):
+        self.__previous = float(values[-1])
+
+    def clear(self):
+        self.__previous = None
+
+
+class Window:
+    """
+        最近 period 个值, 固定大小的环形数组
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.values = np.zeros(period)
+        self.count = 0
+        self.head = 0
+
+    def clear(self):
+        self.count = 0
+        self.head = 0
+
+    @property
+    def full(self):
+        return self.count == self.period
+
+    def push(self, value):
+        """
+            加入一个值, 返回被挤出去的值, 窗口还没满的时候返回 None
+        """
+        ret = None
+        if self.count == self.period:
+            ret = self.values[self.head]
+        else:
+            self.count += 1
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.period
+        return ret
+
+    def fill(self, values):
+        values = values[-self.period:]
+        self.values[:values.shape[0]] = values
+        self.count = values.shape[0]
+        self.head = values.shape[0] % self.period
+
+    def total(self):
+        return float(self.values[:self.count].sum())
+
+
+class RunningSum:
+    """
+        最近 period 个值的和, 每加一个值 O(1)
+
+        每过 period 个值重新求和一次, 避免浮点误差的累积, 均摊下来仍然是 O(1)
+    """
+
+    def __init__(self, period):
+        self.window = Window(period)
+        self.sum = 0.0
+        self.updates = 0
+
+    def clear(self):
+        self.window.clear()
+        self.sum = 0.0
+        self.updates = 0
+
+    @property
+    def full(self):
+        return self.window.full
+
+    def push(self, value):
+        removed = self.window.push(value)
+        self.sum += value
+        if removed is not None:
+            self.sum -= removed
+        self.updates += 1
+        if self.updates >= self.window.period:
+            self.sum = self.window.total()
+            self.updates = 0
+
+    def fill(self, values):
+        self.window.fill(values)
+        self.sum = self.window.total()
+        self.updates = 0
+
+
+@njit
+def rolling_sum(values, period):
+    """
+        每个位置上最近 period 个值的和, 窗口不满的位置为 nan
+
+        与 :class:`RunningSum` 一样每 period 个值重新求和一次
+    """
+    n = values.shape[0]
+    ret = np.full(n, np.nan)
+    total = 0.0
+    updates = 0
+    for i in range(n):
+        total += values[i]
+        if i >= period:
+            total -= values[i - period]
+        updates += 1
+        if updates >= period:
+            total = 0.0
+            for j in range(max(i - period + 1, 0), i + 1):
+                total += values[j]
+            updates = 0
+        if i >= period - 1:
+            ret[i] = total
+    return ret
+
+
+class Difference:
+    """
+        两个序列逐个位置的差, 不保存数据, 访问的时候才计算(比如 MACD 的柱状图)
+    """
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+    def __len__(self):
+        return min(len(self.left), len(self.right))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.values[key]
+        left, right = self.left[key], self.right[key]
+        if left is None or right is None:
+            return None
+        return left - right
+
+    @property
+    def values(self):
+        size = len(self)
+        return self.left.values[len(self.left) - size:] - self.right.values[len(self.right) - size:]
+
+    @property
+    def latest(self):
+        left, right = self.left.latest, self.right.latest
+        if left is None or right is None:
+            return None
+        return left - right
@@ -0,0 +1,210 @@
+import glob
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+
+from myalgo.feed.cache import load_arrays, save_arrays
+from myalgo.logger import get_logger
+
+"""
+    指标在整段数据上的值保存在磁盘上, 之后的回测(换了策略参数)或者优化器的 worker 直接内存映射, 不再重新计算
+
+    缓存的名字由 (数据的指纹, 指标的描述) 决定:
+        数据的指纹是整段柱状数据与时间戳的哈希, 数据变了自然就找不到原来的缓存
+        指标的描述是 [模块, 类名, 类的源代码的哈希, 参数, 数据源的描述], 改了指标的实现之后原来的缓存也不会再被用到
+
+    缓存目录有大小(以及个数)的上限, 超过之后按最近使用的时间淘汰最久没有用过的
+"""
+
+DEFAULT_CACHE_DIR = 'indicator_cache'
+
+# 缓存目录默认最多占用的字节数
+MAX_BYTES = 2 ** 30
+
+logger = get_logger(__name__)
+
+_code_versions = {}
+
+
+def code_version(obj):
+    """
+        类或者函数的源代码的哈希, 取不到源代码的时候(比如交互式环境中定义的)为空字符串
+    """
+    ret = _code_versions.get(obj)
+    if ret is None:
+        try:
+            ret = hashlib.sha1(inspect.getsource(obj).encode()).hexdigest()
+        except (OSError, TypeError):
+            ret = ''
+        _code_versions[obj] = ret
+    return ret
+
+
+def fingerprint(*arrays):
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(json.dumps([str(array.dtype), list(array.shape)]).encode())
+        digest.update(array.view(np.uint8))
+    return digest.hexdigest()
+
+
+class IndicatorCache(object):
+    """A directory of memory mapped indicator arrays, one per (data fingerprint, indicator spec).
+
+    :param directory: Where to keep the files. Created if it does not exist.
+    :type directory: string.
+    :param max_bytes: The size cap of the directory, the least recently used entries are evicted beyond it.
+    :type max_bytes: int.
+    :param max_entries: The maximum number of entries, None for no limit.
+    :type max_entries: int.
+
+    .. note::
+        Several processes (optimizer workers) may share the directory: entries are written atomically, and an entry
+        evicted while another process maps it stays readable until it is unmapped.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=MAX_BYTES, max_entries=None):
+        self.__directory = directory
+        self.__max_bytes = max_bytes
+        self.__max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+        # 同一份数据只计算一次指纹, 保留数组的引用, 所以 id 不会被复用
+        self.__fingerprints = {}
+
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    def fingerprint(self, *arrays):
+        key = tuple(id(array) for array in arrays)
+        ret = self.__fingerprints.get(key)
+        if ret is None:
+            ret = (arrays, fingerprint(*arrays))
+            self.__fingerprints[key] = ret
+        return ret[1]
+
+    @staticmethod
+    def key(fingerprint, spec):
+        return hashlib.sha1(json.dumps([fingerprint, spec]).encode()).hexdigest()
+
+    def load(self, fingerprint, spec):
+        """
+            :return: {key: 只读的内存映射}, 没有缓存的时候返回 None
+        """
+        name = self.key(fingerprint, spec)
+        ret = load_arrays(self.__directory, name, ())
+        if ret is None:
+            return None
+        meta = ret[0]
+        if meta.get('fingerprint') != fingerprint or meta.get('spec') != spec:
+            return None
+        # 文件名中只用序号, key 本身记在元数据中
+        keys = meta['keys']
+        ret = load_arrays(self.__directory, name, [str(i) for i in range(len(keys))])
+        if ret is None:
+            return None
+        # 元数据的修改时间就是最近使用的时间
+        try:
+            os.utime(os.path.join(self.__directory, "%s.json" % name))
+        except OSError:
+            pass
+        return {key: ret[1][str(i)] for i, key in enumerate(keys)}
+
+    def save(self, fingerprint, spec, arrays):
+        meta = {'fingerprint': fingerprint, 'spec': spec, 'keys': list(arrays)}
+        save_arrays(self.__directory, self.key(fingerprint, spec),
+                    {str(i): array for i, array in enumerate(arrays.values())}, meta)
+        self.evict()
+
+    def get_arrays(self, fingerprint, spec, compute):
+        """
+            有缓存的时候直接映射, 否则调用 compute() 得到 {key: 数组}, 保存之后再映射
+
+            :param spec: 可以转换成 json 的指标描述
+        """
+        ret = self.load(fingerprint, spec)
+        if ret is not None:
+            self.__hits += 1
+            logger.debug(f'indicator cache hit: {spec}')
+            return ret
+
+        self.__misses += 1
+        arrays = compute()
+        self.save(fingerprint, spec, arrays)
+        ret = self.load(fingerprint, spec)
+        # 保存之后马上被别的进程淘汰了
+        return ret if ret is not None else arrays
+
+    def get(self, fingerprint, spec, compute):
+        """
+            只有一个数组的 :meth:`get_arrays`
+        """
+        return self.get_arrays(fingerprint, spec, lambda: {'values': compute()})['values']
+
+    def entries(self):
+        """
+            :return: [(最近使用的时间, 字节数, 文件)], 最久没有用过的在前面
+        """
+        ret = []
+        for meta in glob.glob(os.path.join(self.__directory, '*.json')):
+            prefix = meta[:-len('json')]
+            files = [meta] + glob.glob(glob.escape(prefix) + '*.npy')
+            try:
+                used = os.stat(meta).st_mtime_ns
+                size = sum(os.stat(f).st_size for f in files)
+            except OSError:
+                continue
+            ret.append((used, size, files))
+        ret.sort(key=lambda entry: entry[0])
+        return ret
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(entry[1] for entry in entries)
+        count = len(entries)
+        for used, size, files in entries:
+            if (self.__max_bytes is None or total <= self.__max_bytes) and \
+                    (self.__max_entries is None or count <= self.__max_entries):
+                break
+            # 先删元数据, 这样别的进程不会读到不完整的缓存
+            for f in files:
+                try:
+                    os.remove(f)
+                except OSError:
+                    pass
+            total -= size
+            count -= 1
+            logger.debug(f'indicator cache evicted {files[0]}')
+
+    def clear(self):
+        for used, size, files in self.entries():
+            for f in files:
+                try:
+                    os.remove(f)
+                except OSError:
+                    pass
+
+
+def as_indicator_cache(cache):
+    """
+        None 表示不使用缓存, 字符串表示缓存目录
+    """
+    if cache is None or isinstance(cache, IndicatorCache):
+        return cache
+    return IndicatorCache(cache)
@@ -0,0 +1,52 @@
+import numpy as np
+
+from myalgo.dataseries import PriceSeries
+
+"""
+    两个序列的交叉, 与 pyalgotrade.technical.cross 相同: 统计 [start, end) 这一段中发生交叉的次数
+
+    只看末尾的几个值, 不会遍历整个序列
+"""
+
+
+def tail(series, start, end):
+    if isinstance(series, (int, float)):
+        return series
+    if isinstance(series, PriceSeries):
+        return series.prices[start:end]
+    if hasattr(series, 'values'):
+        return series.values[start:end]
+    return np.asarray(series[start:end], dtype=np.float64)
+
+
+def cross(values1, values2, start, end, sign):
+    values1, values2 = tail(values1, start, end), tail(values2, start, end)
+    diff = (np.asarray(values1, dtype=np.float64) - np.asarray(values2, dtype=np.float64)) * sign
+
+    ret = 0
+    previous = None
+    for value in diff:
+        if value != value or value == 0:
+            # 相等的时候沿用之前的大小关系
+            continue
+        if previous is not None and previous < 0 < value:
+            ret += 1
+        previous = value
+    return ret
+
+
+def cross_above(values1, values2, start=-2, end=None):
+    """
+        values1 从下向上穿过 values2 的次数
+
+        :param values1: 价格序列, 指标, 或者任何支持切片的序列
+        :param values2: 同上, 也可以是一个数
+    """
+    return cross(values1, values2, start, end, 1.0)
+
+
+def cross_below(values1, values2, start=-2, end=None):
+    """
+        values1 从上向下穿过 values2 的次数
+    """
+    return cross(values1, values2, start, end, -1.0)
@@ -1,7 +1,153 @@
-from myalgo.dataseries import PriceSeries
+from collections import deque
 
+import numpy as np
 
-class High:
-    def __init__(self, period: int, series: PriceSeries):
-        self.series: PriceSeries = series
-        self.period: int = period
+from myalgo.indicator.base import Indicator
+from myalgo.utils.jit import njit
+
+
+@njit
+def rolling_extreme(values, period, sign):
+    """
+        单调队列, O(n) 得到每个窗口内的最大值(sign=1)或最小值(sign=-1), 窗口不满的位置为nan
+    """
+    n = values.shape[0]
+    ret = np.full(n, np.nan)
+    queue = np.empty(n, dtype=np.int64)
+    head = 0
+    tail = 0
+    for i in range(n):
+        value = values[i] * sign
+        while tail > head and values[queue[tail - 1]] * sign <= value:
+            tail -= 1
+        queue[tail] = i
+        tail += 1
+        if queue[head] <= i - period:
+            head += 1
+        if i >= period - 1:
+            ret[i] = values[queue[head]]
+    return ret
+
+
+def rolling_high(values, period: int):
+    """
+        对整个数组计算最近 period 个值(包括当前值)中的最大值
+    """
+    return rolling_extreme(np.asarray(values, dtype=np.float64), period, 1.0)
+
+
+def rolling_low(values, period: int):
+    """
+        对整个数组计算最近 period 个值(包括当前值)中的最小值
+    """
+    return rolling_extreme(np.asarray(values, dtype=np.float64), period, -1.0)
+
+
+class Extreme:
+    """
+        :func:`rolling_extreme` 的增量版本, 单调队列中最多有 period 个值, 每加一个值均摊 O(1)
+    """
+
+    def __init__(self, period, sign):
+        self.period = period
+        self.sign = sign
+        self.queue = deque()
+        self.count = 0
+
+    def clear(self):
+        self.queue.clear()
+        self.count = 0
+
+    def push(self, value):
+        value = float(value) * self.sign
+        queue = self.queue
+        while queue and queue[-1][1] <= value:
+            queue.pop()
+        queue.append((self.count, value))
+        if queue[0][0] <= self.count - self.period:
+            queue.popleft()
+        self.count += 1
+        return queue[0][1] * self.sign if self.count >= self.period else np.nan
+
+    def fill(self, values):
+        # 只有最后 period 个值会影响之后的结果
+        tail = values[-self.period:]
+        self.clear()
+        self.count = values.shape[0] - tail.shape[0]
+        for value in tail:
+            self.push(value)
+
+
+class High(Indicator):
+    """
+        最近 period 个值(包括当前值)中的最大值
+    """
+
+    def __init__(self, series, period: int, max_len=None):
+        assert period > 0
+        self.period = period
+        self.__extreme = Extreme(period, 1.0)
+        super(High, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        return self.__extreme.push(value)
+
+    def bulk(self, values):
+        return rolling_high(values, self.period)
+
+    def restore(self, values, results):
+        self.__extreme.fill(values)
+
+    def clear(self):
+        self.__extreme.clear()
+
+
+class Low(Indicator):
+    """
+        最近 period 个值(包括当前值)中的最小值
+    """
+
+    def __init__(self, series, period: int, max_len=None):
+        assert period > 0
+        self.period = period
+        self.__extreme = Extreme(period, -1.0)
+        super(Low, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        return self.__extreme.push(value)
+
+    def bulk(self, values):
+        return rolling_low(values, self.period)
+
+    def restore(self, values, results):
+        self.__extreme.fill(values)
+
+    def clear(self):
+        self.__extreme.clear()
+
+
+class Range(Indicator):
+    """
+        最近 period 个值的最大值与最小值之差
+    """
+
+    def __init__(self, series, period: int, max_len=None):
+        assert period > 0
+        self.period = period
+        self.__high = Extreme(period, 1.0)
+        self.__low = Extreme(period, -1.0)
+        super(Range, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        return self.__high.push(value) - self.__low.push(value)
+
+    def bulk(self, values):
+        return rolling_high(values, self.period) - rolling_low(values, self.period)
+
+    def restore(self, values, results):
+        self.__high.fill(values)
+        self.__low.fill(values)
+
+    def clear(self):
+        self.__high.clear()
+        self.__low.clear()
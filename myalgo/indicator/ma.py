@@ -0,0 +1,133 @@
+import numpy as np
+
+from myalgo.indicator.base import Indicator, RunningSum, rolling_sum
+from myalgo.utils.jit import njit
+
+
+@njit
+def smooth(values, period, multiplier):
+    """
+        指数平滑, 第 period 个值是前 period 个值的简单平均, 之后每个值 value += (x - value) * multiplier
+
+        EMA 的 multiplier 是 2 / (period + 1), Wilder 平滑(RSI, ATR)是 1 / period
+    """
+    n = values.shape[0]
+    ret = np.full(n, np.nan)
+    if n < period:
+        return ret
+    value = 0.0
+    for i in range(period):
+        value += values[i]
+    value /= period
+    ret[period - 1] = value
+    for i in range(period, n):
+        value = (values[i] - value) * multiplier + value
+        ret[i] = value
+    return ret
+
+
+def sma(values, period):
+    return rolling_sum(np.asarray(values, dtype=np.float64), period) / period
+
+
+def ema(values, period):
+    return smooth(np.asarray(values, dtype=np.float64), period, 2.0 / (period + 1))
+
+
+def wilder(values, period):
+    return smooth(np.asarray(values, dtype=np.float64), period, 1.0 / period)
+
+
+class Smoothing:
+    """
+        :func:`smooth` 的增量版本, 每加一个值 O(1)
+    """
+
+    def __init__(self, period, multiplier):
+        self.period = period
+        self.multiplier = multiplier
+        # 还没有足够的数据时, value 是前面的值的和
+        self.count = 0
+        self.value = 0.0
+
+    def clear(self):
+        self.count = 0
+        self.value = 0.0
+
+    def push(self, value):
+        if self.count < self.period:
+            self.count += 1
+            self.value += value
+            if self.count < self.period:
+                return np.nan
+            self.value /= self.period
+        else:
+            self.value = (value - self.value) * self.multiplier + self.value
+        return self.value
+
+    def fill(self, values, results):
+        """
+            :param values: 已经加入的全部值
+            :param results: :func:`smooth` 在这些值上的结果
+        """
+        if values.shape[0] < self.period:
+            self.count = values.shape[0]
+            self.value = float(values.sum())
+        else:
+            self.count = self.period
+            self.value = float(results[-1])
+
+
+class SMA(Indicator):
+    """
+        简单移动平均
+
+        :param series: 价格序列或者另一个指标
+        :param period: 窗口长度
+    """
+
+    def __init__(self, series, period: int, max_len=None):
+        assert period > 0
+        self.period = period
+        self.__sum = RunningSum(period)
+        super(SMA, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        self.__sum.push(value)
+        return self.__sum.sum / self.period if self.__sum.full else np.nan
+
+    def bulk(self, values):
+        return sma(values, self.period)
+
+    def restore(self, values, results):
+        self.__sum.fill(values)
+
+    def clear(self):
+        self.__sum.clear()
+
+
+class EMA(Indicator):
+    """
+        指数移动平均
+
+        :param series: 价格序列或者另一个指标
+        :param period: 周期, 衰减系数为 2 / (period + 1)
+    """
+
+    def __init__(self, series, period: int, max_len=None):
+        assert period > 0
+        self.period = period
+        self.__smoothing = Smoothing(period, 2.0 / (period + 1))
+        super(EMA, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        return self.__smoothing.push(value)
+
+    def bulk(self, values):
+        return ema(values, self.period)
+
+    def restore(self, values, results):
+        self.__smoothing.fill(values, results)
+
+    def clear(self):
+        self.__smoothing.clear()
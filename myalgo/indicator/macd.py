@@ -0,0 +1,37 @@
+import numpy as np
+
+from myalgo.indicator.base import Difference, Indicator
+from myalgo.indicator.ma import EMA, ema
+
+
+class MACD(Indicator):
+    """
+        快线 EMA 与慢线 EMA 之差
+
+        :param series: 价格序列
+        :param fast: 快线周期
+        :param slow: 慢线周期
+        :param signal: 信号线(MACD 的 EMA)周期
+
+        :attr:`signal` 是信号线, :attr:`histogram` 是 MACD 与信号线之差
+    """
+
+    def __init__(self, series, fast: int, slow: int, signal: int, max_len=None):
+        # 两条 EMA 先订阅 series, 所以每根bar上都会先于 MACD 更新; 有注册表的时候与其他 MACD 共用
+        self.fast = EMA(series, fast)
+        self.slow = EMA(series, slow)
+        super(MACD, self).__init__(series, max_len)
+        self.signal = EMA(self, signal, max_len)
+        self.histogram = Difference(self, self.signal)
+
+    def calculate(self, value):
+        return self.fast.latest - self.slow.latest
+
+    def bulk(self, values):
+        return ema(values, self.fast.period) - ema(values, self.slow.period)
+
+    def restore(self, values, results):
+        pass
+
+    def clear(self):
+        pass
@@ -0,0 +1,58 @@
+from myalgo.indicator.base import Indicator
+from myalgo.indicator.highlow import Range, rolling_high, rolling_low
+from myalgo.indicator.ma import SMA, sma
+
+
+class SMAD(Indicator):
+    """
+        价格偏离简单移动平均的比例: (price - SMA) / SMA
+
+        :param series: 价格序列
+        :param period: SMA 的窗口长度
+    """
+
+    def __init__(self, series, period: int, max_len=None):
+        # SMA 先订阅 series, 每根bar上都会先更新
+        self.sma = SMA(series, period)
+        super(SMAD, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        average = self.sma.latest
+        return (value - average) / average
+
+    def bulk(self, values):
+        average = sma(values, self.sma.period)
+        return (values - average) / average
+
+    def restore(self, values, results):
+        pass
+
+    def clear(self):
+        pass
+
+
+class SMADRange(Indicator):
+    """
+        窗口内的波动范围相对于简单移动平均的比例: (High - Low) / SMA
+
+        :param series: 价格序列
+        :param period: 窗口长度
+    """
+
+    def __init__(self, series, period: int, max_len=None):
+        self.sma = SMA(series, period)
+        self.range = Range(series, period)
+        super(SMADRange, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        return self.range.latest / self.sma.latest
+
+    def bulk(self, values):
+        period = self.sma.period
+        return (rolling_high(values, period) - rolling_low(values, period)) / sma(values, period)
+
+    def restore(self, values, results):
+        pass
+
+    def clear(self):
+        pass
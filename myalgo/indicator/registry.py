@@ -0,0 +1,116 @@
+import inspect
+import json
+
+from myalgo.indicator.cache import as_indicator_cache, code_version
+from myalgo.logger import get_logger
+
+"""
+    指标的注册表: 同一个序列上种类与参数都相同的指标只创建一次
+
+    注册表生效(with registry: ...)的时候, 创建任何 :class:`myalgo.indicator.base.Indicator` 都会先查表,
+    已经有的直接返回同一个实例。组合指标内部创建的子指标也会经过注册表, 所以几个 MACD 共用同一条 EMA,
+    SMAD 与 SMADRange 共用同一条 SMA, 不同周期的 RSI 共用同一个涨跌序列
+
+    设置了磁盘缓存的时候, 注册表创建的指标还会把整段数据上的值保存下来, 之后的回测直接映射
+"""
+
+logger = get_logger(__name__)
+
+# 正在生效的注册表, 嵌套的时候最里面的生效
+_active = []
+
+
+def active_registry():
+    return _active[-1] if _active else None
+
+
+class IndicatorRegistry:
+    """
+        :attr:`stats` 记录了请求的次数, 真正创建的个数, 以及因为共用而省下的增量更新次数
+
+        :param cache: :class:`myalgo.indicator.cache.IndicatorCache` 或者缓存目录, None 表示不使用磁盘缓存
+    """
+
+    def __init__(self, cache=None):
+        self.__cache = as_indicator_cache(cache)
+        self.__instances = {}
+        self.__hits = {}
+        self.__requested = 0
+
+    def __enter__(self):
+        _active.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _active.remove(self)
+
+    @property
+    def cache(self):
+        return self.__cache
+
+    @staticmethod
+    def spec(key):
+        """
+            磁盘缓存中的指标描述, 参数不能转换成 json 的时候(比如另一个序列)返回 None
+        """
+        cls, source, params = key
+        spec = [cls.__module__, cls.__qualname__, code_version(cls), [list(param) for param in params]]
+        try:
+            json.dumps(spec)
+        except TypeError:
+            return None
+        return spec
+
+    @staticmethod
+    def key(cls, source, args, kwargs):
+        """
+            (种类, 序列, 参数), 参数按构造函数的签名补齐默认值, 位置参数与关键字参数写法不同也是同一个指标
+        """
+        bound = inspect.signature(cls.__init__).bind(None, source, *args, **kwargs)
+        bound.apply_defaults()
+        params = tuple(bound.arguments.items())[2:]
+        # 实例持有 source 的引用, 所以 source 存活期间 id 不会被复用
+        return cls, id(source), params
+
+    def get(self, cls, source, *args, **kwargs):
+        self.__requested += 1
+        key = self.key(cls, source, args, kwargs)
+        ret = self.__instances.get(key)
+        if ret is None:
+            ret = cls.create(source, *args, **kwargs)
+            self.__instances[key] = ret
+            spec = self.spec(key) if self.__cache is not None else None
+            if spec is not None:
+                ret.persist(self.__cache, spec)
+        else:
+            self.__hits[key] = self.__hits.get(key, 0) + 1
+        return ret
+
+    def __len__(self):
+        return len(self.__instances)
+
+    @property
+    def stats(self):
+        """
+            requested: 请求的次数, 包括组合指标内部的子指标
+            created: 真正创建的指标个数
+            shared: 直接返回已有实例的次数, 每次都省下了之后每根bar上的一次更新
+            saved_updates: 到现在为止省下的更新次数(包括创建时向量化计算的部分)
+        """
+        saved = sum(hits * len(self.__instances[key]) for key, hits in self.__hits.items())
+        ret = {
+            'requested': self.__requested,
+            'created': len(self.__instances),
+            'shared': sum(self.__hits.values()),
+            'saved_updates': saved,
+        }
+        if self.__cache is not None:
+            ret['cache_hits'] = self.__cache.hits
+            ret['cache_misses'] = self.__cache.misses
+        return ret
+
+    def report(self):
+        stats = self.stats
+        logger.info(f"indicators: {stats['requested']} requested, {stats['created']} created, "
+                    f"{stats['shared']} shared, {stats['saved_updates']} updates saved")
+        return stats
@@ -0,0 +1,76 @@
+import numpy as np
+
+from myalgo.indicator.base import Change, Indicator
+from myalgo.indicator.ma import Smoothing, wilder
+
+
+def gains_losses(values):
+    """
+        相邻两个值的涨幅与跌幅, 都不小于0
+    """
+    delta = np.diff(np.asarray(values, dtype=np.float64))
+    return np.maximum(delta, 0.0), np.maximum(-delta, 0.0)
+
+
+def relative_strength(avg_gain, avg_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    # 没有下跌的时候是100
+    return np.where(avg_loss == 0, 100.0, ret)
+
+
+def rsi(values, period):
+    """
+        Wilder 的 RSI, 第一个值在第 period + 1 个价格上
+    """
+    values = np.asarray(values, dtype=np.float64)
+    ret = np.full(values.shape[0], np.nan)
+    if values.shape[0] < 2:
+        return ret
+    gains, losses = gains_losses(values)
+    avg_gain, avg_loss = wilder(gains, period), wilder(losses, period)
+    ret[1:] = np.where(np.isnan(avg_gain), np.nan, relative_strength(avg_gain, avg_loss))
+    return ret
+
+
+class RSI(Indicator):
+    """
+        相对强弱指数, 涨幅与跌幅分别用 Wilder 平滑
+
+        :param series: 价格序列或者另一个指标
+        :param period: 周期
+    """
+
+    def __init__(self, series, period: int, max_len=None):
+        assert period > 0
+        self.period = period
+        # 涨跌先订阅 series, 每根bar上都会先更新; 有注册表的时候不同周期的 RSI 共用它
+        self.change = Change(series)
+        self.__gain = Smoothing(period, 1.0 / period)
+        self.__loss = Smoothing(period, 1.0 / period)
+        super(RSI, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        delta = self.change.latest
+        if delta != delta:
+            return np.nan
+
+        avg_gain = self.__gain.push(delta if delta > 0 else 0.0)
+        avg_loss = self.__loss.push(-delta if delta < 0 else 0.0)
+        if avg_gain != avg_gain:
+            return np.nan
+        if avg_loss == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+    def bulk(self, values):
+        return rsi(values, self.period)
+
+    def restore(self, values, results):
+        gains, losses = gains_losses(values)
+        self.__gain.fill(gains, wilder(gains, self.period))
+        self.__loss.fill(losses, wilder(losses, self.period))
+
+    def clear(self):
+        self.__gain.clear()
+        self.__loss.clear()
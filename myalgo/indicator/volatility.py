@@ -0,0 +1,72 @@
+import numpy as np
+
+from myalgo.indicator.base import Indicator, RunningSum, rolling_sum
+
+
+def log_returns(values):
+    return np.diff(np.log(np.asarray(values, dtype=np.float64)))
+
+
+def deviation(total, squares, period):
+    """
+        用窗口内的和与平方和求样本标准差
+    """
+    variance = (squares - total * total / period) / max(period - 1, 1)
+    return np.sqrt(np.maximum(variance, 0.0))
+
+
+def volatility(values, period):
+    """
+        最近 period 个对数收益率的标准差, 第一个值在第 period + 1 个价格上
+    """
+    values = np.asarray(values, dtype=np.float64)
+    ret = np.full(values.shape[0], np.nan)
+    if values.shape[0] < 2:
+        return ret
+    returns = log_returns(values)
+    ret[1:] = deviation(rolling_sum(returns, period), rolling_sum(returns * returns, period), period)
+    return ret
+
+
+class Volatility(Indicator):
+    """
+        对数收益率的滚动标准差, 用窗口内的和与平方和增量计算
+
+        :param series: 价格序列
+        :param period: 窗口长度
+    """
+
+    def __init__(self, series, period: int, max_len=None):
+        assert period > 0
+        self.period = period
+        self.__previous = None
+        self.__sum = RunningSum(period)
+        self.__squares = RunningSum(period)
+        super(Volatility, self).__init__(series, max_len)
+
+    def calculate(self, value):
+        previous = self.__previous
+        self.__previous = float(value)
+        if previous is None:
+            return np.nan
+
+        ret = np.log(self.__previous / previous)
+        self.__sum.push(ret)
+        self.__squares.push(ret * ret)
+        if not self.__sum.full:
+            return np.nan
+        return float(deviation(self.__sum.sum, self.__squares.sum, self.period))
+
+    def bulk(self, values):
+        return volatility(values, self.period)
+
+    def restore(self, values, results):
+        self.__previous = float(values[-1])
+        returns = log_returns(values)
+        self.__sum.fill(returns)
+        self.__squares.fill(returns * returns)
+
+    def clear(self):
+        self.__previous = None
+        self.__sum.clear()
+        self.__squares.clear()
@@ -26,6 +26,7 @@ import socket
 import threading
 import time
 
+from myalgo.feed import OptimizerBarFeed
 from myalgo.optimizer import base
 from myalgo.optimizer import worker
 from myalgo.optimizer import xmlrpcserver
@@ -49,6 +50,12 @@ def worker_process(strategyClass, port, logLevel, barFeed):
             strat.run()
             return strat.result
 
+        def runStrategies(self, barFeed, parameters):
+            # 向量化的策略一次回测整批参数
+            if not hasattr(strategyClass, 'run_sweep'):
+                return None
+            return strategyClass.run_sweep(barFeed, parameters)
+
     # Create a worker and run it.
     try:
         name = "worker-%s" % (os.getpid())
@@ -107,13 +114,18 @@ def run_impl(strategyClass, barFeed, strategyParameters, batchSize, workerCount=
     logger.info("Waiting for the server to be ready")
     srv.waitServing()
 
+    sharedBars = None
     try:
+        # 所有worker映射同一份共享内存中的数据, 启动时不用复制, 内存占用也不随worker数量增长
+        sharedBars = barFeed.bars.share()
+        workerFeed = OptimizerBarFeed(barFeed.frequency, barFeed.instruments, sharedBars, barFeed.max_len)
+
         logger.info("Starting %s workers" % workerCount)
         # Build the worker processes.
         for i in range(workerCount):
             workers.append(multiprocessing.Process(
                 target=worker_process,
-                args=(strategyClass, port, logLevel, barFeed))
+                args=(strategyClass, port, logLevel, workerFeed))
             )
         # Start workers
         for process in workers:
@@ -134,6 +146,9 @@ def run_impl(strategyClass, barFeed, strategyParameters, batchSize, workerCount=
         srv.stop()
         serverThread.join()
 
+        if sharedBars is not None:
+            sharedBars.release()
+
 
 def run(strategyClass, barFeed, strategyParameters, workerCount=None, logLevel=logging.ERROR, batchSize=200,
         result_file='result.sqlite'):
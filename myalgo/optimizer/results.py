@@ -1,8 +1,21 @@
+import threading
+import time
+
 from sqlalchemy import Column, String, Integer, Float
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session
 
+import myalgo.logger
+
+logger = myalgo.logger.get_logger(__name__)
+
+# 缓冲区中的结果达到这个数量, 或者距离上一次写入超过这个时间(秒)时写入数据库
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 2.0
+# close 的时候写入失败重试的次数, 每次间隔 FLUSH_INTERVAL 秒
+CLOSE_RETRIES = 3
+
 Base = declarative_base()
 
 
@@ -28,16 +41,52 @@ class ResultModel(Base):
     plr = Column(Float)
 
 
+def enable_wal(dbapi_connection, connection_record):
+    # WAL 模式下写入不会阻塞读取, 每个事务也只需要一次fsync
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 class ResultManager:
+    """
+        结果先缓存在内存中, 攒够 batch_size 条或者每隔 flush_interval 秒, 在一个事务中用 executemany 一次写入
+
+        server 结束的时候需要调用 close, 把还没有写入的结果写完
+
+        :param batch_size: 缓冲区的最大条数
+        :param flush_interval: 缓冲区中的结果最多停留的秒数, None 表示只按条数写入
+    """
+
     def __init__(self,
                  strategy_name: str,
-                 file_name='result.sqlite'):
+                 file_name='result.sqlite',
+                 batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL):
         self.__engine = create_engine(f'sqlite:///{file_name}')
+        event.listen(self.__engine, 'connect', enable_wal)
         Base.metadata.create_all(self.__engine)
         self.__DBSession = Session(self.__engine)
 
         self.__strategy_name = strategy_name
 
+        self.__batch_size = max(batch_size, 1)
+        self.__flush_interval = flush_interval
+        self.__buffer = []
+        # __lock 保护缓冲区, __flush_lock 保证同一时间只有一个写入的事务
+        self.__lock = threading.Lock()
+        self.__flush_lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__flush_thread = None
+
+        # 统计
+        self.__saved = 0
+        self.__failed = 0
+        self.__flushes = 0
+        self.__flush_time = 0.0
+        self.__started = time.time()
+
     """
         Here we save the data into the sqlite
         
@@ -45,20 +94,109 @@ class ResultManager:
 
     def save(self, p1, p2, win_rate, sharp_ratio, profit_rate,
              ret, draw_down, draw_down_duration, trade_count, plr):
-        result = ResultModel(p1=p1, p2=p2, strategy_name=self.__strategy_name, win_rate=win_rate,
-                             sharp_ratio=sharp_ratio, profit_rate=profit_rate, ret=ret, draw_down=draw_down,
-                             draw_down_duration=draw_down_duration.total_seconds() / 60, trade_count=trade_count,
-                             plr=plr,
-                             )
-
-        try:
-            self.__DBSession.add(result)
-            self.__DBSession.commit()
-        except Exception as e:
-            print(e)
-            self.__DBSession.rollback()
+        result = dict(p1=p1, p2=p2, strategy_name=self.__strategy_name, win_rate=win_rate,
+                      sharp_ratio=sharp_ratio, profit_rate=profit_rate, ret=ret, draw_down=draw_down,
+                      draw_down_duration=draw_down_duration.total_seconds() / 60, trade_count=trade_count,
+                      plr=plr,
+                      )
+
+        with self.__lock:
+            self.__buffer.append(result)
+            full = len(self.__buffer) >= self.__batch_size
+            if self.__flush_thread is None and self.__flush_interval is not None and not self.__stopped.is_set():
+                self.__flush_thread = threading.Thread(target=self.__flush_periodically, daemon=True)
+                self.__flush_thread.start()
+
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                # 结果还在缓冲区中, 下一次写入的时候重试; 不能抛给调用者, 否则 worker 重新提交会得到重复的结果
+                pass
+
+    def flush(self):
+        """
+            把缓冲区中的结果在一个事务中写入, 返回写入的条数
+
+            写入失败(比如 database is locked)的时候这些结果放回缓冲区的开头, 然后抛出异常, 之后的 flush 会重试
+        """
+        with self.__flush_lock:
+            with self.__lock:
+                rows, self.__buffer = self.__buffer, []
+            if not rows:
+                return 0
+
+            start = time.time()
+            try:
+                with self.__engine.begin() as connection:
+                    connection.execute(ResultModel.__table__.insert(), rows)
+            except Exception as e:
+                logger.error(f'failed to save {len(rows)} results, keeping them to retry: {e}')
+                with self.__lock:
+                    self.__buffer[:0] = rows
+                self.__failed += 1
+                raise
+
+            self.__flush_time += time.time() - start
+            self.__flushes += 1
+            self.__saved += len(rows)
+            return len(rows)
+
+    def __flush_periodically(self):
+        while not self.__stopped.wait(self.__flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # 已经记录了日志, 结果留在缓冲区中, 下一次重试
+                pass
+
+    def close(self, retries=CLOSE_RETRIES):
+        """
+            停止定时写入, 并写完缓冲区中剩下的结果
+
+            :param retries: 写入失败时重试的次数, 仍然失败的时候抛出异常, 没有写入的结果见 stats['pending']
+        """
+        self.__stopped.set()
+        if self.__flush_thread is not None:
+            self.__flush_thread.join()
+            self.__flush_thread = None
+        for attempt in range(retries + 1):
+            try:
+                self.flush()
+                break
+            except Exception:
+                if attempt == retries:
+                    raise
+                time.sleep(FLUSH_INTERVAL)
+        logger.info("saved %(saved)d results in %(flushes)d transactions, %(rows_per_second).1f results/s" %
+                    self.stats)
+
+    @property
+    def stats(self):
+        """
+            saved: 已经写入的条数
+            pending: 缓冲区中还没有写入的条数
+            failed: 写入失败的事务数, 失败的结果留在缓冲区中重试, 不会被丢弃
+            flushes: 写入的事务数
+            flush_time: 花在写入上的总时间(秒)
+            rows_per_second: 从创建到现在平均每秒写入的条数
+            write_rows_per_second: 只按写入时间计算的每秒条数
+        """
+        with self.__lock:
+            pending = len(self.__buffer)
+        elapsed = time.time() - self.__started
+        return {
+            'saved': self.__saved,
+            'pending': pending,
+            'failed': self.__failed,
+            'flushes': self.__flushes,
+            'flush_time': self.__flush_time,
+            'rows_per_second': self.__saved / elapsed if elapsed > 0 else 0.0,
+            'write_rows_per_second': self.__saved / self.__flush_time if self.__flush_time > 0 else 0.0,
+        }
 
     def load(self):
+        self.flush()
         cursor = self.__DBSession.query(ResultModel).filter(ResultModel.strategy_name == self.__strategy_name)
         return cursor.all()
 
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import zlib
+
+import numpy as np
+
+from myalgo.bar.store import BarStore
+from myalgo.feed.cache import load_arrays, save_arrays
+
+"""
+    在 server 与远程 worker 之间传输 BarStore
+
+    不再把每一根bar序列化之后整体发送, 而是直接发送时间戳与柱状数据两个数组:
+        1. 按行切成若干块, 每块单独压缩, 所以不需要在内存中拼出一个完整的大包
+        2. 压缩前先做字节重排(shuffle), 相邻的浮点数高位字节相近, 放在一起之后压缩率高得多
+        3. 每块带一个 crc32 校验值, worker 可以选择是否校验
+        4. 整份数据有一个内容哈希, worker 以它为名字缓存在本地磁盘上, 重连同一份数据时不需要重新下载
+"""
+
+# 每块原始数据的大约字节数
+CHUNK_SIZE = 4 * 2 ** 20
+COMPRESS_LEVEL = 1
+
+
+def shuffle(array):
+    """
+        把 n 个 itemsize 字节的元素重排成 itemsize 组, 每组是所有元素同一位置的字节
+    """
+    array = np.ascontiguousarray(array)
+    return array.view(np.uint8).reshape(-1, array.dtype.itemsize).T.tobytes()
+
+
+def unshuffle(buffer, dtype, shape):
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(buffer, dtype=np.uint8).reshape(dtype.itemsize, -1).T
+    return np.ascontiguousarray(raw).view(dtype).reshape(shape)
+
+
+def content_hash(store: BarStore):
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(store.instruments), store.frequency.value]).encode())
+    digest.update(np.ascontiguousarray(store.timestamps).view(np.uint8))
+    digest.update(np.ascontiguousarray(store.data, dtype=np.float32).view(np.uint8))
+    if store.valid is not None:
+        digest.update(np.ascontiguousarray(store.valid).view(np.uint8))
+    return digest.hexdigest()
+
+
+class Dataset(object):
+    """The server side of the transport: a :class:`BarStore` cut into compressed chunks.
+
+    :param store: The bars to publish.
+    :type store: :class:`myalgo.bar.BarStore`.
+    :param chunkSize: The approximate number of uncompressed bytes per chunk.
+    :type chunkSize: int.
+
+    .. note::
+        Every chunk is compressed the first time :attr:`info` is read, because the info carries their checksums.
+        The compressed chunks are kept afterwards, so every worker only costs the network transfer.
+    """
+
+    def __init__(self, store: BarStore, chunkSize=CHUNK_SIZE):
+        self.__store = store
+        self.__digest = content_hash(store)
+
+        row_size = max(store.data[0:1].nbytes + store.timestamps[0:1].nbytes, 1)
+        rows = max(chunkSize // row_size, 1)
+        self.__bounds = [(start, min(start + rows, len(store))) for start in range(0, len(store), rows)]
+        self.__chunks = [None] * len(self.__bounds)
+        self.__checksums = [None] * len(self.__bounds)
+
+    @property
+    def digest(self):
+        return self.__digest
+
+    @property
+    def info(self):
+        """Everything a worker needs to rebuild the store, except the bars themselves."""
+        for index in range(len(self.__bounds)):
+            self.chunk(index)
+        store = self.__store
+        return {
+            'digest': self.__digest,
+            'instruments': list(store.instruments),
+            'frequency': store.frequency.value,
+            'length': len(store),
+            'masked': store.valid is not None,
+            'bounds': self.__bounds,
+            'checksums': self.__checksums,
+        }
+
+    def chunk(self, index):
+        ret = self.__chunks[index]
+        if ret is None:
+            start, stop = self.__bounds[index]
+            timestamps = shuffle(self.__store.timestamps[start:stop])
+            data = shuffle(np.asarray(self.__store.data[start:stop], dtype=np.float32))
+            raw = timestamps + data
+            if self.__store.valid is not None:
+                raw += np.ascontiguousarray(self.__store.valid[start:stop]).tobytes()
+            self.__checksums[index] = zlib.crc32(raw)
+            ret = zlib.compress(raw, COMPRESS_LEVEL)
+            self.__chunks[index] = ret
+        return ret
+
+
+def decode_chunk(info, index, chunk, verify=True):
+    """
+        解压第 index 块, 返回 (时间戳, 柱状数据, 有效性标记或者None)
+    """
+    start, stop = info['bounds'][index]
+    rows = stop - start
+    raw = zlib.decompress(chunk)
+    if verify and zlib.crc32(raw) != info['checksums'][index]:
+        raise Exception("Checksum mismatch in chunk %d of dataset %s" % (index, info['digest']))
+
+    columns = len(info['instruments'])
+    split = rows * np.dtype('datetime64[m]').itemsize
+    end = split + rows * columns * 9 * np.dtype(np.float32).itemsize
+    timestamps = unshuffle(raw[:split], 'datetime64[m]', (rows,))
+    data = unshuffle(raw[split:end], np.float32, (rows, columns, 9))
+    valid = None
+    if info['masked']:
+        valid = np.frombuffer(raw[end:], dtype=np.bool_).reshape(rows, columns)
+    return timestamps, data, valid
+
+
+def download(info, fetchChunk, verify=True):
+    """Rebuilds the store described by ``info``, calling ``fetchChunk(index)`` to get every compressed chunk."""
+    length = info['length']
+    timestamps = np.empty(length, dtype='datetime64[m]')
+    data = np.empty((length, len(info['instruments']), 9), dtype=np.float32)
+    valid = np.empty((length, len(info['instruments'])), dtype=np.bool_) if info['masked'] else None
+    for index, (start, stop) in enumerate(info['bounds']):
+        chunk = decode_chunk(info, index, fetchChunk(index), verify)
+        timestamps[start:stop], data[start:stop] = chunk[0], chunk[1]
+        if valid is not None:
+            valid[start:stop] = chunk[2]
+    return BarStore(info['instruments'], timestamps, data, info['frequency'], valid)
+
+
+class DiskCache(object):
+    """Keeps downloaded stores on disk, named after their content hash.
+
+    :param directory: Where to keep the files. Created if it does not exist.
+    :type directory: string.
+
+    Cached stores are memory mapped read-only when loaded, so several workers on the same host share the pages.
+    """
+
+    def __init__(self, directory):
+        self.__directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    def load(self, digest):
+        """Returns the cached :class:`BarStore`, or None if there is no complete copy of it."""
+        ret = load_arrays(self.__directory, digest, ('timestamps', 'data'))
+        if ret is None:
+            return None
+        meta, arrays = ret
+        timestamps, data = arrays['timestamps'], arrays['data']
+        if len(timestamps) != meta['length'] or data.shape != (meta['length'], len(meta['instruments']), 9):
+            return None
+
+        valid = None
+        if meta.get('masked'):
+            ret = load_arrays(self.__directory, digest, ('valid',), mmap_mode=None)
+            if ret is None:
+                return None
+            valid = ret[1]['valid']
+        return BarStore(meta['instruments'], timestamps, data, meta['frequency'], valid)
+
+    def save(self, digest, store: BarStore):
+        arrays = {'timestamps': store.timestamps, 'data': store.data}
+        if store.valid is not None:
+            arrays['valid'] = store.valid
+        meta = {'instruments': list(store.instruments), 'frequency': store.frequency.value, 'length': len(store),
+                'masked': store.valid is not None}
+        save_arrays(self.__directory, digest, arrays, meta)
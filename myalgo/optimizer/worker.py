@@ -7,6 +7,7 @@ from six.moves import xmlrpc_client
 import myalgo.logger
 from myalgo.feed import OptimizerBarFeed
 from myalgo.optimizer import serialization
+from myalgo.optimizer import transport
 
 wait_exponential_multiplier = 500
 wait_exponential_max = 10000
@@ -25,7 +26,7 @@ def retry_on_network_error(function, *args, **kwargs):
 
 
 class Worker(object):
-    def __init__(self, address, port, workerName=None, barFeed=None):
+    def __init__(self, address, port, workerName=None, barFeed=None, cacheDir=None, verify=True):
         url = "http://%s:%s/myalgoRPC" % (address, port)
 
         self.__logger = myalgo.logger.get_logger(workerName)
@@ -40,14 +41,38 @@ class Worker(object):
         else:
             self.__feed = None
 
+        self.__cache = transport.DiskCache(cacheDir) if cacheDir is not None else None
+        self.__verify = verify
+
     def getLogger(self):
         return self.__logger
 
-    def getInstrumentsAndBars(self):
-        ret = retry_on_network_error(self.__server.getInstrumentsAndBars)
+    def getDatasetInfo(self):
+        ret = retry_on_network_error(self.__server.getDatasetInfo)
         ret = serialization.loads(ret)
         return ret
 
+    def getBarsChunk(self, index):
+        ret = retry_on_network_error(self.__server.getBarsChunk, index)
+        return ret.data
+
+    def getBars(self):
+        """
+            分块下载server上的数据, 本地已经缓存了同一份数据(内容哈希相同)的时候直接读取缓存
+        """
+        info = self.getDatasetInfo()
+        if self.__cache is not None:
+            ret = self.__cache.load(info['digest'])
+            if ret is not None:
+                self.getLogger().info("Loaded bars %s from %s" % (info['digest'], self.__cache.directory))
+                return ret
+
+        self.getLogger().info("Downloading %d bars in %d chunks" % (info['length'], len(info['bounds'])))
+        ret = transport.download(info, self.getBarsChunk, self.__verify)
+        if self.__cache is not None:
+            self.__cache.save(info['digest'], ret)
+        return ret
+
     def getBarsFrequency(self):
         ret = retry_on_network_error(self.__server.getBarsFrequency)
         ret = int(ret)
@@ -69,21 +94,33 @@ class Worker(object):
         retry_on_network_error(self.__server.jobFinished, jobId)
 
     def __processJob(self, job):
-        parameters = job.getNextParameters()
-        while parameters is not None:
-            # Wrap the bars into a feed.
-            self.getLogger().info("Running strategy with parameters %s" % (str(parameters)))
-            result = None
+        parameters = job.getAllParameters()
+
+        # 支持的话一次回测整批参数, 与参数无关的计算只做一次
+        results = None
+        if len(parameters) > 1:
+            self.getLogger().info("Running strategy with %d parameters" % len(parameters))
             try:
-                result = self.runStrategy(self.__feed.clone(), *parameters)
+                results = self.runStrategies(self.__feed, parameters)
             except Exception as e:
                 self.getLogger().exception("Error running strategy with parameters %s: %s" % (str(parameters), e))
 
-            self.getLogger().info(f"result:{result} params:{parameters}")
-            self.pushJobResults(result, parameters)
-
-            # Run with the next set of parameters.
-            parameters = job.getNextParameters()
+        if results is not None:
+            for result, params in zip(results, parameters):
+                self.getLogger().info(f"result:{result} params:{params}")
+                self.pushJobResults(result, params)
+        else:
+            for params in parameters:
+                # Wrap the bars into a feed.
+                self.getLogger().info("Running strategy with parameters %s" % (str(params)))
+                result = None
+                try:
+                    result = self.runStrategy(self.__feed.clone(), *params)
+                except Exception as e:
+                    self.getLogger().exception("Error running strategy with parameters %s: %s" % (str(params), e))
+
+                self.getLogger().info(f"result:{result} params:{params}")
+                self.pushJobResults(result, params)
 
         self.jobFinished(job.getId())
 
@@ -91,14 +128,17 @@ class Worker(object):
     def runStrategy(self, feed, parameters):
         raise Exception("Not implemented")
 
+    # Run the strategy with a list of parameters and return the list of results, or None if it is not supported.
+    def runStrategies(self, feed, parameters):
+        return None
+
     def run(self):
         try:
             self.getLogger().info("Started running")
             # Get the instruments and bars.
             if not self.__feed:
-                instruments, bars = self.getInstrumentsAndBars()
-                barsFreq = self.getBarsFrequency()
-                self.__feed = OptimizerBarFeed(barsFreq, instruments, bars, self)
+                bars = self.getBars()
+                self.__feed = OptimizerBarFeed(bars.frequency, bars.instruments, bars)
 
             # Process jobs
             job = self.getNextJob()
@@ -110,20 +150,25 @@ class Worker(object):
             self.getLogger().exception("Finished running with errors: %s" % (e))
 
 
-def worker_process(strategyClass, address, port, workerName, barFeed):
+def worker_process(strategyClass, address, port, workerName, barFeed, cacheDir=None):
     class MyWorker(Worker):
         def runStrategy(self, barFeed, *args, **kwargs):
             strat = strategyClass(barFeed, *args, **kwargs)
             strat.run()
             return strat.result
 
+        def runStrategies(self, barFeed, parameters):
+            if not hasattr(strategyClass, 'run_sweep'):
+                return None
+            return strategyClass.run_sweep(barFeed, parameters)
+
     # Create a worker and run it.
-    w = MyWorker(address, port, workerName, barFeed)
+    w = MyWorker(address, port, workerName, barFeed, cacheDir)
 
     w.run()
 
 
-def run(strategyClass, address, port, workerCount=None, workerName=None, barFeed=None):
+def run(strategyClass, address, port, workerCount=None, workerName=None, barFeed=None, cacheDir=None):
     """Executes one or more worker processes that will run a strategy with the bars and parameters supplied by the server.
 
     :param strategyClass: The strategy class.
@@ -136,6 +181,9 @@ def run(strategyClass, address, port, workerCount=None, workerName=None, barFeed
     :param workerName: A name for the worker. A name that identifies the worker. If None, the hostname is used.
     :type workerName: string.
     :param barFeed: shared bar feed. Not necessary,but you can provide to reduce memory cost.
+    :param cacheDir: A directory where the downloaded bars are kept, named after their content hash. Workers that
+        connect again to a server with the same bars load them from there instead of downloading them.
+    :type cacheDir: string.
     """
 
     assert (workerCount is None or workerCount > 0)
@@ -146,7 +194,8 @@ def run(strategyClass, address, port, workerCount=None, workerName=None, barFeed
     # Build the worker processes.
     for i in range(workerCount):
         workers.append(
-            multiprocessing.Process(target=worker_process, args=(strategyClass, address, port, workerName, barFeed)))
+            multiprocessing.Process(target=worker_process,
+                                    args=(strategyClass, address, port, workerName, barFeed, cacheDir)))
 
     # Start workers
     for process in workers:
@@ -1,12 +1,13 @@
 import threading
 import time
 
-from six.moves import xmlrpc_server
+from six.moves import xmlrpc_client, xmlrpc_server
 
 import myalgo.logger
 from myalgo.optimizer import base
 from myalgo.optimizer import results
 from myalgo.optimizer import serialization
+from myalgo.optimizer import transport
 
 logger = myalgo.logger.get_logger(__name__)
 
@@ -38,6 +39,12 @@ class Job(object):
             ret = self.__strategyParameters.pop()
         return ret
 
+    def getAllParameters(self):
+        # 与逐个 getNextParameters 的顺序相同
+        ret = self.__strategyParameters[::-1]
+        self.__strategyParameters = []
+        return ret
+
 
 # Restrict to a particular path.
 class RequestHandler(xmlrpc_server.SimpleXMLRPCRequestHandler):
@@ -60,7 +67,8 @@ class Server(xmlrpc_server.SimpleXMLRPCServer):
         self.__paramSource = paramSource
         self.__resultSinc = resultSinc
         self.__barFeed = barFeed
-        self.__instrumentsAndBars = None  # Serialized instruments and bars for faster retrieval.
+        self.__dataset = None
+        self.__datasetInfo = None
         self.__barsFreq = None
         self.__activeJobs = {}
         self.__lock = threading.Lock()
@@ -74,14 +82,28 @@ class Server(xmlrpc_server.SimpleXMLRPCServer):
             self.__autoStopThread = None
 
         self.register_introspection_functions()
-        self.register_function(self.getInstrumentsAndBars, 'getInstrumentsAndBars')
         self.register_function(self.getBarsFrequency, 'getBarsFrequency')
+        self.register_function(self.getDatasetInfo, 'getDatasetInfo')
+        self.register_function(self.getBarsChunk, 'getBarsChunk')
         self.register_function(self.getNextJob, 'getNextJob')
         self.register_function(self.pushJobResults, 'pushJobResults')
         self.register_function(self.jobFinished, 'jobFinished')
-    def getInstrumentsAndBars(self):
+        self.register_function(self.getResultStats, 'getResultStats')
+
+    def __getDataset(self):
+        # 第一个 worker 来取数据的时候才压缩所有的块, 本地共享内存的 worker 从来不会调用
+        with self.__lock:
+            if self.__dataset is None:
+                self.__dataset = transport.Dataset(self.__barFeed.bars)
+                self.__datasetInfo = serialization.dumps(self.__dataset.info)
+        return self.__dataset
+
+    def getDatasetInfo(self):
+        self.__getDataset()
+        return self.__datasetInfo
 
-        return self.__instrumentsAndBars
+    def getBarsChunk(self, index):
+        return xmlrpc_client.Binary(self.__getDataset().chunk(index))
 
     def getBarsFrequency(self):
         return self.__barsFreq
@@ -129,6 +151,9 @@ class Server(xmlrpc_server.SimpleXMLRPCServer):
                                     trade_count=result["trade_count"], sharp_ratio=result["sharp"], plr=result["plr"]
                                     )
 
+    def getResultStats(self):
+        return self.__resultSaver.stats
+
     def waitServing(self, timeout=None):
         return self.__startedServingEvent.wait(timeout)
 
@@ -139,12 +164,7 @@ class Server(xmlrpc_server.SimpleXMLRPCServer):
         try:
             # Initialize instruments, bars and parameters.
             logger.info("Loading bars")
-            loadedBars = []
-            for dateTime, bars in self.__barFeed:
-                loadedBars.append(bars)
-            instruments = self.__barFeed.registered_instruments
-            self.__instrumentsAndBars = serialization.dumps((instruments, loadedBars))
-            self.__barsFreq = self.__barFeed.frequency.value
+            self.__barsFreq = self.__barFeed.bars.frequency.value
 
             if self.__autoStopThread:
                 self.__autoStopThread.start()
@@ -160,3 +180,5 @@ class Server(xmlrpc_server.SimpleXMLRPCServer):
             logger.error(f'run exception,{e}')
         finally:
             self.__forcedStop = True
+            # 写完还在缓冲区中的结果
+            self.__resultSaver.close()
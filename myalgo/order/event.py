@@ -2,6 +2,8 @@ from myalgo.order.order import Order, State
 
 
 class OrderEvent:
+    __slots__ = ('__order', '__type', '__info')
+
     def __init__(self, order: Order, _type: State, _info: str or None):
         self.__order = order
         self.__type = _type
@@ -2,6 +2,8 @@ from datetime import datetime
 
 
 class Execution:
+    __slots__ = ('price', 'quantity', 'commission', 'datetime')
+
     def __init__(self, price: float, quantity: float, commission: float, datetime: datetime):
         self.price = price
         self.quantity = quantity
@@ -1,8 +1,13 @@
+import numpy as np
+
 from myalgo.bar import Bar
 from myalgo.order import Action
+from myalgo.utils.jit import njit
 
 
 class FillInfo(object):
+    __slots__ = ('__price', '__quantity')
+
     def __init__(self, price: float, quantity: float):
         self.__price = price
         self.__quantity = quantity
@@ -64,3 +69,193 @@ def get_stop_price_trigger(action: Action, price: float, bar1: Bar, bar2: Bar):
         assert False
 
     return ret
+
+
+"""
+    批量撮合: 同一个标的上的全部活跃订单在一次编译后的调用中得到成交价, 规则与上面的函数以及各个 Order.process 完全相同
+
+    bar 中的价格是 float32 的标量, 与订单价格比较的时候按 numpy 2 的类型提升规则(NEP 50)进行:
+        python 的 float/int 会先转成 float32 再比较, np.float64 的价格则按 float64 比较。
+    numpy 1 中两个标量的比较总是按 float64 进行, 逐个处理的结果会不同, 所以 setup.py 要求 numpy>=2
+    为了得到完全相同的结果, 每个价格都带着它的种类(WEAK/FLOAT32/FLOAT64), 编译后的代码按同样的规则比较;
+    返回的也不是成交价的值, 而是它的来源(订单的价格或者 bar2 中的某一列), 所以 FillInfo 中的价格对象与逐个处理时相同
+"""
+
+# Type 的值, 这里不能引用 myalgo.order.type 之外的模块(order.py 引用了这个模块)
+MARKET, LIMIT, STOP, STOP_LIMIT = 1, 2, 3, 4
+
+# bar.data 中各个价格的位置
+ASK_OPEN, ASK_CLOSE, ASK_HIGH, ASK_LOW = 0, 1, 2, 3
+BID_OPEN, BID_CLOSE, BID_HIGH, BID_LOW = 4, 5, 6, 7
+
+# 成交价的来源, 不小于0的时候是 bar2 中的列
+NO_FILL = -1
+LIMIT_PRICE = -2
+STOP_PRICE = -3
+
+# 价格的种类
+WEAK = 0
+FLOAT32 = 1
+FLOAT64 = 2
+
+
+def price_kind(value):
+    """
+        :return: 价格的种类, 不支持的类型返回 None
+    """
+    # np.float64 是 float 的子类, 要先判断
+    if isinstance(value, np.generic):
+        if isinstance(value, np.float32):
+            return FLOAT32
+        if isinstance(value, (np.float64, np.integer)):
+            return FLOAT64
+        return None
+    if isinstance(value, (float, int)):
+        return WEAK
+    return None
+
+
+@njit
+def less(a, a_kind, b, b_kind):
+    # a < b, 一边是 float32 而另一边不是 float64 的时候按 float32 比较
+    if (a_kind == FLOAT32 and b_kind != FLOAT64) or (b_kind == FLOAT32 and a_kind != FLOAT64):
+        return np.float32(a) < np.float32(b)
+    return a < b
+
+
+@njit
+def less_equal(a, a_kind, b, b_kind):
+    # a <= b, 有 nan 的时候与 less 一样是 False, 所以不能写成 not less(b, a)
+    if (a_kind == FLOAT32 and b_kind != FLOAT64) or (b_kind == FLOAT32 and a_kind != FLOAT64):
+        return np.float32(a) <= np.float32(b)
+    return a <= b
+
+
+@njit
+def limit_trigger(is_buy, price, kind, bar1, bar2, bar_kind):
+    # 与 get_limit_price_trigger 相同
+    if is_buy:
+        if less(price, kind, bar1[ASK_CLOSE], bar_kind) and less_equal(bar2[ASK_LOW], bar_kind, price, kind):
+            return LIMIT_PRICE
+    else:
+        if less(bar1[BID_CLOSE], bar_kind, price, kind) and less_equal(price, kind, bar2[BID_HIGH], bar_kind):
+            return LIMIT_PRICE
+    return NO_FILL
+
+
+@njit
+def stop_trigger(is_buy, price, kind, bar1, bar2, bar_kind):
+    # 与 get_stop_price_trigger 相同, min/max 在两者相等的时候返回第一个参数(开盘价)
+    if is_buy:
+        if less(bar1[ASK_CLOSE], bar_kind, price, kind):
+            if less(price, kind, bar2[ASK_LOW], bar_kind):
+                return ASK_OPEN
+            elif less_equal(price, kind, bar2[ASK_HIGH], bar_kind):
+                return STOP_PRICE if less(price, kind, bar2[ASK_OPEN], bar_kind) else ASK_OPEN
+    else:
+        if less(price, kind, bar1[BID_CLOSE], bar_kind):
+            if less(bar2[BID_HIGH], bar_kind, price, kind):
+                return BID_OPEN
+            elif less_equal(bar2[BID_LOW], bar_kind, price, kind):
+                return STOP_PRICE if less(bar2[BID_OPEN], bar_kind, price, kind) else BID_OPEN
+    return NO_FILL
+
+
+@njit
+def fill_sources(is_buy, order_type, on_close, stop_price, stop_kind, limit_price, limit_kind, stop_hit, bar1, bar2,
+                 bar_kind):
+    """
+        一个标的上全部订单的成交价的来源, 以及处理之后的 stop_hit
+
+        :param bar1: 上一根bar的数据(float64)
+        :param bar2: 当前bar的数据(float64)
+        :param bar_kind: bar 中价格的种类
+    """
+    n = is_buy.shape[0]
+    sources = np.full(n, NO_FILL, dtype=np.int64)
+    hits = stop_hit.copy()
+    for i in range(n):
+        buy = is_buy[i]
+        if order_type[i] == MARKET:
+            if on_close[i]:
+                sources[i] = ASK_CLOSE if buy else BID_CLOSE
+            else:
+                sources[i] = ASK_OPEN if buy else BID_OPEN
+
+        elif order_type[i] == LIMIT:
+            sources[i] = limit_trigger(buy, limit_price[i], limit_kind[i], bar1, bar2, bar_kind)
+
+        elif order_type[i] == STOP:
+            trigger = NO_FILL
+            if not stop_hit[i]:
+                trigger = stop_trigger(buy, stop_price[i], stop_kind[i], bar1, bar2, bar_kind)
+            if trigger != NO_FILL:
+                hits[i] = True
+            if hits[i]:
+                if trigger != NO_FILL:
+                    sources[i] = trigger
+                else:
+                    sources[i] = ASK_OPEN if buy else BID_OPEN
+
+        else:
+            trigger = NO_FILL
+            if not stop_hit[i]:
+                trigger = stop_trigger(buy, stop_price[i], stop_kind[i], bar1, bar2, bar_kind)
+            # 与 StopLimitOrder.process 相同, 已经触发过的订单这里会变回没有触发
+            hits[i] = trigger != NO_FILL
+            if hits[i] and limit_trigger(buy, limit_price[i], limit_kind[i], bar1, bar2, bar_kind) != NO_FILL:
+                source = LIMIT_PRICE
+                if trigger != NO_FILL:
+                    # min(触发价, 限价) / max(触发价, 限价), 相等的时候是触发价
+                    if trigger == STOP_PRICE:
+                        value, kind = stop_price[i], stop_kind[i]
+                    else:
+                        value, kind = bar2[trigger], bar_kind
+                    if buy:
+                        source = LIMIT_PRICE if less(limit_price[i], limit_kind[i], value, kind) else trigger
+                    else:
+                        source = LIMIT_PRICE if less(value, kind, limit_price[i], limit_kind[i]) else trigger
+                sources[i] = source
+    return sources, hits
+
+
+def fill_row(order_):
+    """
+        订单在 :func:`fill_sources` 中的参数, 不支持的订单(比如价格的类型)返回 None
+    """
+    type_ = order_.type.value
+    stop_price = limit_price = 0.0
+    stop_kind = limit_kind = WEAK
+    on_close = stop_hit = False
+    if type_ == MARKET:
+        on_close = order_.fill_on_close
+    elif type_ == LIMIT:
+        limit_price = order_.price
+        limit_kind = price_kind(limit_price)
+    elif type_ == STOP:
+        stop_price = order_.price
+        stop_kind = price_kind(stop_price)
+        stop_hit = order_.stop_hit
+    else:
+        stop_price, limit_price = order_.stop_price, order_.limit_price
+        stop_kind, limit_kind = price_kind(stop_price), price_kind(limit_price)
+        stop_hit = order_.stop_hit
+    if stop_kind is None or limit_kind is None:
+        return None
+    return order_.is_buy, type_, on_close, float(stop_price), stop_kind, float(limit_price), limit_kind, stop_hit
+
+
+def fill_info(order_, source, data):
+    """
+        由 :func:`fill_sources` 得到的来源构造 FillInfo, 价格对象与 Order.process 返回的相同
+
+        :param data: bar2 的数据
+    """
+    if source == NO_FILL:
+        return None
+    if source >= 0:
+        return FillInfo(data[source], order_.quantity)
+    type_ = order_.type.value
+    if source == LIMIT_PRICE:
+        return FillInfo(order_.price if type_ == LIMIT else order_.limit_price, order_.quantity)
+    return FillInfo(order_.price if type_ == STOP else order_.stop_price, order_.quantity)
@@ -9,12 +9,26 @@ from myalgo.order.state import State
 from myalgo.order.type import Type
 
 
+# 集合的成员检查比 list 快; Action 与 State 是普通的 Enum, 成员按身份比较, 不会与整数或者其他枚举的成员相等
+BUY_ACTIONS = frozenset((Action.BUY, Action.BUY_TO_COVER))
+SELL_ACTIONS = frozenset((Action.SELL, Action.SELL_SHORT))
+INACTIVE_STATES = frozenset((State.CANCELED, State.FILLED))
+
+
 class Order:
+    """
+        订单在一次参数扫描中会创建上百万个, 所以全部用 __slots__ 保存, 不再每个实例带一个 __dict__
+        子类新增的属性也要写在自己的 __slots__ 中
+    """
+
+    __slots__ = ('__type', '__action', '__quantity', '__roundQuantity', '__executionInfo', '__instrument',
+                 '__good_till_canceled', '__allOrNone', '__id', '__submitted_at', '__canceled_at', '__accepted_at',
+                 'total_cost', 'total_commission', 'avg_fill_price', 'filled', 'remain', 'state', 'filled_at')
+
     def __init__(self, type_: Type, action: Action, instrument, quantity: int, round_quantity=int):
         assert quantity is not None and quantity > 0
         assert type_ in Type
 
-        self.__state = State.INITIAL
         self.__type = type_
         self.__action = action
         self.__quantity = quantity
@@ -34,9 +48,10 @@ class Order:
         self.filled = 0
         self.remain = quantity
         self.state = State.INITIAL
+        self.filled_at = None
 
     def __repr__(self):
-        return f'{self.instrument} {self.type} {self.action} {self.state} QUANT:{self.quantity}'
+        return f'{self.instrument} {self.type.name} {self.action.name} {self.state.name} QUANT:{self.quantity}'
 
     @abc.abstractmethod
     def process(self, broker, bar1: Bar, bar2: Bar):
@@ -52,7 +67,7 @@ class Order:
 
     @good_till_canceled.setter
     def good_till_canceled(self, value):
-        assert self.__state == State.INITIAL
+        assert self.state == State.INITIAL
         self.__good_till_canceled = value
 
     @property
@@ -61,7 +76,7 @@ class Order:
 
     @all_or_one.setter
     def all_or_one(self, value):
-        assert self.__state == State.INITIAL
+        assert self.state == State.INITIAL
         self.__allOrNone = value
 
     @property
@@ -70,15 +85,15 @@ class Order:
 
     @property
     def is_buy(self):
-        return self.action in [Action.BUY, Action.BUY_TO_COVER]
+        return self.__action in BUY_ACTIONS
 
     @property
     def is_sell(self):
-        return self.action in [Action.SELL, Action.SELL_SHORT]
+        return self.__action in SELL_ACTIONS
 
     @property
     def is_active(self):
-        return self.state not in [State.CANCELED, State.FILLED]
+        return self.state not in INACTIVE_STATES
 
     @property
     def action(self):
@@ -96,7 +111,6 @@ class Order:
         assert self.remain >= execution.quantity, f'execution quantity:{execution.quantity} > {self.remain}'
         assert (execution.quantity > 0)
         self.__execute(execution)
-        self.__executionInfo.append(execution)
 
     @property
     def executions(self):
@@ -141,7 +155,7 @@ class Order:
 
     @property
     def is_canceled(self):
-        return self.state == State.CANCELLED
+        return self.state == State.CANCELED
 
     @property
     def is_submitted(self):
@@ -190,6 +204,8 @@ class MarketOrder(Order):
         Base Class for market orders
     """
 
+    __slots__ = ('__onClose',)
+
     def __init__(self, action, instrument, quantity, on_close, round_quantity):
         super(MarketOrder, self).__init__(Type.MARKET,
                                           action, instrument, quantity, round_quantity)
@@ -209,6 +225,8 @@ class MarketOrder(Order):
 
 
 class LimitOrder(Order):
+    __slots__ = ('__limitPrice',)
+
     def __init__(self, action: Action, instrument: str, limit_price: float, quantity: float, round_quantity=int):
         super(LimitOrder, self).__init__(Type.LIMIT,
                                          action, instrument, quantity, round_quantity)
@@ -236,6 +254,8 @@ class StopOrder(Order):
         This is a base class and should not be used directly.
     """
 
+    __slots__ = ('__stopPrice', '__stopHit')
+
     def __init__(self, action, instrument, price, quantity, round_quantity):
         super(StopOrder, self).__init__(Type.STOP, action,
                                         instrument, quantity, round_quantity)
@@ -247,6 +267,11 @@ class StopOrder(Order):
     def stop_hit(self):
         return self.__stopHit
 
+    @stop_hit.setter
+    def stop_hit(self, value):
+        # 批量撮合(OrderBook.evaluate)之后由 broker 设置
+        self.__stopHit = value
+
     @property
     def price(self):
         """Returns the stop price."""
@@ -280,6 +305,8 @@ class StopLimitOrder(Order):
         This is a base class and should not be used directly.
     """
 
+    __slots__ = ('__stopPrice', '__limitPrice', '__stopHit')
+
     def __init__(self, action, instrument, stop_price, limit_price, quantity, round_quantity):
         super(StopLimitOrder, self).__init__(Type.STOP_LIMIT,
                                              action, instrument, quantity, round_quantity)
@@ -292,6 +319,11 @@ class StopLimitOrder(Order):
     def stop_hit(self):
         return self.__stopHit
 
+    @stop_hit.setter
+    def stop_hit(self, value):
+        # 批量撮合(OrderBook.evaluate)之后由 broker 设置
+        self.__stopHit = value
+
     @property
     def stop_price(self):
         """Returns the stop price."""
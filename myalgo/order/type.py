@@ -1,8 +1,10 @@
-from enum import Enum, unique
+from enum import IntEnum, unique
+
+# 成员就是固定的整数编码, 批量撮合与向量化回测的数组中直接使用, 不要修改已有的值
 
 
 @unique
-class Type(Enum):
+class Type(IntEnum):
     MARKET = 1
     LIMIT = 2
     STOP = 3
@@ -30,3 +30,7 @@ class StrategyAnalyzer(object):
 
     def beforeOnBars(self, bars: Bars):
         pass
+
+    # 策略结束的时候调用一次, 在策略自己的 onFinish 之前
+    def onFinish(self, bars: Bars):
+        pass
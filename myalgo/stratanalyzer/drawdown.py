@@ -1,16 +1,28 @@
 import datetime
 
-from numba import jit, float32
-
 from myalgo import stratanalyzer
 from myalgo.bar import Bars
+from myalgo.stratanalyzer import kernels
+from myalgo.stratanalyzer.equity import EquityRecorder
 
 
-@jit(float32(float32, float32, float32))
+# 每根bar调用一次的标量计算, python 的 float 就是 float64, 比调用编译的函数还要快
 def delta_ratio(a, b, c):
     return (a - b) / c
 
 
+def max_drawdown(equity, datetimes):
+    """
+        一次性计算整条权益曲线的最大回撤与最长回撤时间, 与逐根更新 :class:`DrawDown` 得到的结果相同
+
+    :param equity: 每根bar上的权益
+    :param datetimes: 对应的时间, datetime64 数组
+    :return: (最大回撤, 最长回撤时间 :class:`datetime.timedelta`)
+    """
+    max_dd, duration = kernels.drawdown(equity, datetimes)
+    return abs(max_dd), datetime.timedelta(minutes=int(duration))
+
+
 class DrawDownHelper(object):
     def __init__(self):
         self.__highWatermark = None
@@ -44,25 +56,52 @@ class DrawDownHelper(object):
 
 class DrawDown(stratanalyzer.StrategyAnalyzer):
     """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that calculates
-    max. drawdown and longest drawdown duration for the portfolio."""
+    max. drawdown and longest drawdown duration for the portfolio.
 
-    def __init__(self):
+    :param vectorized: Only record the portfolio value every bar (see :class:`myalgo.stratanalyzer.equity.EquityRecorder`)
+        and calculate the drawdown with :func:`max_drawdown` when it is requested, or when the strategy finishes.
+    :type vectorized: boolean.
+    """
+
+    def __init__(self, vectorized=False):
         super(DrawDown, self).__init__()
+        self.__vectorized = vectorized
+        self.__recorder = None
+        self.__calculated = 0
         self.__maxDD = 0
         self.__longestDDDuration = datetime.timedelta()
         self.__currDrawDown = DrawDownHelper()
 
+    def beforeAttach(self):
+        if self.__vectorized:
+            self.__recorder = EquityRecorder.getOrCreateShared(self.strat)
+
     def calculateEquity(self):
         return self.strat.broker.equity
 
     def beforeOnBars(self, bars: Bars):
+        if self.__vectorized:
+            return
         equity = self.calculateEquity()
         self.__currDrawDown.update(bars.datetime, equity, equity)
         self.__longestDDDuration = max(self.__longestDDDuration, self.__currDrawDown.getDuration())
         self.__maxDD = min(self.__maxDD, self.__currDrawDown.getMaxDrawDown())
 
+    def onFinish(self, bars: Bars):
+        if self.__vectorized:
+            self.__calculate()
+
+    def __calculate(self):
+        equity = self.__recorder.equity
+        if self.__calculated == equity.shape[0]:
+            return
+        self.__maxDD, self.__longestDDDuration = max_drawdown(equity, self.__recorder.timestamps)
+        self.__calculated = equity.shape[0]
+
     def getMaxDrawDown(self):
         """Returns the max. (deepest) drawdown."""
+        if self.__vectorized:
+            self.__calculate()
         return abs(self.__maxDD)
 
     def getLongestDrawDownDuration(self):
@@ -73,4 +112,6 @@ class DrawDown(stratanalyzer.StrategyAnalyzer):
         .. note::
             Note that this is the duration of the longest drawdown, not necessarily the deepest one.
         """
+        if self.__vectorized:
+            self.__calculate()
         return self.__longestDDDuration
@@ -0,0 +1,76 @@
+import numpy as np
+
+from myalgo import stratanalyzer
+from myalgo.stratanalyzer import kernels
+
+"""
+    每根bar只把权益记到一个预先分配的 float64 数组中, 时间记在对应的 datetime64 数组中
+
+    :class:`myalgo.stratanalyzer.returns.Returns`, :class:`myalgo.stratanalyzer.sharpe.SharpeRatio` 与
+    :class:`myalgo.stratanalyzer.drawdown.DrawDown` 在 vectorized=True 的时候共用这一条权益曲线,
+    回测过程中什么都不算, 结束(onFinish)的时候用 numpy 一次算出全部统计
+"""
+
+# 流式的 feed 不知道总共有多少根bar, 从这个容量开始按两倍增长
+CAPACITY = 4096
+
+
+class EquityRecorder(stratanalyzer.StrategyAnalyzer):
+    """A :class:`myalgo.stratanalyzer.StrategyAnalyzer` that records the portfolio value of every bar.
+
+    The arrays are allocated once with one slot per bar of the feed, so recording is two scalar stores per bar.
+    """
+
+    def __init__(self):
+        super(EquityRecorder, self).__init__()
+        self.__initial = 0.0
+        self.__equity = np.zeros(0)
+        self.__timestamps = np.zeros(0, dtype='datetime64[m]')
+        self.__size = 0
+
+    @classmethod
+    def getOrCreateShared(cls, strat):
+        name = cls.__name__
+        ret = strat.getNamedAnalyzer(name)
+        if ret is None:
+            ret = EquityRecorder()
+            strat.attachAnalyzerEx(ret, name)
+        return ret
+
+    def attached(self):
+        feed = self.strat.bar_feed
+        capacity = len(feed.bars) if feed.in_memory else CAPACITY
+        self.__initial = float(self.strat.broker.equity)
+        self.__equity = np.empty(max(capacity, 1), dtype=np.float64)
+        self.__timestamps = np.empty(max(capacity, 1), dtype='datetime64[m]')
+        self.__size = 0
+
+    def beforeOnBars(self, bars):
+        size = self.__size
+        if size == self.__equity.shape[0]:
+            self.__equity = np.resize(self.__equity, 2 * size)
+            self.__timestamps = np.resize(self.__timestamps, 2 * size)
+        self.__equity[size] = self.strat.broker.equity
+        self.__timestamps[size] = bars.store.timestamps[bars.index]
+        self.__size = size + 1
+
+    @property
+    def initial(self):
+        """The portfolio value before the first bar."""
+        return self.__initial
+
+    @property
+    def equity(self):
+        """The portfolio value of every bar processed so far, a float64 view."""
+        return self.__equity[:self.__size]
+
+    @property
+    def timestamps(self):
+        """The ``datetime64[m]`` of every bar processed so far, aligned with :attr:`equity`."""
+        return self.__timestamps[:self.__size]
+
+    def returns(self):
+        """
+            :return: (每根bar的收益率, 累计收益率), 见 :func:`myalgo.stratanalyzer.kernels.returns`
+        """
+        return kernels.returns(self.equity, self.__initial)
@@ -58,9 +58,12 @@ class Indicators(stratanalyzer.StrategyAnalyzer):
     def beforeAttach(self):
         self.strat.exit_ok_event.subscribe(self.__on_exit_ok)
         self.strat.enter_start_event.subscribe(self.__on_enter_start)
-        self.__priceDS = self.strat.feed[self.__instrument].price
-        for key, generator in self.__indicatorGenerators.items():
-            self.__indicators[key] = generator(self.__priceDS)
+        self.__priceDS = self.strat.bar_series[self.__instrument].bid_close
+        # 通过策略的注册表创建, 与策略自己的指标以及彼此之间共用相同的部分
+        with self.strat.indicators as registry:
+            for key, generator in self.__indicatorGenerators.items():
+                self.__indicators[key] = generator(self.__priceDS)
+        registry.report()
 
     """
         我们按照最小精度1%来叠加，作积分曲线
@@ -0,0 +1,93 @@
+import numpy as np
+
+from myalgo.utils.jit import COMPILED, njit
+
+"""
+    分析器的数值内核: 整条权益曲线上的收益率与回撤, 全部是 float64
+
+    numba 可用的时候使用编译的内核, 第一次调用时才编译, 并且编译结果缓存在磁盘上(cache=True),
+    优化器的 worker 启动之后不需要每次都重新编译; 没有 numba 的时候自动使用纯 numpy 的实现, 结果在浮点误差之内相同
+"""
+
+
+def numpy_returns(equity, initial):
+    previous = np.empty_like(equity)
+    previous[:1] = initial
+    previous[1:] = equity[:-1]
+    net = np.zeros(equity.shape[0])
+    np.divide(equity - previous, previous, out=net, where=previous != 0)
+    return net, np.cumprod(1 + net) - 1
+
+
+def numpy_drawdown(equity, minutes):
+    if equity.shape[0] == 0:
+        return 0.0, 0
+    high = np.maximum.accumulate(equity)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        max_dd = min(0.0, ((equity - high) / high).min())
+    # 最近一次创出新高(包括持平)的位置
+    high_index = np.maximum.accumulate(np.where(equity >= high, np.arange(equity.shape[0]), 0))
+    return max_dd, int((minutes - minutes[high_index]).max())
+
+
+if COMPILED:
+    @njit(cache=True, error_model='numpy')
+    def compiled_returns(equity, initial):
+        n = equity.shape[0]
+        net = np.zeros(n)
+        cum = np.empty(n)
+        last = initial
+        cum_ret = 0.0
+        for i in range(n):
+            if last != 0:
+                net[i] = (equity[i] - last) / last
+            cum_ret = (1 + cum_ret) * (1 + net[i]) - 1
+            cum[i] = cum_ret
+            last = equity[i]
+        return net, cum
+
+    @njit(cache=True, error_model='numpy')
+    def compiled_drawdown(equity, minutes):
+        max_dd = 0.0
+        longest = 0
+        high = 0.0
+        high_at = 0
+        for i in range(equity.shape[0]):
+            if i == 0 or equity[i] >= high:
+                high = equity[i]
+                high_at = minutes[i]
+            dd = (equity[i] - high) / high
+            if dd < max_dd:
+                max_dd = dd
+            if minutes[i] - high_at > longest:
+                longest = minutes[i] - high_at
+        return max_dd, longest
+
+
+def returns(equity, initial):
+    """
+        与 :class:`myalgo.stratanalyzer.returns.TimeWeightedReturns` 逐根更新(没有出入金)的结果相同
+
+    :param equity: 每根bar上的权益
+    :param initial: 第一根bar之前的权益
+    :return: (每根bar的收益率, 累计收益率)
+    """
+    equity = np.ascontiguousarray(equity, dtype=np.float64)
+    if COMPILED:
+        return compiled_returns(equity, float(initial))
+    return numpy_returns(equity, float(initial))
+
+
+def drawdown(equity, datetimes):
+    """
+        与逐根更新 :class:`myalgo.stratanalyzer.drawdown.DrawDownHelper` 的结果相同
+
+    :param equity: 每根bar上的权益
+    :param datetimes: 对应的时间, datetime64 数组
+    :return: (最大回撤, 负数或者0; 最长回撤的分钟数)
+    """
+    equity = np.ascontiguousarray(equity, dtype=np.float64)
+    minutes = np.ascontiguousarray(np.asarray(datetimes, dtype='datetime64[m]').view(np.int64))
+    if COMPILED:
+        return compiled_drawdown(equity, minutes)
+    return numpy_drawdown(equity, minutes)
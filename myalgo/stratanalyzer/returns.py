@@ -1,22 +1,17 @@
 import math
 
-from numba import jitclass, float32
+import numpy as np
 
-from myalgo import dataseries
 from myalgo import stratanalyzer
 from myalgo.event import Event
-
-spec = [
-    ('__lastValue', float32),  # a simple scalar field
-    ('__flows', float32),  # an array field
-    ('__lastPeriodRet', float32),  # an array field
-    ('__cumRet', float32),  # an array field
-]
+from myalgo.stratanalyzer.equity import EquityRecorder
+from myalgo.utils.collections import ListDeque
 
 
 # Helper class to calculate time-weighted returns in a portfolio.
 # Check http://www.wikinvest.com/wiki/Time-weighted_return
-@jitclass(spec)
+# 每根bar更新一次的标量计算, 普通的 python 类(float64)比 jitclass 的方法调用更快;
+# 整条权益曲线上的计算见 myalgo.stratanalyzer.kernels.returns
 class TimeWeightedReturns(object):
     def __init__(self, initialValue):
         self.__lastValue = initialValue
@@ -203,28 +198,62 @@ class Returns(stratanalyzer.StrategyAnalyzer):
     whole portfolio.
     :param maxLen: The maximum number of values to hold in net and cumulative returs dataseries.
         Once a bounded length is full, when new items are added, a corresponding number of items are discarded from the
-        opposite end. If None then dataseries.DEFAULT_MAX_LEN is used.
+        opposite end. If None then all the values are kept.
     :type maxLen: int.
+    :param vectorized: Only record the portfolio value every bar (see :class:`myalgo.stratanalyzer.equity.EquityRecorder`)
+        and calculate the returns with numpy when they are requested, or when the strategy finishes.
+    :type vectorized: boolean.
     """
 
-    def __init__(self, maxLen=None):
+    def __init__(self, maxLen=None, vectorized=False):
         super(Returns, self).__init__()
-        self.__netReturns = dataseries.SequenceDataSeries(maxLen=maxLen)
-        self.__cumReturns = dataseries.SequenceDataSeries(maxLen=maxLen)
+        self.__maxLen = maxLen
+        self.__vectorized = vectorized
+        self.__recorder = None
+        # vectorized 的时候是上次计算时记录的bar数
+        self.__calculated = 0
+        self.__netReturns = self.__new_series()
+        self.__cumReturns = self.__new_series()
+
+    def __new_series(self):
+        if self.__vectorized:
+            return np.zeros(0)
+        return ListDeque(self.__maxLen) if self.__maxLen is not None else []
 
     def beforeAttach(self):
+        if self.__vectorized:
+            self.__recorder = EquityRecorder.getOrCreateShared(self.strat)
+            return
         # Get or create a shared ReturnsAnalyzerBase
         analyzer = ReturnsAnalyzerBase.getOrCreateShared(self.strat)
         analyzer.getEvent().subscribe(self.__onReturns)
 
     def __onReturns(self, dateTime, returnsAnalyzerBase):
-        self.__netReturns.appendWithDateTime(dateTime, returnsAnalyzerBase.getNetReturn())
-        self.__cumReturns.appendWithDateTime(dateTime, returnsAnalyzerBase.getCumulativeReturn())
+        self.__netReturns.append(returnsAnalyzerBase.getNetReturn())
+        self.__cumReturns.append(returnsAnalyzerBase.getCumulativeReturn())
+
+    def onFinish(self, bars):
+        if self.__vectorized:
+            self.__calculate()
+
+    def __calculate(self):
+        equity = self.__recorder.equity
+        if self.__calculated == equity.shape[0]:
+            return
+        net, cum = self.__recorder.returns()
+        if self.__maxLen is not None:
+            net, cum = net[-self.__maxLen:], cum[-self.__maxLen:]
+        self.__netReturns, self.__cumReturns = net, cum
+        self.__calculated = equity.shape[0]
 
     def getReturns(self):
-        """Returns a :class:`pyalgotrade.dataseries.DataSeries` with the returns for each bar."""
+        """Returns the returns for each bar, a :class:`numpy.ndarray` if vectorized else a list."""
+        if self.__vectorized:
+            self.__calculate()
         return self.__netReturns
 
     def getCumulativeReturns(self):
-        """Returns a :class:`pyalgotrade.dataseries.DataSeries` with the cumulative returns for each bar."""
+        """Returns the cumulative returns for each bar, a :class:`numpy.ndarray` if vectorized else a list."""
+        if self.__vectorized:
+            self.__calculate()
         return self.__cumReturns
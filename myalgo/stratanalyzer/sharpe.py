@@ -1,11 +1,11 @@
 import math
 
+import numpy as np
 from myalgo import stratanalyzer
 from myalgo.stratanalyzer import returns
+from myalgo.stratanalyzer.equity import EquityRecorder
 from myalgo.utils import stats
 
-from numba import njit
-
 
 def days_traded(begin, end):
     delta = end - begin
@@ -62,17 +62,42 @@ def sharpe_ratio_2(returns, riskFreeRate, firstDateTime, lastDateTime, annualize
     return ret
 
 
+def daily_returns(equity, datetimes, initial):
+    """
+        由每根bar上的权益计算每日收益, 与 :class:`SharpeRatio` 在 useDailyReturns 时逐根复利得到的结果相同
+
+    :param equity: 每根bar上的权益
+    :param datetimes: 对应的时间, datetime64 数组
+    :param initial: 第一根bar之前的权益
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    if equity.shape[0] == 0:
+        return []
+
+    days = np.asarray(datetimes, dtype='datetime64[D]')
+    # 每天最后一根bar的权益
+    closes = equity[np.append(days[1:] != days[:-1], True)]
+    previous = np.insert(closes[:-1], 0, initial)
+    return list(closes / previous - 1)
+
+
 class SharpeRatio(stratanalyzer.StrategyAnalyzer):
     """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that calculates
     Sharpe ratio for the whole portfolio.
 
     :param useDailyReturns: True if daily returns should be used instead of the returns for each bar.
     :type useDailyReturns: boolean.
+    :param vectorized: Only record the portfolio value every bar (see :class:`myalgo.stratanalyzer.equity.EquityRecorder`)
+        and calculate the returns with numpy when they are requested, or when the strategy finishes.
+    :type vectorized: boolean.
     """
 
-    def __init__(self, useDailyReturns=True):
+    def __init__(self, useDailyReturns=True, vectorized=False):
         super(SharpeRatio, self).__init__()
         self.__useDailyReturns = useDailyReturns
+        self.__vectorized = vectorized
+        self.__recorder = None
+        self.__calculated = 0
         self.__returns = []
 
         # Only use when self.__useDailyReturns == False
@@ -82,13 +107,35 @@ class SharpeRatio(stratanalyzer.StrategyAnalyzer):
         self.__currentDate = None
 
     def getReturns(self):
+        if self.__vectorized:
+            self.__calculate()
         return self.__returns
 
     def beforeAttach(self):
+        if self.__vectorized:
+            self.__recorder = EquityRecorder.getOrCreateShared(self.strat)
+            return
         # Get or create a shared ReturnsAnalyzerBase
         analyzer = returns.ReturnsAnalyzerBase.getOrCreateShared(self.strat)
         analyzer.getEvent().subscribe(self.__onReturns)
 
+    def onFinish(self, bars):
+        if self.__vectorized:
+            self.__calculate()
+
+    def __calculate(self):
+        equity, timestamps = self.__recorder.equity, self.__recorder.timestamps
+        if self.__calculated == equity.shape[0]:
+            return
+        if self.__useDailyReturns:
+            self.__returns = daily_returns(equity, timestamps, self.__recorder.initial)
+        else:
+            self.__returns = list(self.__recorder.returns()[0])
+            if equity.shape[0] > 0:
+                self.__firstDateTime = timestamps[0].item()
+                self.__lastDateTime = timestamps[-1].item()
+        self.__calculated = equity.shape[0]
+
     def __onReturns(self, dateTime, returnsAnalyzerBase):
         netReturn = returnsAnalyzerBase.getNetReturn()
         if self.__useDailyReturns:
@@ -117,6 +164,8 @@ class SharpeRatio(stratanalyzer.StrategyAnalyzer):
         if not isinstance(annualized, bool):
             raise Exception("tradingPeriods parameter is not supported anymore.")
 
+        if self.__vectorized:
+            self.__calculate()
         if self.__useDailyReturns:
             ret = sharpe_ratio(self.__returns, riskFreeRate, 252, annualized)
         else:
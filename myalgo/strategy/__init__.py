@@ -1,2 +1,3 @@
 from .base import BaseStrategy
 from .btstrategy import BackTestStrategy
+from .vectorized import VectorizedStrategy, Signals
@@ -2,9 +2,10 @@ import abc
 
 from myalgo import logger
 from myalgo.broker import BaseBroker
-from myalgo.dataseries import BarDataSeries
+from myalgo.dataseries import BarDataSeries, ResampledBarDataSeries
 from myalgo.event import Dispatcher
 from myalgo.event import Event
+from myalgo.indicator.registry import IndicatorRegistry
 from myalgo.order import Action, LimitOrder, Order
 from myalgo.strategy import position
 
@@ -12,7 +13,8 @@ from myalgo.strategy import position
 class BaseStrategy:
     LOGGER_NAME = "BaseStrategyLog"
 
-    def __init__(self, broker: BaseBroker, series_max_len=None):
+    def __init__(self, broker: BaseBroker, series_max_len=None, series_ring_buffer=False, series_zero_copy=False,
+                 indicator_cache=None):
         self.__broker = broker
         self.__activePositions = set()
         self.__orderToPosition = {}
@@ -20,6 +22,9 @@ class BaseStrategy:
         self.__analyzers = []
         self.__namedAnalyzers = {}
         self.__resampledBarFeeds = []
+        # 在 with self.indicators: 中创建的指标, 相同的只计算一次, 分析器也会共用;
+        # 设置 indicator_cache(目录)的时候, 零拷贝序列上的指标保存在磁盘上, 之后的回测直接映射
+        self.__indicators = IndicatorRegistry(indicator_cache)
         self.__dispatcher = Dispatcher()
         self.__broker.order_events.subscribe(self.__onOrderEvent)
         self.bar_feed.bar_events.subscribe(self.__onBars)
@@ -52,16 +57,27 @@ class BaseStrategy:
 
         """
             我们尝试把数据序列记在策略中
-            TODO: 对于离线的回测，这个过程可以利用本来的数据
+            对于离线的回测(series_zero_copy)，序列直接是feed中数据的只读视图，每根bar只移动游标
+            视图不会跳过缺失的bar, 所以外连接(有 valid 掩码)的数据仍然逐根append, 只追加真正存在的bar
         """
 
         instruments = broker.instruments
 
         self.bar_series = dict()
         self.max_series_length = series_max_len
+        # 流式的feed中没有完整的数据，只能逐根append
+        self.__seriesZeroCopyRequested = series_zero_copy and self.bar_feed.in_memory
+        self.__seriesZeroCopy = self.__seriesZeroCopyRequested and self.bar_feed.bars.valid is None
+        self.__seriesPositioned = False
+
+        # 回测的时候feed的长度是已知的，序列可以一次分配到位
+        capacity = len(self.bar_feed.bars) if self.bar_feed.in_memory else None
 
         for instrument in instruments:
-            self.bar_series[instrument] = BarDataSeries(max_len=series_max_len)
+            self.bar_series[instrument] = BarDataSeries(max_len=series_max_len, capacity=capacity,
+                                                        ring_buffer=series_ring_buffer)
+        if self.__seriesZeroCopy:
+            self.__attachSeries(self.bar_feed.bars)
 
         """
             反正都要用，为何不把所有Positions管理起来呢
@@ -124,10 +140,19 @@ class BaseStrategy:
         self.__barsProcessedEvent = Event()
         self.__analyzers = []
         self.__namedAnalyzers = {}
-        self.__resampledBarFeeds = []
         self.__dispatcher = Dispatcher()
+        for resampled in self.__resampledBarFeeds:
+            resampled.reset()
         for series in self.bar_series.values():
-            series.reset(self.max_series_length)
+            series.reset(self.max_series_length, len(bars) if self.bar_feed.in_memory else None)
+        self.__seriesZeroCopy = self.__seriesZeroCopyRequested and bars.valid is None
+        if self.__seriesZeroCopy:
+            self.__attachSeries(bars)
+
+    def __attachSeries(self, store):
+        for instrument, series in self.bar_series.items():
+            series.attach(store.instrument_bars(instrument), store.timestamps)
+        self.__seriesPositioned = False
 
     @property
     def use_event_datetime_logs(self):
@@ -144,6 +169,13 @@ class BaseStrategy:
     def broker(self):
         return self.__broker
 
+    @property
+    def indicators(self):
+        """
+            :rtype: :class:`myalgo.indicator.registry.IndicatorRegistry`
+        """
+        return self.__indicators
+
     @property
     def bars_processed_events(self):
         return self.__barsProcessedEvent
@@ -512,6 +544,18 @@ class BaseStrategy:
         """
         pass
 
+    def resample_series(self, instrument, frequency, max_len=None, ring_buffer=False):
+        """
+            把 instrument 的分钟序列聚合成 frequency 周期的序列, 随着bar的到来增量更新
+
+            比如一个月的ATR在日线上只需要30个值, 而不是43200根分钟bar
+
+            :rtype: :class:`myalgo.dataseries.ResampledBarDataSeries`
+        """
+        ret = ResampledBarDataSeries(self.bar_series[instrument], frequency, max_len, ring_buffer)
+        self.__resampledBarFeeds.append(ret)
+        return ret
+
     def __onIdle(self):
         # Force a resample check to avoid depending solely on the underlying
         # barfeed events.
@@ -533,14 +577,28 @@ class BaseStrategy:
             pos.onOrderEvent(orderEvent)
 
     def __appendToSeries(self, bars):
-        for instrument, bar in bars.items():
+        for instrument, bar in bars.items:
             self.bar_series[instrument].append(bar)
 
+    def __advanceSeries(self, bars):
+        # 第一根被派发的bar不一定是feed中的第0根，从它开始;
+        # 只有每根bar上所有品种都有数据(store.valid is None)的时候, 才与append得到的序列一致
+        if not self.__seriesPositioned:
+            for series in self.bar_series.values():
+                series.as_new(bars.index)
+            self.__seriesPositioned = True
+
+        for series in self.bar_series.values():
+            series.to_next()
+
     def __onBars(self, dateTime, bars1, bars2):
         # THE ORDER HERE IS VERY IMPORTANT
 
         # 0: Append The bar Into the dataseries
-        self.__appendToSeries(bars2)
+        if self.__seriesZeroCopy:
+            self.__advanceSeries(bars2)
+        else:
+            self.__appendToSeries(bars2)
         # 1: Let analyzers process bars.
         self.__notifyAnalyzers(lambda s: s.beforeOnBars(bars2))
         # 2: Let the strategy process current bars and submit orders.
@@ -553,6 +611,8 @@ class BaseStrategy:
         """Call once (**and only once**) to run the strategy."""
         self.__dispatcher.run()
         if self.bar_feed.last_bars is not None:
+            # 先让分析器算出结果, onFinish 中就可以读取
+            self.__notifyAnalyzers(lambda s: s.onFinish(self.bar_feed.last_bars))
             self.onFinish(self.bar_feed.last_bars)
         else:
             self.logger.warn('BAR IS EMPTY!')
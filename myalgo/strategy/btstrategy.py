@@ -19,22 +19,50 @@ The strategy should recv the id of params , which would be used to save the resu
 """
 
 
+def trade_statistics(positive, negative, position_count):
+    """
+        由盈利、亏损仓位的收益计算胜率与盈亏比
+    """
+    profits = positive
+    losses = negative
+    if len(profits) == 0:
+        plr = 0
+    elif len(losses) > 0 and losses.mean() != 0:
+        plr = profits.mean() / abs(losses.mean())
+    else:
+        plr = None
+
+    win_rate = positive.shape[0] / position_count * 100 \
+        if position_count != 0 else None
+
+    return {
+        "win_rate": win_rate,
+        "plr": plr,
+        "trade_count": position_count,
+    }
+
+
 class BackTestStrategy(BaseStrategy):
     name = 'BackTestStrategy'
 
     def onBars(self, datetime, bars):
         return NotImplementedError()
 
-    def __init__(self, feed: BaseBarFeed, cash: float, commission: Commission, round):
+    def __init__(self, feed: BaseBarFeed, cash: float, commission: Commission, round, series_max_len=None,
+                 series_ring_buffer=False, series_zero_copy=True, indicator_cache=None):
         self.__start_cash = cash
         self.__broker = BackTestBroker(cash, feed, commission=commission, round_quantity=round)
 
-        super(BackTestStrategy, self).__init__(self.__broker)
+        super(BackTestStrategy, self).__init__(self.__broker, series_max_len=series_max_len,
+                                               series_ring_buffer=series_ring_buffer,
+                                               series_zero_copy=series_zero_copy,
+                                               indicator_cache=indicator_cache)
 
+        # 回测结束时才读取结果, 回测过程中只记录权益, 结束时一次算出
         self.__analyzers = {
-            "ret": Returns(),
-            "sharpe": SharpeRatio(),
-            "dd": DrawDown(),
+            "ret": Returns(vectorized=True),
+            "sharpe": SharpeRatio(vectorized=True),
+            "dd": DrawDown(vectorized=True),
         }
 
         self.attachAnalyzer(self.__analyzers["ret"])
@@ -43,12 +71,6 @@ class BackTestStrategy(BaseStrategy):
 
         self.__effects = None
 
-        """
-            这里设置了一个缓冲区来暂存所有的序列
-        """
-        self.series_buffer = np.zeros((len(feed.bars), 9))
-        self.time_buffer = np.zeros((len(feed.bars)))
-
     @property
     def analyzers(self):
         return self.__analyzers
@@ -80,27 +102,13 @@ class BackTestStrategy(BaseStrategy):
                 "profit_rate": self.broker.equity / self.__start_cash,
             }
 
-        profits = positive
-        losses = negative
-        if len(profits) is 0:
-            plr = 0
-        elif len(losses) > 0 and losses.mean() != 0:
-            plr = profits.mean() / abs(losses.mean())
-        else:
-            plr = None
-
-        win_rate = positive.shape[0] / position_count * 100 \
-            if position_count != 0 else None
-
         self.__effects = {
             "profit_rate": self.broker.equity / self.__start_cash,
             "ret": self.analyzers["ret"].getCumulativeReturns()[-1] * 100,
             "sharp": self.analyzers["sharpe"].getSharpeRatio(0.00),
             "dd": self.analyzers["dd"].getMaxDrawDown() * 100,
             "ddd": self.analyzers["dd"].getLongestDrawDownDuration(),
-            "win_rate": win_rate,
-            "plr": plr,
-            "trade_count": position_count,
+            **trade_statistics(positive, negative, position_count),
         }
 
     @property
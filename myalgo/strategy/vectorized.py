@@ -0,0 +1,361 @@
+import abc
+import datetime
+import json
+import weakref
+
+import numpy as np
+
+from myalgo import logger
+from myalgo.broker.commission import Commission
+from myalgo.broker.vectorized import commission_params, simulate_batch, BID_CLOSE
+from myalgo.dataseries import BarDataSeries
+from myalgo.feed.barfeed import BaseBarFeed
+from myalgo.indicator.cache import as_indicator_cache, code_version
+from myalgo.order import Type
+from myalgo.strategy.btstrategy import BackTestStrategy, trade_statistics
+from myalgo.stratanalyzer.drawdown import max_drawdown
+from myalgo.stratanalyzer.sharpe import sharpe_ratio, daily_returns
+
+"""
+    向量化回测: 策略一次性给出整段数据上的信号数组, 成交在编译后的循环中模拟,
+    不再经过 Dispatcher -> feed -> Event -> broker -> strategy 的逐根派发。
+
+    结果与 BackTestStrategy.calculate_effects 的格式相同, 优化器可以直接替换使用。
+
+    参数扫描的时候, 同一个 feed 上与参数无关的指标(shared_indicators)只计算一次(设置了 indicator_cache 的时候
+    保存在磁盘上, 之后的运行与优化器的 worker 直接映射), 多组参数的撮合在同一次遍历中同步进行。
+"""
+
+# 一次同步撮合的参数组数, 权益曲线占用 SWEEP_CHUNK_SIZE * len(feed) * 8 字节
+SWEEP_CHUNK_SIZE = 16
+
+# BarStore -> {策略类: 参数无关的指标}
+_shared_indicators = weakref.WeakKeyDictionary()
+
+
+class Signals(object):
+    """
+        某个标的在每根bar上的信号, 数组长度与feed相同, 标量会被广播
+
+        第 i 个元素表示策略在第 i 根bar的 onBars 中做出的决定, 对应的订单从第 i+1 根bar开始撮合
+
+    :param instrument: 交易的标的
+    :param entries: 空仓时是否入场
+    :param exits: 持仓时以市价离场; 入场单还没有成交时撤单
+    :param cancels: 入场单还没有成交时撤单
+    :param order_type: 入场单的类型, 支持 Type.MARKET / Type.LIMIT / Type.STOP
+    :param price: 限价单或止损单的价格
+    :param quantity: 入场数量, nan 或者不大于0的时候按 (现金 - reserve) 计算
+    :param take_profit: 入场成交后挂出的止盈限价单与成交价的距离, nan 表示不挂
+    :param stop_loss: 入场成交后挂出的止损单与成交价的距离, nan 表示不挂
+    :param close_stop: bar.price 越过 成交价 - close_stop 时以市价离场, nan 表示不检查
+    :param relative: take_profit / stop_loss / close_stop 是否为成交价的比例
+    :param short: 是否做空
+    :param good_till_canceled: 订单是否一直有效, 否则跨日失效
+    :param max_duration: 从提交入场单开始超过这个时间就离场, :class:`datetime.timedelta`
+    :param reserve: 按现金计算数量时保留的现金
+    """
+
+    def __init__(self, instrument, entries, exits=False, cancels=False, order_type=Type.MARKET, price=np.nan,
+                 quantity=np.nan, take_profit=np.nan, stop_loss=np.nan, close_stop=np.nan, relative=False,
+                 short=False, good_till_canceled=False, max_duration=None, reserve=0.0):
+        assert order_type in (Type.MARKET, Type.LIMIT, Type.STOP), "Unsupported order type %s" % order_type
+
+        self.instrument = instrument
+        self.entries = entries
+        self.exits = exits
+        self.cancels = cancels
+        self.order_type = order_type
+        self.price = price
+        self.quantity = quantity
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+        self.close_stop = close_stop
+        self.relative = relative
+        self.short = short
+        self.good_till_canceled = good_till_canceled
+        self.max_duration = max_duration
+        self.reserve = reserve
+
+    @property
+    def max_minutes(self):
+        if self.max_duration is None:
+            return -1
+        return int(self.max_duration / datetime.timedelta(minutes=1))
+
+    @property
+    def options(self):
+        # 同一批同步撮合的信号, 这些选项必须相同
+        return (self.instrument, self.order_type.value, bool(self.short), bool(self.relative),
+                bool(self.good_till_canceled), self.max_minutes, float(self.reserve))
+
+    def quantities(self, round_quantity=None):
+        # 与下单时一样对数量取整, 只需要处理会入场的位置
+        quantity = self.quantity
+        if round_quantity is None:
+            return quantity
+        if np.ndim(quantity) == 0:
+            return round_quantity(quantity) if quantity > 0 else quantity
+
+        entries = np.broadcast_to(self.entries, np.shape(quantity))
+        ret = np.array(quantity, dtype=np.float64)
+        index = np.flatnonzero(entries & (ret > 0))
+        ret[index] = [round_quantity(value) for value in ret[index]]
+        return ret
+
+
+def stack(values, length, dtype):
+    """
+        把 k 组参数的信号合并成 (k, length) 的数组
+
+        所有参数用的是同一个数组或者都是标量的时候只得到广播的视图, 不复制
+    """
+    first = values[0]
+    if all(value is first for value in values):
+        return np.broadcast_to(np.asarray(first, dtype=dtype), (len(values), length))
+    if all(np.ndim(value) == 0 for value in values):
+        return np.broadcast_to(np.asarray(values, dtype=dtype)[:, None], (len(values), length))
+    ret = np.empty((len(values), length), dtype=dtype)
+    for row, value in enumerate(values):
+        ret[row] = value
+    return ret
+
+
+def position_returns(entry, exit_, quantity, commission, last_price):
+    """
+        与 Position.getReturn 相同: 未平仓的仓位按最后价格计算, 未成交的仓位收益为0
+    """
+    ret = np.zeros(entry.shape[0])
+    filled = quantity != 0
+    price = np.where(np.isnan(exit_), last_price, exit_)
+    pnl = (price - entry) * quantity - commission
+    ret[filled] = pnl[filled] / (entry[filled] * np.abs(quantity[filled]))
+    return ret
+
+
+class VectorizedStrategy(object):
+    """
+        向量化回测的策略基类, 构造参数与 :class:`BackTestStrategy` 相同
+
+        子类实现 :meth:`signals`, 用 self.bar_series 中完整的序列计算信号;
+        与参数无关的指标放在 :meth:`shared_indicators` 中, 通过 self.shared 访问。
+        目前只支持单个标的, 同一时间只持有一个仓位。
+    """
+
+    # 与 BackTestStrategy 相同, 优化器会把结果存到同一张表
+    name = BackTestStrategy.name
+
+    # shared_indicators 的磁盘缓存, :class:`myalgo.indicator.cache.IndicatorCache` 或者目录, None 表示不缓存;
+    # 缓存的时候 shared_indicators 需要返回 {标的: {名字: 数组}}
+    indicator_cache = None
+
+    LOGGER_NAME = "VectorizedStrategyLog"
+
+    def __init__(self, feed: BaseBarFeed, cash: float, commission: Commission, round=lambda x: int(x)):
+        self.__feed = feed
+        self.__start_cash = cash
+        self.__commission = commission
+        self.__round = round
+        self.__logger = logger.get_logger(VectorizedStrategy.LOGGER_NAME)
+
+        self.__equity = cash
+        self.__equity_curve = np.zeros(0)
+        self.__timestamps = np.zeros(0, dtype='datetime64[m]')
+        self.__position_returns = np.zeros(0)
+        self.__effects = None
+
+        # 整段数据上的只读视图
+        store = feed.bars
+        self.bar_series = dict()
+        for instrument in feed.instruments:
+            series = BarDataSeries(frequency=feed.frequency)
+            series.attach(store.instrument_bars(instrument), store.timestamps)
+            series.to_end()
+            self.bar_series[instrument] = series
+
+    @classmethod
+    def shared_indicators(cls, feed: BaseBarFeed):
+        """
+            Override (optional) 返回与参数无关的指标, 比如 {'high': ..., 'low': ...}
+
+            同一个进程中, 同一份数据上每个策略类只会调用一次
+        """
+        return {}
+
+    @abc.abstractmethod
+    def signals(self):
+        """
+            :rtype: :class:`Signals`
+        """
+        raise NotImplementedError()
+
+    @property
+    def shared(self):
+        cache = _shared_indicators.setdefault(self.__feed.bars, {})
+        cls = type(self)
+        if cls not in cache:
+            cache[cls] = cls.__load_shared(self.__feed)
+        return cache[cls]
+
+    @classmethod
+    def __load_shared(cls, feed: BaseBarFeed):
+        disk = as_indicator_cache(cls.indicator_cache)
+        if disk is None:
+            return cls.shared_indicators(feed)
+
+        store = feed.bars
+        fingerprint = disk.fingerprint(store.timestamps, store.data)
+        spec = ['shared_indicators', cls.__module__, cls.__qualname__, code_version(cls), list(feed.instruments)]
+
+        def compute():
+            # {标的: {名字: 数组}} 展开成 {json([标的, 名字]): 数组}
+            return {json.dumps([instrument, name]): np.asarray(array)
+                    for instrument, arrays in cls.shared_indicators(feed).items()
+                    for name, array in arrays.items()}
+
+        ret = {}
+        for key, array in disk.get_arrays(fingerprint, spec, compute).items():
+            instrument, name = json.loads(key)
+            ret.setdefault(instrument, {})[name] = array
+        return ret
+
+    @property
+    def bar_feed(self):
+        return self.__feed
+
+    @property
+    def feed(self):
+        return self.__feed
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def equity(self):
+        return self.__equity
+
+    @property
+    def equity_curve(self):
+        # 每根被派发的bar上的权益
+        return self.__equity_curve
+
+    @property
+    def simulate_options(self):
+        fixed_commission, commission_rate = commission_params(self.__commission)
+        return float(self.__start_cash), fixed_commission, commission_rate
+
+    def run(self):
+        VectorizedStrategy.run_all([self])
+
+    @classmethod
+    def run_sweep(cls, feed: BaseBarFeed, parameters, chunk_size=SWEEP_CHUNK_SIZE):
+        """
+            用多组参数回测, 返回每组参数的 result
+
+        :param parameters: 每个元素是传给构造函数的参数元组
+        """
+        strategies = [cls(feed, *args) for args in parameters]
+        VectorizedStrategy.run_all(strategies, chunk_size, keep_equity=False)
+        return [strategy.result for strategy in strategies]
+
+    @staticmethod
+    def run_all(strategies, chunk_size=SWEEP_CHUNK_SIZE, keep_equity=True):
+        """
+            同一个 feed 上的多个策略, 选项相同的信号按 chunk_size 分批同步撮合
+
+        :param keep_equity: 是否保留每个策略的权益曲线, 参数很多的时候不保留可以节约内存
+        """
+        if len(strategies) == 0:
+            return
+
+        store = strategies[0].bar_feed.bars
+
+        # 与 BaseStrategy.run 一样, 第0根bar不会被派发, 至少需要两根bar
+        if len(store) < 2:
+            strategies[0].logger.warning('BAR IS EMPTY!')
+            return
+
+        # 信号在撮合之前才计算, 同时存在的信号最多为 (选项的种类 * chunk_size) 组
+        bars = {}
+        groups = {}
+        for strategy in strategies:
+            assert strategy.bar_feed.bars is store, "All strategies should share the same bars"
+            signals = strategy.signals()
+            options = signals.options + strategy.simulate_options
+            members = groups.setdefault(options, [])
+            members.append((strategy, signals))
+            if len(members) == chunk_size:
+                VectorizedStrategy.__simulate(store, bars, options, members, keep_equity)
+                del groups[options]
+
+        for options, members in groups.items():
+            VectorizedStrategy.__simulate(store, bars, options, members, keep_equity)
+
+    @staticmethod
+    def __simulate(store, bars, options, members, keep_equity):
+        instrument, order_type, short, relative, good_till_canceled, max_minutes, reserve, cash, \
+            fixed_commission, commission_rate = options
+
+        if instrument not in bars:
+            bars[instrument] = store.instrument_bars(instrument).astype(np.float64)
+
+        length = len(store)
+        signals = [member[1] for member in members]
+
+        equity, owner, entry, exit_, quantity, commission, balance, shares = simulate_batch(
+            bars[instrument], store.timestamps.astype(np.int64),
+            stack([s.entries for s in signals], length, np.bool_),
+            stack([s.exits for s in signals], length, np.bool_),
+            stack([s.cancels for s in signals], length, np.bool_),
+            stack([s.price for s in signals], length, np.float64),
+            stack([s.quantities(strategy.__round) for strategy, s in members], length, np.float64),
+            stack([s.take_profit for s in signals], length, np.float64),
+            stack([s.stop_loss for s in signals], length, np.float64),
+            stack([s.close_stop for s in signals], length, np.float64),
+            order_type, short, relative, good_till_canceled, max_minutes, reserve, cash,
+            fixed_commission, commission_rate)
+
+        # 结束时 feed 停在最后一根bar上, 价格取自它的前一根
+        last_price = bars[instrument][-2, BID_CLOSE]
+        for row, (strategy, _) in enumerate(members):
+            mine = owner == row
+            strategy.__equity = balance[row] + shares[row] * last_price
+            strategy.__equity_curve = equity[row, 1:]
+            strategy.__timestamps = store.timestamps[1:]
+            strategy.__position_returns = position_returns(
+                entry[mine], exit_[mine], quantity[mine], commission[mine], last_price)
+            strategy.calculate_effects()
+
+            # 不要让一行的视图拖住整个 (k, n) 的数组
+            strategy.__equity_curve = strategy.__equity_curve.copy() if keep_equity else np.zeros(0)
+
+    def calculate_effects(self):
+        returns = self.__position_returns
+        position_count = returns.shape[0]
+
+        if position_count == 0:
+            self.__effects = None
+            return {
+                "profit_rate": self.__equity / self.__start_cash,
+            }
+
+        max_dd, longest_duration = max_drawdown(self.__equity_curve, self.__timestamps)
+
+        self.__effects = {
+            "profit_rate": self.__equity / self.__start_cash,
+            "ret": (self.__equity_curve[-1] / self.__start_cash - 1) * 100,
+            "sharp": sharpe_ratio(daily_returns(self.__equity_curve, self.__timestamps, self.__start_cash), 0.00,
+                                  252, True),
+            "dd": max_dd * 100,
+            "ddd": longest_duration,
+            **trade_statistics(returns[returns > 0], returns[returns < 0], position_count),
+        }
+
+    @property
+    def effects(self):
+        return self.__effects
+
+    @property
+    def result(self):
+        return self.__effects
@@ -1,3 +1,5 @@
+from collections.abc import Sequence
+
 import numpy as np
 
 
@@ -37,85 +39,157 @@ def intersect(values1, values2, skipNone=False):
 
 
 # Like a collections.deque but using a numpy.array.
+# 环形缓冲区: 数组的长度是 2 * maxLen, 每个值同时写在 i 与 i + maxLen 两个位置,
+# 所以最后 maxLen 个值总是连续的 __values[head:head + maxLen], append 是O(1)的, data() 不需要复制
 class NumPyDeque(object):
     def __init__(self, maxLen, dtype=float):
         assert maxLen > 0, "Invalid maximum length"
 
-        self.__values = np.empty(maxLen, dtype=dtype)
+        self.__values = np.empty(2 * maxLen, dtype=dtype)
         self.__maxLen = maxLen
-        self.__nextPos = 0
+        # 下一个值写入的位置, 写满之后也是最早的值的位置
+        self.__head = 0
+        self.__size = 0
 
     def getMaxLen(self):
         return self.__maxLen
 
     def append(self, value):
-        if self.__nextPos < self.__maxLen:
-            self.__values[self.__nextPos] = value
-            self.__nextPos += 1
-        else:
-            # Shift items to the left and put the last value.
-            # I'm not using np.roll to avoid creating a new array.
-            self.__values[0:-1] = self.__values[1:]
-            self.__values[self.__nextPos - 1] = value
+        head = self.__head
+        self.__values[head] = value
+        self.__values[head + self.__maxLen] = value
+        head += 1
+        self.__head = head if head < self.__maxLen else 0
+        if self.__size < self.__maxLen:
+            self.__size += 1
 
     def data(self):
         # If all values are not initialized, return a portion of the array.
-        if self.__nextPos < self.__maxLen:
-            ret = self.__values[0:self.__nextPos]
-        else:
-            ret = self.__values
-        return ret
+        if self.__size < self.__maxLen:
+            return self.__values[0:self.__size]
+        return self.__values[self.__head:self.__head + self.__maxLen]
 
     def resize(self, maxLen):
         assert maxLen > 0, "Invalid maximum length"
 
         # Create empty, copy last values and swap.
-        values = np.empty(maxLen, dtype=self.__values.dtype)
-        lastValues = self.__values[0:self.__nextPos]
-        values[0:min(maxLen, len(lastValues))] = lastValues[-1 * min(maxLen, len(lastValues)):]
+        lastValues = self.data()[-maxLen:]
+        size = len(lastValues)
+        values = np.empty(2 * maxLen, dtype=self.__values.dtype)
+        values[0:size] = lastValues
+        values[maxLen:maxLen + size] = lastValues
         self.__values = values
 
         self.__maxLen = maxLen
-        if self.__nextPos >= self.__maxLen:
-            self.__nextPos = self.__maxLen
+        self.__size = size
+        self.__head = size if size < maxLen else 0
 
     def __len__(self):
-        return self.__nextPos
+        return self.__size
 
     def __getitem__(self, key):
         return self.data()[key]
 
 
+class ListView(Sequence):
+    """
+        list 中 [start, stop) 一段的只读视图, 创建是O(1)的, 不复制任何值
+
+        与 :meth:`NumPyDeque.data` 返回的数组视图一样, 只在下一次 append 之前有效
+    """
+    __slots__ = ('__values', '__start', '__stop')
+
+    def __init__(self, values, start, stop):
+        self.__values = values
+        self.__start = start
+        self.__stop = stop
+
+    def __len__(self):
+        return self.__stop - self.__start
+
+    def __getitem__(self, key):
+        size = self.__stop - self.__start
+        if isinstance(key, slice):
+            begin, end, step = key.indices(size)
+            if step == 1:
+                return self.__values[self.__start + begin:self.__start + max(begin, end)]
+            return [self.__values[self.__start + i] for i in range(begin, end, step)]
+        if key < 0:
+            key += size
+        if key < 0 or key >= size:
+            raise IndexError("list index out of range")
+        return self.__values[self.__start + key]
+
+    def __iter__(self):
+        values = self.__values
+        for i in range(self.__start, self.__stop):
+            yield values[i]
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, ListView)):
+            return len(self) == len(other) and all(v1 == v2 for v1, v2 in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 # I'm not using collections.deque because:
 # 1: Random access is slower.
 # 2: Slicing is not supported.
+# 与 NumPyDeque 相同的环形缓冲区: list 的长度是 2 * maxLen, 每个值同时写在 i 与 i + maxLen 两个位置,
+# append 是O(1)的, 最后 maxLen 个值总是连续的, data() 返回它们的 :class:`ListView`, 同样是O(1)的
 class ListDeque(object):
     def __init__(self, maxLen):
         assert maxLen > 0, "Invalid maximum length"
 
-        self.__values = []
+        self.__values = [None] * (2 * maxLen)
         self.__maxLen = maxLen
+        # 下一个值写入的位置, 写满之后也是最早的值的位置
+        self.__head = 0
+        self.__size = 0
 
     def getMaxLen(self):
         return self.__maxLen
 
     def append(self, value):
-        self.__values.append(value)
-        # Check bounds
-        if len(self.__values) > self.__maxLen:
-            self.__values.pop(0)
+        head = self.__head
+        self.__values[head] = value
+        self.__values[head + self.__maxLen] = value
+        head += 1
+        self.__head = head if head < self.__maxLen else 0
+        if self.__size < self.__maxLen:
+            self.__size += 1
+
+    def __begin(self):
+        return 0 if self.__size < self.__maxLen else self.__head
 
     def data(self):
-        return self.__values
+        begin = self.__begin()
+        return ListView(self.__values, begin, begin + self.__size)
 
     def resize(self, maxLen):
         assert maxLen > 0, "Invalid maximum length"
 
+        lastValues = self.data()[-maxLen:]
+        size = len(lastValues)
+        values = [None] * (2 * maxLen)
+        values[0:size] = lastValues
+        values[maxLen:maxLen + size] = lastValues
+        self.__values = values
+
         self.__maxLen = maxLen
-        self.__values = self.__values[-1 * maxLen:]
+        self.__size = size
+        self.__head = size if size < maxLen else 0
 
     def __len__(self):
-        return len(self.__values)
+        return self.__size
 
     def __getitem__(self, key):
-        return self.__values[key]
+        if isinstance(key, slice):
+            return self.data()[key]
+        if key < 0:
+            key += self.__size
+        if key < 0 or key >= self.__size:
+            raise IndexError("list index out of range")
+        return self.__values[self.__begin() + key]
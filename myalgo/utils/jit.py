@@ -0,0 +1,19 @@
+"""
+    numba 是可选的依赖: 可以导入的时候 njit 就是 numba.njit;
+    否则 njit 什么都不做, 被装饰的函数作为普通的 python/numpy 代码运行, 结果相同, 只是慢很多
+
+    所有需要编译的模块都从这里导入 njit, 不直接导入 numba
+"""
+
+try:
+    from numba import njit
+
+    COMPILED = True
+except ImportError:
+    COMPILED = False
+
+    def njit(*args, **kwargs):
+        # 同时支持 @njit 与 @njit(cache=True, ...)
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda function: function
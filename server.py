@@ -18,8 +18,9 @@ def parameters_generator():
 # The if __name__ == '__main__' part is necessary if running on Windows.
 if __name__ == '__main__':
     # Load the bar feed from the CSV files.
-    feed = SQLiteFeed(instruments=['USDJPY'], table_name='bins', file_name='sqlite')
+    feed = SQLiteFeed(instruments=['USDJPY'], table_name='bins', file_name='sqlite', cache='bar_cache')
     feed.load_data(datetime.date(2015, 1, 1), datetime.date(2016, 1, 1))
     # Run the server.
-    local.run(strategies.orindary.OrindaryStr, feed, parameters_generator(), batchSize=2, workerCount=36,
+    # 向量化的版本每个 batch 的参数在一次遍历中同步回测
+    local.run(strategies.orindary.VectorizedOrindaryStr, feed, parameters_generator(), batchSize=100, workerCount=36,
               logLevel=logging.DEBUG)
@@ -1,11 +1,27 @@
-#
-# setup(
-#     name='myalgo',
-#     version='1.2.10',
-#     packages=find_packages(),
-#     url='',
-#     license='',
-#     author='nathaniel',
-#     author_email='348831271@qq.com',
-#     description='a simple trader for CTA trading.'
-# )
+from setuptools import Extension, find_packages, setup
+
+# Event 会在每根bar上被触发多次，有 Cython 的时候编译成扩展，
+# 否则(或者编译失败时)使用 myalgo/event/event.py 中的纯Python实现
+try:
+    from Cython.Build import cythonize
+
+    ext_modules = cythonize([Extension('myalgo.event._event', ['myalgo/event/_event.pyx'], optional=True)],
+                            language_level=3)
+except ImportError:
+    ext_modules = []
+
+setup(
+    name='myalgo',
+    version='1.2.10',
+    packages=find_packages(),
+    ext_modules=ext_modules,
+    # 批量撮合与逐个处理的订单按 numpy 2 的标量类型提升规则比较价格, 见 myalgo/order/fill.py
+    install_requires=['six', 'pandas', 'numpy>=2'],
+    # 没有 numba 的时候编译的内核作为普通的 python 代码运行, 见 myalgo/utils/jit.py
+    extras_require={'jit': ['numba']},
+    url='',
+    license='',
+    author='nathaniel',
+    author_email='348831271@qq.com',
+    description='a simple trader for CTA trading.'
+)
@@ -7,10 +7,11 @@ class RSI2(strategy.BackTestStrategy):
     def __init__(self, feed, p1, p2, instrument):
         super(RSI2, self).__init__(feed, 10000, round=lambda x: int(x), commission=NoCommission())
         self.__instrument = instrument
-        self.__priceDS = feed[instrument].price
-        self.__entrySMA = ma.SMA(self.__priceDS, 240)
-        self.__exitSMA = ma.SMA(self.__priceDS, 240)
-        self.__rsi = rsi.RSI(self.__priceDS, 240)
+        self.__priceDS = self.bar_series[instrument].bid_close
+        with self.indicators:
+            self.__entrySMA = ma.SMA(self.__priceDS, 240)
+            self.__exitSMA = ma.SMA(self.__priceDS, 240)
+            self.__rsi = rsi.RSI(self.__priceDS, 240)
         self.__p1 = p1
         self.__p2 = p2
         self.__longPos = None
@@ -1,9 +1,12 @@
 from datetime import timedelta
 from queue import Queue
 
+import numpy as np
+
 from myalgo import strategy
 from myalgo.broker import NoCommission
 from myalgo.indicator import highlow
+from myalgo.order import Type
 
 
 class OrindaryStr(strategy.BackTestStrategy):
@@ -13,9 +16,10 @@ class OrindaryStr(strategy.BackTestStrategy):
         self.stop_rate = 0.50
 
         self.__instrument = instrument
-        self.__priceDS = feed[instrument].price
-        self.__high = highlow.High(self.__priceDS, 60 * 24)
-        self.__low = highlow.Low(self.__priceDS, 60 * 24)
+        self.__priceDS = self.bar_series[instrument].bid_close
+        with self.indicators:
+            self.__high = highlow.High(self.__priceDS, 60 * 24)
+            self.__low = highlow.Low(self.__priceDS, 60 * 24)
         self.__p1 = p1
         self.__p2 = p2
         self.__pos = None
@@ -118,3 +122,57 @@ class OrindaryStr(strategy.BackTestStrategy):
     @property
     def usable_cash(self):
         return self.broker.cash() - self.__unusable
+
+
+class VectorizedOrindaryStr(strategy.VectorizedStrategy):
+    """
+        OrindaryStr 的向量化版本, 用于参数扫描
+
+        高低点以及每个周期的波动范围与参数无关, 同一份数据只计算一次
+    """
+
+    stop_rate = 0.50
+
+    def __init__(self, feed, p1, p2, instrument):
+        super(VectorizedOrindaryStr, self).__init__(feed, 10000, round=lambda x: int(x), commission=NoCommission())
+
+        self.__instrument = instrument
+        self.__p1 = p1
+        self.__p2 = p2
+
+        self.__unusable = 1000
+
+    @classmethod
+    def shared_indicators(cls, feed):
+        ret = {}
+        store = feed.bars
+
+        # 每4小时的周期开始
+        period_start = store.timestamps.astype(np.int64) % 240 == 0
+
+        for instrument in feed.instruments:
+            price = store.instrument_bars(instrument)[:, 5]
+            high = highlow.rolling_high(price, 60 * 24)
+            low = highlow.rolling_low(price, 60 * 24)
+
+            # 高低点准备好之后的周期开始才会入场, 波动范围一直沿用到下一个周期开始
+            starts = period_start & ~np.isnan(high)
+            index = np.maximum.accumulate(np.where(starts, np.arange(starts.shape[0]), 0))
+            range_ = np.where(starts, high - low, np.nan)[index]
+
+            ret[instrument] = {
+                "starts": starts,
+                "range": range_,
+                "stop": range_ * cls.stop_rate,
+            }
+        return ret
+
+    def signals(self):
+        shared = self.shared[self.__instrument]
+        range_ = shared["range"]
+        price = self.bar_series[self.__instrument].ask_close.prices
+
+        return strategy.Signals(self.__instrument, entries=shared["starts"], order_type=Type.LIMIT,
+                                price=price - range_ * self.__p1, take_profit=range_ * self.__p2,
+                                close_stop=shared["stop"], good_till_canceled=True,
+                                max_duration=timedelta(hours=3, minutes=55), reserve=self.__unusable)
@@ -14,9 +14,10 @@ class OrindaryStr(strategy.BackTestStrategy):
         self.stop_rate = 0.0050
 
         self.__instrument = instrument
-        self.__priceDS = feed[instrument].price
-        self.__high = highlow.High(self.__priceDS, 60 * 24)
-        self.__low = highlow.Low(self.__priceDS, 60 * 24)
+        self.__priceDS = self.bar_series[instrument].bid_close
+        with self.indicators:
+            self.__high = highlow.High(self.__priceDS, 60 * 24)
+            self.__low = highlow.Low(self.__priceDS, 60 * 24)
         self.__p1 = p1
         self.__p2 = p2
         self.__pos = None
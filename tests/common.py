@@ -0,0 +1,38 @@
+import numpy as np
+
+from myalgo.bar import BarStore, Frequency
+
+START = np.datetime64('2015-01-01T00:00', 'm')
+
+
+def make_bars(n, seed=0, spread=0.0001):
+    """
+        一个标的上 n 根随机游走的 (n, 9) 柱状数据
+    """
+    rng = np.random.default_rng(seed)
+    close = 1.0 + np.cumsum(rng.normal(0, 0.001, n))
+    open_ = np.insert(close[:-1], 0, 1.0)
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 0.0005, n))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 0.0005, n))
+    bars = np.zeros((n, 9), dtype=np.float32)
+    bars[:, 0:4] = np.stack([open_, close, high, low], axis=1) + spread
+    bars[:, 4:8] = np.stack([open_, close, high, low], axis=1)
+    return bars
+
+
+def make_store(n, instruments=('EURUSD',), seed=0):
+    data = np.stack([make_bars(n, seed + i) for i in range(len(instruments))], axis=1)
+    return BarStore(list(instruments), START + np.arange(n), data, Frequency.MINUTE)
+
+
+def make_gapped_store(n, instruments=('EURUSD', 'GBPUSD'), seed=0, fill=False):
+    """
+        外连接得到的 store, 除了第一个标的, 其他标的每隔几根bar缺一根
+    """
+    columns = {}
+    for i, instrument in enumerate(instruments):
+        keep = np.ones(n, dtype=np.bool_)
+        if i > 0:
+            keep[i::3 + i] = False
+        columns[instrument] = ((START + np.arange(n))[keep], make_bars(n, seed + i)[keep])
+    return BarStore.join(columns, Frequency.MINUTE, how='outer', fill=fill)
@@ -0,0 +1,166 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from myalgo.bar import Frequency
+from myalgo.feed import BaseBarFeed
+from myalgo.stratanalyzer import kernels
+from myalgo.stratanalyzer.drawdown import DrawDown, DrawDownHelper
+from myalgo.stratanalyzer.returns import Returns, TimeWeightedReturns
+from myalgo.stratanalyzer.sharpe import SharpeRatio
+from tests.common import make_gapped_store, make_store
+from tests.test_backtest import INSTRUMENTS, BuyAndHold, Rotation, run_ladder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在屏蔽了 numba 的解释器中导入整个包并回测, 输出分析器的结果
+WITHOUT_NUMBA = '''
+import json
+import sys
+
+sys.modules['numba'] = None
+
+from myalgo.stratanalyzer import kernels
+from tests.test_analyzer import analyze, ladder
+
+print(json.dumps({'compiled': kernels.COMPILED, 'results': analyze(), 'ladder': ladder()}))
+'''
+
+
+def analyze():
+    # 几天的分钟数据, 按日收益计算的夏普比率才有意义
+    store = make_store(6000)
+    strategy = BuyAndHold(BaseBarFeed(Frequency.MINUTE, store.instruments, store))
+    strategy.run()
+    analyzers = strategy.analyzers
+    return {
+        'returns': [float(value) for value in analyzers['ret'].getReturns()],
+        'cumulative': [float(value) for value in analyzers['ret'].getCumulativeReturns()],
+        'sharpe': float(analyzers['sharpe'].getSharpeRatio(0.0)),
+        'max_dd': float(analyzers['dd'].getMaxDrawDown()),
+        'longest_dd': str(analyzers['dd'].getLongestDrawDownDuration()),
+    }
+
+
+def ladder():
+    # 订单足够多, 会用到批量撮合(fill.fill_sources)
+    strategy = run_ladder(make_store(200, INSTRUMENTS))
+    events = [(id_, type_, instrument, None if price is None else float(price))
+              for id_, type_, instrument, price in strategy.events]
+    return events, float(strategy.broker.cash())
+
+
+def test_package_runs_without_numba():
+    output = subprocess.run([sys.executable, '-c', WITHOUT_NUMBA], cwd=ROOT, check=True, capture_output=True,
+                            text=True).stdout
+    without = json.loads(output.strip().splitlines()[-1])
+    assert without['compiled'] is False
+
+    assert kernels.COMPILED
+    expected = analyze()
+    results = without['results']
+    np.testing.assert_allclose(results['returns'], expected['returns'], rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(results['cumulative'], expected['cumulative'], rtol=1e-12, atol=1e-15)
+    assert results['sharpe'] == pytest.approx(expected['sharpe'], rel=1e-9)
+    assert results['max_dd'] == pytest.approx(expected['max_dd'], rel=1e-12)
+    assert results['longest_dd'] == expected['longest_dd']
+
+    events, cash = ladder()
+    assert [tuple(event) for event in without['ladder'][0]] == events
+    assert without['ladder'][1] == cash
+
+
+@pytest.mark.parametrize('gapped', [False, True])
+def test_vectorized_analyzers_match_streaming_ones(gapped):
+    # 三天多的分钟数据, 有几个日收益
+    store = make_gapped_store(3000, INSTRUMENTS) if gapped else make_store(3000, INSTRUMENTS)
+    strategy = Rotation(BaseBarFeed(Frequency.MINUTE, store.instruments, store))
+    # 逐根更新的分析器, 与策略自带的向量化分析器比较
+    streaming = {'ret': Returns(), 'bounded': Returns(maxLen=100), 'sharpe': SharpeRatio(),
+                 'bar_sharpe': SharpeRatio(useDailyReturns=False), 'dd': DrawDown()}
+    vectorized = dict(strategy.analyzers, bounded=Returns(maxLen=100, vectorized=True),
+                      bar_sharpe=SharpeRatio(useDailyReturns=False, vectorized=True))
+    for name in ('bounded', 'bar_sharpe'):
+        strategy.attachAnalyzer(vectorized[name])
+    for analyzer in streaming.values():
+        strategy.attachAnalyzer(analyzer)
+    strategy.run()
+
+    for name in ('ret', 'bounded'):
+        assert len(vectorized[name].getReturns()) == len(streaming[name].getReturns())
+        np.testing.assert_allclose(vectorized[name].getReturns(), list(streaming[name].getReturns()),
+                                   rtol=1e-9, atol=1e-15)
+        np.testing.assert_allclose(vectorized[name].getCumulativeReturns(),
+                                   list(streaming[name].getCumulativeReturns()), rtol=1e-9, atol=1e-15)
+    assert len(streaming['bounded'].getReturns()) == 100
+
+    for name in ('sharpe', 'bar_sharpe'):
+        assert len(vectorized[name].getReturns()) == len(streaming[name].getReturns())
+        assert vectorized[name].getSharpeRatio(0.0) == pytest.approx(streaming[name].getSharpeRatio(0.0), rel=1e-6)
+        assert vectorized[name].getSharpeRatio(0.05, False) == \
+            pytest.approx(streaming[name].getSharpeRatio(0.05, False), rel=1e-6)
+
+    assert streaming['dd'].getMaxDrawDown() > 0
+    assert vectorized['dd'].getMaxDrawDown() == pytest.approx(streaming['dd'].getMaxDrawDown(), rel=1e-9)
+    assert vectorized['dd'].getLongestDrawDownDuration() == streaming['dd'].getLongestDrawDownDuration()
+
+
+def equity_curves():
+    rng = np.random.default_rng(0)
+    yield 'random walk', 10000 * np.cumprod(1 + rng.normal(0, 0.001, 5000))
+    yield 'rising', np.linspace(100, 200, 50)
+    yield 'falling', np.linspace(200, 100, 50)
+    yield 'flat', np.full(20, 100.0)
+    yield 'single', np.array([99.0])
+    yield 'empty', np.zeros(0)
+    # 新高与持平交替
+    yield 'plateaus', np.repeat(np.array([100.0, 90.0, 100.0, 100.0, 80.0, 120.0, 110.0]), 3)
+
+
+@pytest.mark.skipif(not kernels.COMPILED, reason='numba is not installed')
+@pytest.mark.parametrize('name, equity', list(equity_curves()))
+def test_compiled_kernels_match_the_numpy_fallback(name, equity):
+    # 时间不连续, 中间缺一段
+    minutes = (np.arange(equity.shape[0]) + 500 * (np.arange(equity.shape[0]) > equity.shape[0] // 2)).astype(
+        np.int64)
+    for initial in (10000.0, float(equity[0]) if equity.shape[0] else 1.0):
+        compiled = kernels.compiled_returns(equity, initial)
+        fallback = kernels.numpy_returns(equity, initial)
+        np.testing.assert_allclose(compiled[0], fallback[0], rtol=1e-12, atol=1e-15)
+        np.testing.assert_allclose(compiled[1], fallback[1], rtol=1e-9, atol=1e-12)
+        # 与逐根更新的 TimeWeightedReturns 相同
+        twr = TimeWeightedReturns(initial)
+        expected = []
+        for value in equity:
+            twr.update(value)
+            expected.append((twr.getLastPeriodReturns(), twr.getCumulativeReturns()))
+        np.testing.assert_allclose(fallback[0], [net for net, _ in expected], rtol=1e-12, atol=1e-15)
+        np.testing.assert_allclose(fallback[1], [cum for _, cum in expected], rtol=1e-9, atol=1e-12)
+
+    compiled = kernels.compiled_drawdown(equity, minutes)
+    fallback = kernels.numpy_drawdown(equity, minutes)
+    assert compiled[0] == pytest.approx(fallback[0], rel=1e-12)
+    assert compiled[1] == fallback[1]
+
+    # 与逐根更新的 DrawDownHelper 相同
+    helper = DrawDownHelper()
+    max_dd, longest = 0.0, datetime.timedelta()
+    for value, minute in zip(equity, minutes):
+        helper.update(datetime.datetime(2015, 1, 1) + datetime.timedelta(minutes=int(minute)), value, value)
+        max_dd = min(max_dd, helper.getMaxDrawDown())
+        longest = max(longest, helper.getDuration())
+    assert fallback[0] == pytest.approx(max_dd, rel=1e-12)
+    assert datetime.timedelta(minutes=fallback[1]) == longest
+
+
+def test_returns_skip_a_zero_previous_equity():
+    equity = np.array([0.0, 0.0, 50.0, 100.0])
+    for kernel in ([kernels.numpy_returns] + ([kernels.compiled_returns] if kernels.COMPILED else [])):
+        net, cumulative = kernel(equity, 0.0)
+        np.testing.assert_array_equal(net, [0.0, 0.0, 0.0, 1.0])
+        np.testing.assert_array_equal(cumulative, [0.0, 0.0, 0.0, 1.0])
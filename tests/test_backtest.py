@@ -0,0 +1,169 @@
+import numpy as np
+import pytest
+
+from myalgo.bar import Frequency
+from myalgo.broker import NoCommission
+from myalgo.broker import backtest
+from myalgo.feed import BaseBarFeed
+from myalgo.feed.streaming import StreamingBarFeed, store_chunks
+from myalgo.order import Action, State, Type
+from myalgo.strategy import BackTestStrategy
+from tests.common import make_gapped_store, make_store
+
+INSTRUMENTS = ('EURUSD', 'GBPUSD', 'AUDUSD')
+
+
+class Ladder(BackTestStrategy):
+    """
+        每根bar在每个标的上挂几个限价、止损、止损限价单, 记录全部订单事件
+    """
+
+    def __init__(self, feed):
+        super(Ladder, self).__init__(feed, 10000, NoCommission(), round=int)
+        self.events = []
+        self.broker.order_events.subscribe(self.__on_order_event)
+
+    def __on_order_event(self, broker_, event):
+        price = event.info.price if event.type in (State.FILLED, State.PARTIALLY_FILLED) else None
+        self.events.append((event.order.id, event.type.name, event.order.instrument, price))
+
+    def onBars(self, dateTime, bars):
+        broker_ = self.broker
+        for j, instrument in enumerate(INSTRUMENTS):
+            bar = bars.bar(instrument)
+            if bar is None or len(broker_.active_orders(instrument)) >= 30:
+                continue
+            price = float(bar.bid_close)
+            for step in range(1, 4):
+                action = Action.BUY if step % 2 else Action.SELL
+                offset = 0.0004 * step * (1 if step % 2 else -1)
+                kind = (len(self.events) + step + j) % 4
+                if kind <= 1:
+                    order_ = broker_.create_limit_order(action, instrument, price * (1 - offset), 10)
+                elif kind == 2:
+                    order_ = broker_.create_stop_order(action, instrument, price * (1 + offset), 10)
+                else:
+                    order_ = broker_.create_stop_limit_order(action, instrument, price * (1 + offset),
+                                                             price * (1 + offset * 1.5), 10)
+                order_.good_till_canceled = (len(self.events) + j) % 5 != 0
+                broker_.submit_order(order_)
+        if len(broker_.active_orders()) > 60:
+            broker_.cancel_order(broker_.active_orders()[0])
+
+
+def run_ladder(store):
+    strategy = Ladder(BaseBarFeed(Frequency.MINUTE, store.instruments, store))
+    strategy.run()
+    return strategy
+
+
+@pytest.mark.parametrize('gapped', [False, True])
+# 阈值大一些的时候, OrderBook 在已经挂着的订单被接受、止损可能已经触发之后才建立
+@pytest.mark.parametrize('batch_fill', [backtest.BATCH_FILL, 25])
+def test_batch_fill_matches_order_by_order(monkeypatch, gapped, batch_fill):
+    store = make_gapped_store(300, INSTRUMENTS) if gapped else make_store(300, INSTRUMENTS)
+    monkeypatch.setattr(backtest, 'BATCH_FILL', batch_fill)
+    batch = run_ladder(store)
+    monkeypatch.setattr(backtest, 'BATCH_FILL', 10 ** 9)
+    single = run_ladder(store)
+
+    fills = [event for event in batch.events if event[1] == 'FILLED']
+    assert len(fills) > 50
+    assert batch.events == single.events
+    assert batch.broker.cash() == single.broker.cash()
+    assert batch.broker.quantities == single.broker.quantities
+
+
+def test_active_orders_index():
+    strategy = run_ladder(make_store(100, INSTRUMENTS))
+    broker_ = strategy.broker
+    orders = broker_.active_orders()
+    assert [order_.id for order_ in orders] == sorted(order_.id for order_ in orders)
+    for instrument in INSTRUMENTS:
+        assert broker_.active_orders(instrument) == [order_ for order_ in orders if order_.instrument == instrument]
+    for type_ in Type:
+        assert broker_.active_orders(type_=type_) == [order_ for order_ in orders if order_.type == type_]
+
+
+class BuyAndHold(BackTestStrategy):
+    def __init__(self, feed):
+        super(BuyAndHold, self).__init__(feed, 10000, NoCommission(), round=int)
+        self.order = None
+
+    def onBars(self, dateTime, bars):
+        if self.order is None:
+            self.order = self.broker.create_market_order(Action.BUY, 'EURUSD', 1000)
+            self.broker.submit_order(self.order)
+
+
+def test_market_order_fills_at_next_open_and_equity_marks_to_market():
+    store = make_store(100)
+    strategy = BuyAndHold(BaseBarFeed(Frequency.MINUTE, store.instruments, store))
+    strategy.run()
+
+    data = store.data[:, 0].astype(np.float64)
+    # 第1根bar上提交, 第2根bar的 ask_open 成交
+    fill_price = float(strategy.order.avg_fill_price)
+    assert fill_price == pytest.approx(data[2, 0])
+    assert len(strategy.order.executions) == 1
+    assert strategy.broker.quantities == {'EURUSD': 1000}
+    assert strategy.broker.cash() == pytest.approx(10000 - 1000 * fill_price)
+    # 权益按上一根bar的 bid_close 计价
+    assert strategy.broker.equity == pytest.approx(10000 - 1000 * fill_price + 1000 * data[-2, 5])
+    returns = strategy.analyzers['ret'].getCumulativeReturns()
+    assert returns[-1] == pytest.approx(strategy.broker.equity / 10000 - 1)
+
+
+class Rotation(BackTestStrategy):
+    """
+        每隔几根bar在某个标的上买入或者卖出, 每次读权益的时候与逐个标的重新计算的结果比较
+    """
+
+    def __init__(self, feed):
+        super(Rotation, self).__init__(feed, 10000, NoCommission(), round=int)
+        self.equities = []
+        self.count = 0
+        # 成交之后马上读一次, 缓存的市值要作废
+        self.broker.order_events.subscribe(lambda broker_, event: self.record())
+
+    def record(self):
+        broker_ = self.broker
+        # cash 可能是 float32 的 numpy 标量, 按 NumPy 2 的规则与 float 相加仍然是 float32
+        expected = float(broker_.cash())
+        for instrument, shares in broker_.quantities.items():
+            bar = self.feed.last_bar(instrument)
+            if bar is not None:
+                expected += float(bar.out_price) * shares
+        self.equities.append((broker_.equity, expected))
+
+    def onBars(self, dateTime, bars):
+        self.record()
+        self.record()
+        # 流式的 feed 中 bars.index 只是块中的位置
+        self.count += 1
+        index = self.count
+        instrument = INSTRUMENTS[index % len(INSTRUMENTS)]
+        if index % 4 == 1:
+            action = Action.BUY if index % 3 else Action.SELL
+            self.broker.submit_order(self.broker.create_market_order(action, instrument, 100 * (index % 7 + 1)))
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('gapped', [False, True])
+def test_cached_equity_matches_a_recomputed_loop(gapped, streaming):
+    store = make_gapped_store(300, INSTRUMENTS) if gapped else make_store(300, INSTRUMENTS)
+    if streaming:
+        # 缺失的bar可能在块的开头, 要取上一块中最后一根有效的bar计价
+        feed = StreamingBarFeed(Frequency.MINUTE, store.instruments, lambda: store_chunks(store, 7))
+    else:
+        feed = BaseBarFeed(Frequency.MINUTE, store.instruments, store)
+    strategy = Rotation(feed)
+    strategy.run()
+
+    quantities = strategy.broker.quantities
+    assert len(quantities) == len(INSTRUMENTS) and any(shares < 0 for shares in quantities.values())
+    equities = np.array(strategy.equities)
+    assert len(equities) > 2 * 298
+    np.testing.assert_allclose(equities[:, 0], equities[:, 1], rtol=1e-12)
+    # 权益是 float64
+    assert isinstance(strategy.broker.equity, float)
@@ -0,0 +1,48 @@
+import collections
+
+import numpy as np
+import pytest
+
+from myalgo.utils.collections import ListDeque, NumPyDeque
+
+
+@pytest.mark.parametrize('deque_class', [ListDeque, NumPyDeque])
+@pytest.mark.parametrize('max_len', [1, 3, 10])
+def test_deque_keeps_the_last_values(deque_class, max_len):
+    deque = deque_class(max_len)
+    expected = collections.deque(maxlen=max_len)
+    for i in range(4 * max_len + 1):
+        deque.append(float(i))
+        expected.append(float(i))
+        assert len(deque) == len(expected)
+        assert list(deque.data()) == list(expected)
+        assert deque[0] == expected[0]
+        assert deque[-1] == expected[-1]
+        assert list(deque[1:]) == list(expected)[1:]
+        assert list(deque[::-2]) == list(expected)[::-2]
+
+
+@pytest.mark.parametrize('deque_class', [ListDeque, NumPyDeque])
+def test_deque_resize_keeps_the_last_values(deque_class):
+    deque = deque_class(5)
+    for i in range(8):
+        deque.append(float(i))
+    deque.resize(3)
+    assert list(deque.data()) == [5.0, 6.0, 7.0]
+    deque.append(8.0)
+    assert list(deque.data()) == [6.0, 7.0, 8.0]
+    deque.resize(6)
+    deque.append(9.0)
+    assert list(deque.data()) == [6.0, 7.0, 8.0, 9.0]
+
+
+def test_list_deque_data_is_a_view():
+    deque = ListDeque(4)
+    for i in range(6):
+        deque.append(i)
+    data = deque.data()
+    assert data == [2, 3, 4, 5]
+    assert data[-1] == 5
+    with pytest.raises(IndexError):
+        data[4]
+    assert np.mean(data) == 3.5
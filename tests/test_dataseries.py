@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from myalgo.bar import Bar, Frequency
+from myalgo.dataseries import BarDataSeries, ResampledBarDataSeries
+from myalgo.dataseries.resampled import bucket_end, resample
+from tests.common import START, make_bars
+
+
+def make_minutes(n, seed=0):
+    """
+        n 根分钟线, 去掉几段(包括一些周期的最后一根与第一根), 再把几根的价格设成 nan
+    """
+    timestamps = START + np.arange(n)
+    bars = make_bars(n, seed)
+    bars[:, 8] = np.arange(n) % 7
+    keep = np.ones(n, dtype=np.bool_)
+    keep[59::180] = False
+    keep[600:700] = False
+    keep[1440:1445] = False
+    bars[13::97] = np.nan
+    return timestamps[keep], bars[keep]
+
+
+def append_all(series, timestamps, bars):
+    for timestamp, bar in zip(timestamps, bars):
+        series.append(Bar(timestamp, timestamp + 1, bar))
+
+
+def finish(resampled, timestamps):
+    # 最后一个周期要等时间超过它的结束时间
+    resampled.checkNow(bucket_end(timestamps[-1], resampled.frequency).astype(object))
+
+
+def assert_same_series(resampled, expected):
+    np.testing.assert_array_equal(resampled.timestamps, expected[0])
+    np.testing.assert_array_equal(resampled.bars, expected[1])
+
+
+@pytest.mark.parametrize('frequency', [Frequency.HOUR, Frequency.DAY])
+@pytest.mark.parametrize('warm_up', [0, 1, 60, 700, 1439, 2000])
+def test_incremental_resample_matches_resample(frequency, warm_up):
+    timestamps, bars = make_minutes(3 * 1440)
+    expected = resample(timestamps, bars, frequency)
+
+    source = BarDataSeries()
+    # 创建之前已经有的bar向量化地聚合, 之后的逐根更新
+    append_all(source, timestamps[:warm_up], bars[:warm_up])
+    resampled = ResampledBarDataSeries(source, frequency)
+    appended = []
+    resampled.append_event.subscribe(lambda extended: appended.append(resampled.latest.copy()))
+    append_all(source, timestamps[warm_up:], bars[warm_up:])
+    finish(resampled, timestamps)
+
+    assert resampled.pending is None
+    assert_same_series(resampled, expected)
+    # 每个周期只在结束的时候追加一次
+    np.testing.assert_array_equal(np.array(appended), expected[1][len(expected[1]) - len(appended):])
+
+
+@pytest.mark.parametrize('frequency', [Frequency.HOUR, Frequency.DAY])
+def test_resample_over_zero_copy_source(frequency):
+    timestamps, bars = make_minutes(3 * 1440)
+    source = BarDataSeries()
+    source.attach(bars, timestamps)
+    source.as_new(0)
+    resampled = ResampledBarDataSeries(source, frequency)
+    while source.to_next():
+        pass
+    finish(resampled, timestamps)
+    assert_same_series(resampled, resample(timestamps, bars, frequency))
+
+
+def test_pending_period_closes_on_its_last_minute():
+    timestamps, bars = make_minutes(120)
+    source = BarDataSeries()
+    resampled = ResampledBarDataSeries(source, Frequency.HOUR)
+    append_all(source, timestamps[:30], bars[:30])
+    assert len(resampled) == 0
+    start, pending = resampled.pending
+    assert start == START
+    np.testing.assert_array_equal(pending, resample(timestamps[:30], bars[:30], Frequency.HOUR)[1][0])
+
+    # 第 59 分钟缺失, 到下一个小时的第一根bar才结束
+    append_all(source, timestamps[30:59], bars[30:59])
+    assert len(resampled) == 0
+    append_all(source, timestamps[59:60], bars[59:60])
+    assert len(resampled) == 1
@@ -0,0 +1,293 @@
+import datetime
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, func
+
+from myalgo.bar import Frequency
+from myalgo.event import Dispatcher
+from myalgo.feed import BaseBarFeed, OptimizerBarFeed
+from myalgo.feed.cache import BarCache
+from myalgo.feed.dataframe_feed import FRAME_COLUMNS, DataFrameFeed, HistoryStore, frame_to_bars
+from myalgo.feed.sqlitefeed import SQLiteFeed
+from myalgo.feed.streaming import StreamingBarFeed
+from tests.common import START, make_bars, make_gapped_store, make_store
+
+
+def dispatch_all(feed):
+    dispatched = []
+    feed.bar_events.subscribe(lambda dateTime, bars1, bars2: dispatched.append(bars2.index))
+    feed.start()
+    while not feed.eof():
+        feed.dispatch()
+    return dispatched
+
+
+def test_base_bar_feed_dispatches_every_bar_but_the_first():
+    store = make_store(50)
+    feed = BaseBarFeed(Frequency.MINUTE, store.instruments, store)
+    assert dispatch_all(feed) == list(range(1, 50))
+
+
+def test_optimizer_bar_feed_over_shared_store():
+    store = make_store(50, ('EURUSD', 'GBPUSD')).share()
+    try:
+        feed = OptimizerBarFeed(Frequency.MINUTE, store.instruments, store)
+        # 子进程拿到的是按名字映射的同一块共享内存
+        clone = pickle.loads(pickle.dumps(feed))
+        assert clone.bars.data.shape == store.data.shape
+        assert (clone.bars.data == store.data).all()
+        assert dispatch_all(clone) == list(range(1, 50))
+    finally:
+        store.release()
+
+
+def run_dispatcher(feed):
+    """
+        像策略那样用 Dispatcher 派发, 记下每根bar的时间与数据
+    """
+    dispatched = []
+
+    def on_bars(dateTime, bars1, bars2):
+        bars = {instrument: bar.data.copy() for instrument, bar in bars2.items}
+        # 没有bar的标的取之前最后一根有效的bar, broker 用它撮合与计价
+        latest = {}
+        for instrument in feed.instruments:
+            bar = bars2.latest_bar(instrument)
+            latest[instrument] = (bar.start_date, bar.data.copy()) if bar is not None else None
+        closes = bars2.store.latest_values(bars2.index, 5)
+        dispatched.append((dateTime, bars, latest, closes))
+
+    feed.bar_events.subscribe(on_bars)
+    dispatcher = Dispatcher()
+    dispatcher.addSubject(feed)
+    dispatcher.run()
+    return dispatched
+
+
+def assert_same_bars(streamed, loaded):
+    assert [item[0] for item in streamed] == [item[0] for item in loaded]
+    for (_, streamed_bars, streamed_latest, streamed_closes), (_, loaded_bars, loaded_latest, loaded_closes) in \
+            zip(streamed, loaded):
+        assert streamed_bars.keys() == loaded_bars.keys()
+        for instrument in loaded_bars:
+            np.testing.assert_array_equal(streamed_bars[instrument], loaded_bars[instrument])
+        for instrument, latest in loaded_latest.items():
+            if latest is None:
+                assert streamed_latest[instrument] is None
+            else:
+                assert streamed_latest[instrument][0] == latest[0]
+                np.testing.assert_array_equal(streamed_latest[instrument][1], latest[1])
+        np.testing.assert_array_equal(streamed_closes, loaded_closes)
+
+
+@pytest.mark.parametrize('gapped, chunk_size', [(False, 30), (True, 9), (True, 5)])
+def test_streaming_bar_feed_dispatches_like_the_whole_store(gapped, chunk_size):
+    if gapped:
+        # GBPUSD 缺少第 1, 5, 9, ... 根, 块的大小为 9 的时候第 9 与 45 根在块的开头, 为 5 的时候第 5, 25, 45 根
+        store = make_gapped_store(60)
+    else:
+        store = make_store(200, ('EURUSD', 'GBPUSD'))
+    # 最后一块不满
+    chunks = lambda: (store.slice(start, min(start + chunk_size, len(store)))
+                      for start in range(0, len(store), chunk_size))
+    streamed = run_dispatcher(StreamingBarFeed(Frequency.MINUTE, store.instruments, chunks, prefetch=1))
+    loaded = run_dispatcher(BaseBarFeed(Frequency.MINUTE, store.instruments, store))
+    assert len(loaded) == len(store) - 1
+    assert_same_bars(streamed, loaded)
+
+
+def write_frames(path, n, instruments, format='table'):
+    with pd.HDFStore(path, mode='w') as hdf:
+        for i, instrument in enumerate(instruments):
+            bars = make_bars(n, seed=i)
+            values = np.empty((n, len(FRAME_COLUMNS)), dtype=np.float32)
+            values[:, FRAME_COLUMNS] = bars[:, :len(FRAME_COLUMNS)]
+            index = pd.DatetimeIndex((START + np.arange(n)).astype('datetime64[ns]'))
+            hdf.put(instrument, pd.DataFrame(values, index=index), format=format)
+
+
+@pytest.mark.parametrize('format', ['table', 'fixed'])
+def test_dataframe_feed_loads_the_same_bars_as_a_full_read(tmp_path, format):
+    path = str(tmp_path / 'bars.h5')
+    instruments = ['EURUSD', 'GBPUSD']
+    write_frames(path, 300, instruments, format)
+    # 两端都包含
+    start = (START + 20).astype(datetime.datetime)
+    end = (START + 250).astype(datetime.datetime)
+
+    feed = DataFrameFeed(path, instruments)
+    try:
+        feed.load_data(start, end)
+        expected = {instrument: frame_to_bars(feed.store.get(instrument)[start:end]) for instrument in instruments}
+    finally:
+        feed.store.close()
+
+    store = feed.bars
+    assert len(store) == 231
+    for instrument, (timestamps, bars) in expected.items():
+        np.testing.assert_array_equal(store.timestamps, timestamps)
+        np.testing.assert_array_equal(store.instrument_bars(instrument), bars)
+
+
+def test_history_partitions_cover_every_row_in_order(tmp_path):
+    path = str(tmp_path / 'bars.h5')
+    write_frames(path, 301, ['EURUSD'])
+    histories = HistoryStore(path)
+    try:
+        history = histories.read('EURUSD')
+        assert len(history) == 301
+        partitions = [feed.bars for feed in history.feed(n_partitions=4)]
+        expected_timestamps, expected_bars = frame_to_bars(histories.store.get('EURUSD'))
+    finally:
+        histories.store.close()
+
+    assert [len(bars) for bars in partitions] == [75, 75, 75, 76]
+    np.testing.assert_array_equal(np.concatenate([bars.timestamps for bars in partitions]), expected_timestamps)
+    np.testing.assert_array_equal(np.concatenate([bars.instrument_bars('EURUSD') for bars in partitions]),
+                                  expected_bars)
+
+
+def test_dataframe_feed_stream_through_a_dispatcher(tmp_path):
+    path = str(tmp_path / 'bars.h5')
+    instruments = ['EURUSD', 'GBPUSD']
+    write_frames(path, 300, instruments)
+    start = START.astype(datetime.datetime)
+    end = start + datetime.timedelta(minutes=300)
+
+    streaming = DataFrameFeed(path, instruments)
+    loading = DataFrameFeed(path, instruments)
+    try:
+        streamed = run_dispatcher(streaming.stream(start, end, period=datetime.timedelta(hours=1)))
+        loading.load_data(start, end)
+        loaded = run_dispatcher(loading)
+    finally:
+        streaming.store.close()
+        loading.store.close()
+    assert len(loaded) == 299
+    assert_same_bars(streamed, loaded)
+
+
+# 与 Bar.data 的前8列顺序相同
+PRICE_FIELDS = ('ask_open', 'ask_close', 'ask_high', 'ask_low', 'bid_open', 'bid_close', 'bid_high', 'bid_low')
+
+
+def write_sqlite(path, feed, n, instruments):
+    """
+        用 ORM 写入每个标的的分钟线, 除了第一个标的, 其他标的每隔几根bar缺一根
+    """
+    engine = create_engine(f'sqlite:///{path}')
+    feed.model.metadata.create_all(engine, tables=[feed.model.__table__])
+    session = feed.new_session
+    try:
+        for i, instrument in enumerate(instruments):
+            bars = make_bars(n, seed=i)
+            for j in range(n):
+                if i > 0 and j % (3 + i) == i:
+                    continue
+                start = (START + j).astype(datetime.datetime)
+                prices = {name: float(bars[j, k]) for k, name in enumerate(PRICE_FIELDS)}
+                session.add(feed.model(type=instrument, start_date=start,
+                                       end_date=start + datetime.timedelta(minutes=1), **prices))
+        session.commit()
+    finally:
+        session.close()
+    engine.dispose()
+
+
+def load_orm(feed, instrument, from_date, to_date):
+    """
+        原来逐行通过 ORM 读取的方式
+    """
+    model = feed.model
+    session = feed.new_session
+    try:
+        rows = session.query(model).filter(
+            model.type == instrument,
+            model.start_date >= func.datetime(from_date),
+            model.end_date <= func.datetime(to_date)).order_by(model.start_date).all()
+        return [row.convert_to_bar() for row in rows]
+    finally:
+        session.close()
+
+
+@pytest.mark.parametrize('how', ['inner', 'outer'])
+def test_sqlite_feed_loads_the_same_bars_as_the_orm(tmp_path, how):
+    instruments = ['EURUSD', 'GBPUSD']
+    path = str(tmp_path / 'bars.sqlite')
+    feed = SQLiteFeed(instruments, table_name='test_bins', file_name=path)
+    write_sqlite(path, feed, 120, instruments)
+    # 区间两端都截掉一些bar, end_date 不超过 to_date
+    from_date = (START + 10).astype(datetime.datetime)
+    to_date = (START + 100).astype(datetime.datetime)
+    feed.load_data(from_date, to_date, how=how)
+    store = feed.bars
+
+    expected = {instrument: load_orm(feed, instrument, from_date, to_date) for instrument in instruments}
+    assert len(expected['EURUSD']) == 89
+    for instrument, bars in expected.items():
+        column = store.instrument_index(instrument)
+        valid = np.ones(len(store), dtype=np.bool_) if store.valid is None else store.valid[:, column]
+        if how == 'inner':
+            # 内连接只保留所有标的都有的时间
+            keep = np.isin(np.array([bar.start_date for bar in bars]), store.timestamps)
+            bars = [bar for bar, kept in zip(bars, keep) if kept]
+        assert [bar.start_date for bar in bars] == list(store.timestamps[valid])
+        np.testing.assert_array_equal(np.array([bar.data for bar in bars]), store.instrument_bars(instrument)[valid])
+
+
+def test_bar_cache_round_trip(tmp_path):
+    cache = BarCache(str(tmp_path / 'cache'))
+    timestamps = START + np.arange(50)
+    bars = make_bars(50)
+    fetched = cache.get('source', 'bins', 'EURUSD', 'from', 'to', [1, 2], lambda: (timestamps, bars))
+    # 没有缓存的时候直接返回读取的结果
+    assert fetched[0] is timestamps and fetched[1] is bars
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    loaded = cache.get('source', 'bins', 'EURUSD', 'from', 'to', [1, 2], lambda: pytest.fail('should hit the cache'))
+    assert cache.hits == 1
+    # 内存映射, 只读
+    assert isinstance(loaded[1], np.memmap) and not loaded[1].flags.writeable
+    np.testing.assert_array_equal(loaded[0], timestamps)
+    np.testing.assert_array_equal(loaded[1], bars)
+
+    # 版本或者区间不同都没有缓存
+    assert cache.load('source', 'bins', 'EURUSD', 'from', 'to', [1, 3]) is None
+    assert cache.load('source', 'bins', 'EURUSD', 'from', 'other', [1, 2]) is None
+    assert cache.load('source', 'bins', 'GBPUSD', 'from', 'to', [1, 2]) is None
+
+
+def test_sqlite_feed_cache_is_invalidated_when_the_database_changes(tmp_path):
+    instruments = ['EURUSD', 'GBPUSD']
+    path = str(tmp_path / 'bars.sqlite')
+    cache = BarCache(str(tmp_path / 'cache'))
+    feed = SQLiteFeed(instruments, table_name='test_bins', file_name=path, cache=cache)
+    write_sqlite(path, feed, 120, instruments)
+    from_date = START.astype(datetime.datetime)
+    to_date = (START + 200).astype(datetime.datetime)
+
+    uncached = SQLiteFeed(instruments, table_name='test_bins', file_name=path)
+    uncached.load_data(from_date, to_date, how='outer')
+    feed.load_data(from_date, to_date, how='outer')
+    assert (cache.hits, cache.misses) == (0, 2)
+    feed.load_data(from_date, to_date, how='outer')
+    assert (cache.hits, cache.misses) == (2, 2)
+    np.testing.assert_array_equal(feed.bars.timestamps, uncached.bars.timestamps)
+    np.testing.assert_array_equal(feed.bars.data, uncached.bars.data)
+    np.testing.assert_array_equal(feed.bars.valid, uncached.bars.valid)
+
+    # 数据库中多了一根bar, 缓存失效, 重新查询
+    session = feed.new_session
+    start = (START + 150).astype(datetime.datetime)
+    session.add(feed.model(type='EURUSD', start_date=start, end_date=start + datetime.timedelta(minutes=1),
+                           **{name: 1.5 for name in PRICE_FIELDS}))
+    session.commit()
+    session.close()
+
+    feed.load_data(from_date, to_date, how='outer')
+    assert (cache.hits, cache.misses) == (2, 4)
+    assert feed.bars.timestamps[-1] == START + 150
+    assert feed.bars.latest_bar(len(feed.bars) - 1, 'EURUSD').bid_close == 1.5
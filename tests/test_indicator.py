@@ -0,0 +1,247 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from myalgo.bar import Bar, Frequency
+from myalgo.broker import NoCommission
+from myalgo.dataseries import BarDataSeries
+from myalgo.feed import BaseBarFeed
+from myalgo.indicator.atr import ATR
+from myalgo.indicator.base import history, skip_nan
+from myalgo.indicator.cache import IndicatorCache
+from myalgo.indicator.highlow import High, Low, Range
+from myalgo.indicator.ma import EMA, SMA
+from myalgo.indicator.macd import MACD
+from myalgo.indicator.mad import SMAD, SMADRange
+from myalgo.indicator.registry import IndicatorRegistry
+from myalgo.indicator.rsi import RSI
+from myalgo.indicator.volatility import Volatility
+from myalgo.strategy import BackTestStrategy
+from strategies.cross import RSI2
+from tests.common import START, make_bars, make_store
+
+N = 600
+
+INDICATORS = {
+    'sma': lambda series: SMA(series.bid_close, 20),
+    'ema': lambda series: EMA(series.bid_close, 20),
+    'high': lambda series: High(series.bid_close, 30),
+    'low': lambda series: Low(series.bid_close, 30),
+    'range': lambda series: Range(series.bid_close, 30),
+    'rsi': lambda series: RSI(series.bid_close, 14),
+    'volatility': lambda series: Volatility(series.bid_close, 20),
+    'smad': lambda series: SMAD(series.bid_close, 20),
+    'atr': lambda series: ATR(series, 14),
+    'macd': lambda series: MACD(series.bid_close, 12, 26, 9),
+    # 指标串起来
+    'sma of ema': lambda series: SMA(EMA(series.bid_close, 10), 5),
+}
+
+
+def make_gapped_bars(n=N):
+    """
+        收盘价中有几段 nan(没有数据的位置)
+    """
+    bars = make_bars(n)
+    bars[7::50] = np.nan
+    bars[200:240] = np.nan
+    return START + np.arange(n), bars
+
+
+class Source:
+    """
+        逐根追加, 或者零拷贝地前进的序列
+    """
+
+    def __init__(self, zero_copy, timestamps, bars):
+        self.series = BarDataSeries()
+        self.zero_copy = zero_copy
+        self.timestamps, self.bars = timestamps, bars
+        self.count = 0
+        if zero_copy:
+            self.series.attach(bars, timestamps)
+            self.series.as_new(0)
+
+    def advance(self, count):
+        for i in range(self.count, self.count + count):
+            if self.zero_copy:
+                self.series.to_next()
+            else:
+                self.series.append(Bar(self.timestamps[i], self.timestamps[i] + 1, self.bars[i]))
+        self.count += count
+
+
+@pytest.mark.parametrize('zero_copy', [False, True])
+@pytest.mark.parametrize('warm_up', [0, 5, 220, N])
+@pytest.mark.parametrize('name', INDICATORS.keys())
+def test_incremental_indicator_matches_bulk(name, warm_up, zero_copy):
+    timestamps, bars = make_gapped_bars()
+    source = Source(zero_copy, timestamps, bars)
+    # 创建之前的数据用 bulk 计算, 之后的逐根增量计算
+    source.advance(warm_up)
+    indicator = INDICATORS[name](source.series)
+    source.advance(N - warm_up)
+
+    assert len(indicator) == N
+    # 串起来的指标的 source 是另一个指标
+    expected = skip_nan(indicator.bulk, history(indicator.source))
+    assert np.isnan(expected).sum() < N
+    np.testing.assert_allclose(indicator.values, expected, rtol=1e-9, atol=1e-12)
+    if name == 'macd':
+        np.testing.assert_allclose(indicator.signal.values, skip_nan(indicator.signal.bulk, expected),
+                                   rtol=1e-9, atol=1e-12)
+
+
+def test_bulk_indicators_skip_nan_like_pandas():
+    timestamps, bars = make_gapped_bars()
+    source = Source(False, timestamps, bars)
+    source.advance(N)
+    closes = bars[:, 5].astype(np.float64)
+    present = ~np.isnan(closes)
+    compact = pd.Series(closes[present])
+
+    def expand(values):
+        ret = np.full(N, np.nan)
+        ret[present] = values
+        return ret
+
+    np.testing.assert_allclose(SMA(source.series.bid_close, 20).values, expand(compact.rolling(20).mean()),
+                               rtol=1e-9)
+    np.testing.assert_allclose(High(source.series.bid_close, 30).values, expand(compact.rolling(30).max()))
+    np.testing.assert_allclose(Low(source.series.bid_close, 30).values, expand(compact.rolling(30).min()))
+
+    # EMA 的第一个值是前 period 个值的简单平均
+    period = 20
+    expected = [np.nan] * (period - 1) + [compact[:period].mean()]
+    for value in compact[period:]:
+        expected.append(expected[-1] + (value - expected[-1]) * 2.0 / (period + 1))
+    np.testing.assert_allclose(EMA(source.series.bid_close, period).values, expand(expected), rtol=1e-9)
+
+
+def test_indicator_restarts_after_the_series_is_reset():
+    timestamps, bars = make_gapped_bars()
+    source = Source(False, timestamps, bars)
+    indicator = SMA(source.series.bid_close, 20)
+    source.advance(N)
+    expected = indicator.values.copy()
+
+    source.series.reset()
+    source.count = 0
+    source.advance(N)
+    np.testing.assert_array_equal(indicator.values, expected)
+
+
+def test_registry_shares_identical_indicators():
+    timestamps, bars = make_gapped_bars()
+    source = Source(False, timestamps, bars)
+    source.advance(100)
+    close = source.series.bid_close
+
+    with IndicatorRegistry() as registry:
+        sma = SMA(close, 20)
+        # 位置参数与关键字参数, 以及补齐的默认值都是同一个指标
+        assert SMA(close, period=20) is sma
+        assert SMA(close, 20, None) is sma
+        assert SMA(close, 21) is not sma
+        assert SMA(source.series.bid_open, 20) is not sma
+        assert EMA(close, 20) is not sma
+        assert registry.stats == {'requested': 6, 'created': 4, 'shared': 2, 'saved_updates': 200}
+
+        # 组合指标内部的子指标也会共用
+        smad = SMAD(close, 20)
+        assert smad.sma is sma
+        assert SMADRange(close, 20).sma is sma
+        fast = MACD(close, 12, 26, 9)
+        slow = MACD(close, 12, 30, 9)
+        assert slow.fast is fast.fast and slow.slow is not fast.slow
+        assert RSI(close, 14).change is RSI(close, 28).change
+
+    # 注册表之外不共用
+    assert SMA(close, 20) is not sma
+
+    standalone = {name: INDICATORS[name](source.series) for name in ('sma', 'smad', 'macd')}
+    shared = {'sma': sma, 'smad': smad, 'macd': fast}
+    source.advance(N - 100)
+    for name, indicator in standalone.items():
+        np.testing.assert_array_equal(shared[name].values, indicator.values)
+
+
+def test_strategy_indicators_are_shared():
+    store = make_store(300)
+    strategy = RSI2(BaseBarFeed(Frequency.MINUTE, store.instruments, store), 30, 70, 'EURUSD')
+    # 入场与出场用的是同一条 SMA, 每根bar上只更新一次
+    assert strategy.getEntrySMA() is strategy.getExitSMA()
+    assert strategy.indicators.stats['shared'] == 1
+
+
+class Recorder(BackTestStrategy):
+    """
+        记下每根bar上几个指标的值
+    """
+
+    def __init__(self, feed, indicator_cache=None):
+        super(Recorder, self).__init__(feed, 10000, NoCommission(), round=int, indicator_cache=indicator_cache)
+        close = self.bar_series['EURUSD'].bid_close
+        with self.indicators:
+            macd = MACD(close, 12, 26, 9)
+            self.__indicators = [SMA(close, 20), High(close, 60), ATR(self.bar_series['EURUSD'], 14), macd,
+                                 macd.signal]
+        self.values = []
+
+    def onBars(self, dateTime, bars):
+        self.values.append([indicator[-1] for indicator in self.__indicators])
+
+
+def run_recorder(store, cache=None):
+    strategy = Recorder(BaseBarFeed(Frequency.MINUTE, store.instruments, store), cache)
+    strategy.run()
+    return strategy
+
+
+def test_cached_indicators_match_recomputed_ones(tmp_path):
+    store = make_store(500)
+    cache = IndicatorCache(str(tmp_path / 'cache'))
+    expected = run_recorder(store).values
+    assert any(value is not None for value in expected[-1])
+
+    # MACD 内部还有两条 EMA, 一共 7 个指标
+    first = run_recorder(store, cache)
+    assert (cache.hits, cache.misses) == (0, 7)
+    second = run_recorder(store, cache)
+    assert (cache.hits, cache.misses) == (7, 7)
+    np.testing.assert_allclose(np.array(first.values, dtype=np.float64), np.array(expected, dtype=np.float64),
+                               rtol=1e-9)
+    assert second.values == first.values
+
+    # 数据变了, 指纹不同, 重新计算
+    changed = make_store(500, seed=1)
+    run_recorder(changed, cache)
+    assert cache.misses == 14
+    np.testing.assert_allclose(np.array(run_recorder(changed, cache).values, dtype=np.float64),
+                               np.array(run_recorder(changed).values, dtype=np.float64), rtol=1e-9)
+    assert cache.hits == 14
+
+
+def test_indicator_cache_round_trip_and_eviction(tmp_path):
+    cache = IndicatorCache(str(tmp_path / 'cache'), max_entries=2)
+    values = np.arange(10, dtype=np.float64)
+    spec = ['SMA', 20]
+    assert cache.get('data', spec, lambda: values) is not None
+    loaded = cache.get('data', spec, lambda: pytest.fail('should hit the cache'))
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert not loaded.flags.writeable
+    np.testing.assert_array_equal(loaded, values)
+
+    # 指纹或者描述不同都没有缓存
+    assert cache.load('other data', spec) is None
+    assert cache.load('data', ['SMA', 21]) is None
+
+    cache.get('data', ['SMA', 21], lambda: values)
+    # 刚刚用过第一个, 淘汰最久没有用过的第二个
+    os.utime(os.path.join(cache.directory, cache.key('data', ['SMA', 21]) + '.json'), ns=(0, 0))
+    cache.get('data', ['SMA', 22], lambda: values)
+    assert len(cache.entries()) == 2
+    assert cache.load('data', spec) is not None
+    assert cache.load('data', ['SMA', 21]) is None
@@ -0,0 +1,118 @@
+import datetime
+import sqlite3
+
+import numpy as np
+import pytest
+from six.moves import xmlrpc_client
+
+from myalgo.bar import Frequency
+from myalgo.broker import NoCommission
+from myalgo.feed import BaseBarFeed
+from myalgo.optimizer import base, local, results, worker, xmlrpcserver
+from myalgo.strategy import BackTestStrategy
+from tests.common import make_store
+
+
+class Periodic(BackTestStrategy):
+    """
+        每 entry 根bar做多一次, 持有 hold 根bar之后平仓
+    """
+    name = 'Periodic'
+
+    def __init__(self, feed, entry, hold):
+        super(Periodic, self).__init__(feed, 10000, NoCommission(), round=int)
+        self.__entry = int(entry)
+        self.__hold = int(hold)
+        self.__bars = 0
+        self.__position = None
+        self.__entered = None
+
+    def onBars(self, dateTime, bars):
+        self.__bars += 1
+        if self.__position is None:
+            if self.__bars % self.__entry == 0:
+                self.__position = self.enterLong('EURUSD', 1000)
+                self.__entered = self.__bars
+        elif self.__position.entryFilled() and not self.__position.exitActive() and \
+                self.__bars - self.__entered >= self.__hold:
+            self.__position.exitMarket()
+
+    def onEnterCanceled(self, position):
+        self.__position = None
+
+    def onExitOk(self, position):
+        self.__position = None
+
+
+def run_local(feed, parameters):
+    strategy = Periodic(feed.clone(), *parameters)
+    strategy.run()
+    return strategy.result
+
+
+def test_local_run_with_two_workers_over_shared_memory(tmp_path):
+    store = make_store(600)
+    feed = BaseBarFeed(Frequency.MINUTE, store.instruments, store)
+    parameters = [(5, 3), (7, 2), (9, 4), (11, 3), (13, 6), (17, 1)]
+    result_file = str(tmp_path / 'result.sqlite')
+
+    local.run(Periodic, feed, parameters, workerCount=2, batchSize=2, result_file=result_file)
+
+    with sqlite3.connect(result_file) as connection:
+        rows = connection.execute('SELECT p1, p2, profit_rate, trade_count FROM result_image').fetchall()
+    assert sorted((p1, p2) for p1, p2, _, _ in rows) == sorted(parameters)
+    for p1, p2, profit_rate, trade_count in rows:
+        expected = run_local(feed, (p1, p2))
+        assert profit_rate == pytest.approx(expected['profit_rate'])
+        assert trade_count == expected['trade_count']
+
+
+def test_remote_worker_downloads_the_dataset_on_demand(tmp_path):
+    store = make_store(300)
+    feed = BaseBarFeed(Frequency.MINUTE, store.instruments, store)
+    port = local.find_port()
+    server = xmlrpcserver.Server(Periodic.name, base.ParameterSource([]), base.ResultSinc(), feed, 'localhost', port,
+                                 autoStop=False, result_file=str(tmp_path / 'result.sqlite'))
+    thread = local.ServerThread(server)
+    thread.start()
+    try:
+        server.waitServing()
+        remote = worker.Worker('localhost', port, 'remote')
+        bars = remote.getBars()
+        assert remote.getBarsFrequency() == Frequency.MINUTE.value
+        stats = xmlrpc_client.ServerProxy('http://localhost:%s/myalgoRPC' % port).getResultStats()
+        assert stats['saved'] == 0 and stats['pending'] == 0
+    finally:
+        server.stop()
+        thread.join()
+    assert list(bars.instruments) == list(store.instruments)
+    np.testing.assert_array_equal(bars.timestamps, store.timestamps)
+    np.testing.assert_array_equal(bars.data, store.data)
+
+
+def save(manager, p1):
+    manager.save(p1=p1, p2=0, win_rate=0.5, sharp_ratio=1.0, profit_rate=0.1, ret=0.1, draw_down=-0.05,
+                 draw_down_duration=datetime.timedelta(minutes=30), trade_count=10, plr=1.5)
+
+
+def test_result_manager_keeps_the_batch_when_a_write_fails(tmp_path):
+    result_file = str(tmp_path / 'result.sqlite')
+    manager = results.ResultManager('Periodic', file_name=result_file, batch_size=2, flush_interval=None)
+    with sqlite3.connect(result_file) as connection:
+        connection.execute('DROP TABLE result_image')
+
+    # 攒够一批时的写入失败不会抛给 save 的调用者, 结果留在缓冲区中
+    save(manager, 1)
+    save(manager, 2)
+    assert manager.stats['pending'] == 2
+    assert manager.stats['failed'] == 1
+    save(manager, 3)
+    with pytest.raises(Exception):
+        manager.flush()
+    assert manager.stats['pending'] == 3
+
+    results.Base.metadata.create_all(results.create_engine(f'sqlite:///{result_file}'))
+    assert manager.flush() == 3
+    manager.close()
+    assert manager.stats['saved'] == 3 and manager.stats['pending'] == 0
+    assert sorted(row.p1 for row in manager.load()) == [1, 2, 3]
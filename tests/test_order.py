@@ -0,0 +1,14 @@
+from myalgo.order import Action, State, Type
+
+
+def test_action_and_state_are_not_integers():
+    # 不同枚举中编码相同的成员不能相等, 比如 Action.BUY 与 State.INITIAL
+    assert Action.BUY != State.INITIAL
+    assert Action.BUY != 1
+    assert State.INITIAL != 1
+
+
+def test_type_codes_are_fixed():
+    # 批量撮合与向量化回测的数组中直接使用这些编码
+    assert [int(type_) for type_ in Type] == [1, 2, 3, 4]
+    assert Type.MARKET == 1
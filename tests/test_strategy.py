@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from myalgo.bar import Frequency
+from myalgo.broker import NoCommission
+from myalgo.feed import BaseBarFeed
+from myalgo.strategy import BackTestStrategy
+from tests.common import make_gapped_store, make_store
+
+
+class Recorder(BackTestStrategy):
+    """
+        每根bar记下策略看到的序列长度与最后一根收盘价
+    """
+
+    def __init__(self, feed, series_zero_copy):
+        super(Recorder, self).__init__(feed, 10000, NoCommission(), round=int, series_zero_copy=series_zero_copy)
+        self.seen = []
+
+    def onBars(self, dateTime, bars):
+        for instrument, series in sorted(self.bar_series.items()):
+            self.seen.append((dateTime, instrument, len(series), float(series.bid_close[-1]) if len(series) else None))
+
+    def onFinish(self, bars):
+        self.series = {instrument: (series.timestamps.copy(), series.bars.copy())
+                       for instrument, series in self.bar_series.items()}
+
+
+def run(store, series_zero_copy):
+    strategy = Recorder(BaseBarFeed(Frequency.MINUTE, store.instruments, store), series_zero_copy)
+    strategy.run()
+    return strategy
+
+
+def assert_same_series(store):
+    zero_copy = run(store, True)
+    append = run(store, False)
+    assert zero_copy.seen == append.seen
+    for instrument in store.instruments:
+        np.testing.assert_array_equal(zero_copy.series[instrument][0], append.series[instrument][0])
+        np.testing.assert_array_equal(zero_copy.series[instrument][1], append.series[instrument][1])
+    return append
+
+
+def test_zero_copy_series_match_appended_series():
+    assert_same_series(make_store(50, instruments=('EURUSD', 'GBPUSD')))
+
+
+@pytest.mark.parametrize('fill', [False, True])
+def test_zero_copy_series_skip_missing_bars_of_an_outer_join(fill):
+    store = make_gapped_store(50, fill=fill)
+    strategy = assert_same_series(store)
+    # 第0根不会被派发, 缺失的bar不出现在序列中
+    valid = store.valid[1:]
+    for column, instrument in enumerate(store.instruments):
+        timestamps, bars = strategy.series[instrument]
+        assert len(timestamps) == valid[:, column].sum()
+        assert not np.isnan(bars).any()
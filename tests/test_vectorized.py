@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from myalgo.bar import Frequency
+from myalgo.feed import BaseBarFeed
+from strategies.orindary import OrindaryStr, VectorizedOrindaryStr
+from tests.common import make_store
+
+PARAMETERS = [(0.2, 0.3), (0.1, 0.5), (0.3, 0.2)]
+
+# 两边都是 float32 的价格, 只是累加的顺序不同
+EXACT = ('trade_count', 'win_rate', 'ddd')
+CLOSE = ('profit_rate', 'ret', 'sharp', 'dd', 'plr')
+
+
+def make_feed():
+    # 策略需要 1440 根bar的高低点, 按4小时一个周期交易, 6天的分钟线
+    store = make_store(6 * 1440, seed=3)
+    return BaseBarFeed(Frequency.MINUTE, store.instruments, store)
+
+
+def assert_same_result(expected, actual):
+    assert expected['trade_count'] > 0
+    for key in EXACT:
+        assert actual[key] == expected[key], key
+    for key in CLOSE:
+        assert actual[key] == pytest.approx(expected[key], rel=1e-4, abs=1e-6), key
+
+
+@pytest.mark.parametrize('p1, p2', PARAMETERS)
+def test_vectorized_strategy_matches_the_event_driven_one(p1, p2):
+    feed = make_feed()
+    event = OrindaryStr(feed.clone(), p1, p2, 'EURUSD')
+    event.run()
+    vectorized = VectorizedOrindaryStr(feed.clone(), p1, p2, 'EURUSD')
+    vectorized.run()
+
+    assert_same_result(event.result, vectorized.result)
+    assert np.all(np.isfinite(vectorized.equity_curve))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 64])
+def test_sweep_matches_single_runs(chunk_size):
+    feed = make_feed()
+    parameters = [(p1, p2, 'EURUSD') for p1, p2 in PARAMETERS]
+    results = VectorizedOrindaryStr.run_sweep(feed, parameters, chunk_size)
+
+    assert len(results) == len(parameters)
+    for args, result in zip(parameters, results):
+        single = VectorizedOrindaryStr(feed.clone(), *args)
+        single.run()
+        assert result == single.result
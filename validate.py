@@ -191,7 +191,7 @@ i = indicators.Indicators({
 # The if __name__ == '__main__' part is necessary if running on Windows.
 if __name__ == '__main__':
     # Load the bar feed from the CSV files.
-    feed = SQLiteFeed(instruments=[instrument], table_name='bins', file_name='sqlite')
+    feed = SQLiteFeed(instruments=[instrument], table_name='bins', file_name='sqlite', cache='bar_cache')
     feed.load_data(from_date, to_date)
     s = orindary.OrindaryStr(feed, p1, p2, instrument)
 
@@ -19,7 +19,7 @@ def main():
     start_time = datetime.datetime.now()
 
     feed = DataFrameFeed(instruments=[instrument],
-                         path='ratio.h5', maxLen=24 * 60)
+                         path='ratio.h5', maxLen=24 * 60, cache='bar_cache')
     feed.load_data(start, end)
     s = orindinary_plus.OrindaryStr(feed, p1, p2, instrument)
     s.logger.level = logging.DEBUG